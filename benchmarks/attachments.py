@@ -0,0 +1,130 @@
+"""Compares relaying attachments by downloading each file whole before uploading it
+with streaming them through AttachmentRelay, against the fake Discord and CDN in fake_discord.py.
+
+Every message goes to its own webhook, so all of them are sent at once. Reports the time taken
+and the peak memory allocated by Python while relaying (measured with tracemalloc).
+
+Run from the repository root:
+python -m benchmarks.attachments [messages] [files per message] [file size in MiB] [budget in MiB]
+"""
+
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from typing import List
+
+import aiohttp
+import hikari
+from hikari.impl import entity_factory
+
+from proxytools.core import MiB, AttachmentRelay, ProxyWebhook, WebhookExecutor
+
+from .fake_discord import FakeDiscord, user_payload
+
+
+class App:
+    def __init__(self):
+        self.entity_factory = entity_factory.EntityFactoryImpl(self)
+
+
+async def buffered(fake: FakeDiscord, messages: List[hikari.Message]):
+    """Downloads every file into memory, then uploads them."""
+
+    async with aiohttp.ClientSession() as session:
+
+        async def send(i: int, message: hikari.Message):
+            form = aiohttp.FormData()
+            form.add_field(
+                "payload_json",
+                json.dumps({"content": message.content}),
+                content_type="application/json",
+            )
+            for n, attachment in enumerate(message.attachments):
+                async with session.get(attachment.url) as resp:
+                    data = await resp.read()
+                form.add_field(f"file{n}", data, filename=attachment.filename)
+
+            async with session.post(
+                f"{fake.url}/webhooks/{i}/token", data=form, params={"wait": "true"}
+            ) as resp:
+                await resp.read()
+
+        await asyncio.gather(*[send(i, m) for i, m in enumerate(messages, 1)])
+
+
+async def streamed(
+    app: App, fake: FakeDiscord, relay: AttachmentRelay, messages: List[hikari.Message]
+):
+    """Streams every file through the relay and webhook executor."""
+
+    executor = WebhookExecutor(app, base_url=fake.url, relay=relay)
+    await asyncio.gather(
+        *[
+            executor.execute(
+                ProxyWebhook(app, i, i, "token"),
+                m.content,
+                attachments=m.attachments,
+            )
+            for i, m in enumerate(messages, 1)
+        ]
+    )
+    await executor.close()
+
+
+async def measure(name: str, fake: FakeDiscord, run):
+    uploaded = fake.uploaded
+    tracemalloc.start()
+    start = time.perf_counter()
+    await run
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mib = (fake.uploaded - uploaded) / MiB
+    print(
+        f"{name:10} {elapsed:7.2f} s   {mib / elapsed:8.1f} MiB/s   peak memory {peak / MiB:8.1f} MiB"
+    )
+
+
+async def run(messages: int, files: int, size: int, budget: int):
+    fake = FakeDiscord(latency=0, jitter=0, rate_limit=1000)
+    await fake.start()
+    app = App()
+
+    payloads = [
+        fake.message_payload(
+            1,
+            1,
+            user_payload(1),
+            f"message {i}",
+            attachments=[fake.attachment(f"file{n}.bin", size) for n in range(files)],
+        )
+        for i in range(messages)
+    ]
+    parsed = [app.entity_factory.deserialize_message(p) for p in payloads]
+
+    print(
+        f"{messages} messages with {files} file(s) of {size / MiB:.0f} MiB each, "
+        f"relay budget {budget / MiB:.0f} MiB"
+    )
+    await measure("buffered", fake, buffered(fake, parsed))
+
+    relay = AttachmentRelay(max_bytes=budget)
+    await measure("streamed", fake, streamed(app, fake, relay, parsed))
+    await relay.close()
+    await fake.close()
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    size = float(sys.argv[3]) if len(sys.argv) > 3 else 8
+    budget = float(sys.argv[4]) if len(sys.argv) > 4 else 32
+
+    asyncio.run(run(messages, files, int(size * MiB), int(budget * MiB)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""An in-process stand-in for Discord's REST API, for benchmarks that run the bot without Discord.
+
+It serves just enough of the API for proxying and commands (users, channel webhooks,
+executing webhooks, creating and deleting messages) with a configurable simulated latency,
+and enforces per-webhook rate limits with the same headers and 429 responses as Discord.
+It also stands in for the CDN, serving attachments made with `attachment`, and accepts
+webhook executes with files, counting the uploaded bytes without keeping them.
+"""
+
+import asyncio
+import datetime
+import itertools
+import json
+import random
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+BOT_ID = 1000
+# attachments are served in chunks of this size
+CHUNK = b"\0" * 65536
+# Discord's epoch, for generating snowflakes
+EPOCH = 1420070400000
+
+
+def user_payload(id: int, bot: bool = False) -> dict:
+    return {
+        "id": str(id),
+        "username": f"user {id}",
+        "discriminator": "0001",
+        "avatar": None,
+        "bot": bot,
+        "public_flags": 0,
+    }
+
+
+class _Bucket:
+    __slots__ = ("remaining", "reset_at")
+
+    remaining: int
+    reset_at: float
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self.reset_at = 0.0
+
+
+class FakeDiscord:
+    """Serves a fake Discord API on localhost. Use `url` as the bot's `rest_url`.
+
+    Every request waits `latency` seconds, give or take `jitter`. Each webhook allows
+    `rate_limit` executes every `rate_window` seconds, after which it responds with 429s.
+    All channels are treated as being in the guild `guild`.
+    """
+
+    _runner: Optional[web.AppRunner] = None
+    _ids: itertools.count
+    _webhooks: Dict[int, int]
+    _channels: Dict[int, int]
+    _buckets: Dict[int, _Bucket]
+    _attachments: Dict[int, int]
+
+    latency: float
+    jitter: float
+    rate_limit: int
+    rate_window: float
+    guild: int
+    port: int
+
+    # request counts
+    requests: int = 0
+    executes: int = 0
+    ratelimited: int = 0
+    deleted: int = 0
+    created: int = 0
+    downloaded: int = 0  # bytes of attachments served
+    uploaded: int = 0  # bytes of files received by webhooks
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.01,
+        rate_limit: int = 5,
+        rate_window: float = 2.0,
+        guild: int = 1,
+    ):
+        self.guild = guild
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self._ids = itertools.count(1)
+        self._webhooks = dict()
+        self._channels = dict()
+        self._buckets = dict()
+        self._attachments = dict()
+        self._rng = random.Random(0)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/api/v8"
+
+    def attachment(self, filename: str, size: int) -> dict:
+        """Returns the payload of a new attachment of `size` bytes, which can be downloaded from this server."""
+
+        id = self.snowflake()
+        self._attachments[id] = size
+        url = f"http://127.0.0.1:{self.port}/attachments/{id}/{filename}"
+        return {
+            "id": str(id),
+            "filename": filename,
+            "size": size,
+            "url": url,
+            "proxy_url": url,
+        }
+
+    def snowflake(self) -> int:
+        """Returns a new snowflake for the current time."""
+
+        return ((int(time.time() * 1000) - EPOCH) << 22) | (next(self._ids) & 0x3FFFFF)
+
+    async def start(self):
+        app = web.Application()
+        app.add_routes(
+            [
+                web.get("/api/v8/oauth2/applications/@me", self._application),
+                web.get("/api/v8/applications/{app}/commands", self._empty_list),
+                web.get(
+                    "/api/v8/applications/{app}/guilds/{guild}/commands",
+                    self._empty_list,
+                ),
+                web.get("/api/v8/users/@me", self._me),
+                web.get("/api/v8/users/{user}", self._user),
+                web.get("/api/v8/channels/{channel}/webhooks", self._channel_webhooks),
+                web.post("/api/v8/channels/{channel}/webhooks", self._create_webhook),
+                web.post("/api/v8/channels/{channel}/messages", self._create_message),
+                web.delete(
+                    "/api/v8/channels/{channel}/messages/{message}",
+                    self._delete_message,
+                ),
+                web.put(
+                    "/api/v8/channels/{channel}/messages/{message}/reactions/{emoji}/@me",
+                    self._no_content,
+                ),
+                web.post("/api/v8/webhooks/{webhook}/{token}", self._execute),
+                web.get("/attachments/{id}/{filename}", self._download),
+            ]
+        )
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _wait(self):
+        self.requests += 1
+        delay = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def message_payload(
+        self,
+        channel: int,
+        guild: Optional[int],
+        author: dict,
+        content: str,
+        *,
+        id: Optional[int] = None,
+        webhook_id: Optional[int] = None,
+        embeds: Optional[List[dict]] = None,
+        attachments: Optional[List[dict]] = None,
+    ) -> dict:
+        id = id or self.snowflake()
+        payload = {
+            "id": str(id),
+            "channel_id": str(channel),
+            "author": author,
+            "content": content,
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": attachments or [],
+            "embeds": embeds or [],
+            "pinned": False,
+            "type": 0,
+            "flags": 0,
+        }
+        if guild is not None:
+            payload["guild_id"] = str(guild)
+        if webhook_id is not None:
+            payload["webhook_id"] = str(webhook_id)
+        return payload
+
+    def _webhook_payload(self, channel: int, id: int) -> dict:
+        return {
+            "id": str(id),
+            "type": 1,
+            "channel_id": str(channel),
+            "guild_id": str(self.guild),
+            "name": "proxytools Webhook",
+            "avatar": None,
+            "token": f"token{id}",
+            "user": user_payload(BOT_ID, bot=True),
+            "application_id": None,
+        }
+
+    async def _application(self, _: web.Request) -> web.Response:
+        await self._wait()
+        return web.json_response(
+            {
+                "id": str(BOT_ID),
+                "name": "proxytools",
+                "icon": None,
+                "description": "",
+                "bot_public": True,
+                "bot_require_code_grant": False,
+                "owner": user_payload(1),
+                "summary": "",
+                "verify_key": "",
+                "flags": 0,
+                "team": None,
+            }
+        )
+
+    async def _empty_list(self, _: web.Request) -> web.Response:
+        await self._wait()
+        return web.json_response([])
+
+    async def _me(self, _: web.Request) -> web.Response:
+        await self._wait()
+        payload = user_payload(BOT_ID, bot=True)
+        payload.update({"mfa_enabled": False, "verified": True, "flags": 0})
+        return web.json_response(payload)
+
+    async def _user(self, request: web.Request) -> web.Response:
+        await self._wait()
+        return web.json_response(user_payload(int(request.match_info["user"])))
+
+    async def _channel_webhooks(self, request: web.Request) -> web.Response:
+        await self._wait()
+        channel = int(request.match_info["channel"])
+        webhook = self._webhooks.get(channel)
+        if webhook is None:
+            return web.json_response([])
+        return web.json_response([self._webhook_payload(channel, webhook)])
+
+    async def _create_webhook(self, request: web.Request) -> web.Response:
+        await self._wait()
+        channel = int(request.match_info["channel"])
+        webhook = self._webhooks[channel] = self.snowflake()
+        self._channels[webhook] = channel
+        return web.json_response(self._webhook_payload(channel, webhook))
+
+    async def _create_message(self, request: web.Request) -> web.Response:
+        await self._wait()
+        self.created += 1
+        body = await request.json()
+        return web.json_response(
+            self.message_payload(
+                int(request.match_info["channel"]),
+                None,
+                user_payload(BOT_ID, bot=True),
+                body.get("content") or "",
+                embeds=body.get("embeds"),
+            )
+        )
+
+    async def _delete_message(self, _: web.Request) -> web.Response:
+        await self._wait()
+        self.deleted += 1
+        return web.Response(status=204)
+
+    async def _no_content(self, _: web.Request) -> web.Response:
+        await self._wait()
+        return web.Response(status=204)
+
+    async def _download(self, request: web.Request) -> web.StreamResponse:
+        await self._wait()
+        size = self._attachments.get(int(request.match_info["id"]))
+        if size is None:
+            return web.Response(status=404)
+
+        resp = web.StreamResponse()
+        resp.content_length = size
+        await resp.prepare(request)
+        while size > 0:
+            chunk = CHUNK[: min(size, len(CHUNK))]
+            await resp.write(chunk)
+            size -= len(chunk)
+            self.downloaded += len(chunk)
+        await resp.write_eof()
+        return resp
+
+    async def _read_execute(self, request: web.Request) -> (dict, List[dict]):
+        """Reads an execute request's JSON payload, and the files if it has any."""
+
+        if not request.content_type.startswith("multipart/"):
+            return await request.json(), []
+
+        body, files = {}, []
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == "payload_json":
+                body = json.loads(await part.text())
+                continue
+
+            size = 0
+            while True:
+                chunk = await part.read_chunk()
+                if not chunk:
+                    break
+                size += len(chunk)
+            self.uploaded += size
+
+            id = self.snowflake()
+            url = f"http://127.0.0.1:{self.port}/attachments/{id}/{part.filename}"
+            files.append(
+                {
+                    "id": str(id),
+                    "filename": part.filename,
+                    "size": size,
+                    "url": url,
+                    "proxy_url": url,
+                }
+            )
+        return body, files
+
+    async def _execute(self, request: web.Request) -> web.Response:
+        await self._wait()
+        webhook = int(request.match_info["webhook"])
+        body, files = await self._read_execute(request)
+
+        now = time.monotonic()
+        bucket = self._buckets.get(webhook)
+        if bucket is None:
+            bucket = self._buckets[webhook] = _Bucket(self.rate_limit)
+        if now >= bucket.reset_at:
+            bucket.remaining = self.rate_limit
+            bucket.reset_at = now + self.rate_window
+
+        reset_after = max(0.0, bucket.reset_at - now)
+        if bucket.remaining <= 0:
+            self.ratelimited += 1
+            return web.json_response(
+                {
+                    "message": "You are being rate limited.",
+                    "retry_after": reset_after,
+                    "global": False,
+                },
+                status=429,
+                headers=self._ratelimit_headers(0, reset_after),
+            )
+
+        bucket.remaining -= 1
+        self.executes += 1
+        channel = self._channels.get(webhook, webhook)
+        author = user_payload(webhook, bot=True)
+        author["username"] = body.get("username") or author["username"]
+        return web.json_response(
+            self.message_payload(
+                channel,
+                None,
+                author,
+                body.get("content", ""),
+                webhook_id=webhook,
+                attachments=files,
+            ),
+            headers=self._ratelimit_headers(bucket.remaining, reset_after),
+        )
+
+    def _ratelimit_headers(self, remaining: int, reset_after: float) -> dict:
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": "webhook",
+        }
@@ -0,0 +1,76 @@
+"""Compares the old nested-subquery System.fetch_from_user query with the registered join.
+
+Needs a database, see benchmarks/schema.py.
+Run from the repository root: python -m benchmarks.fetch_from_user [systems] [queries]
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+from proxytools.core import SYSTEM_BY_ACCOUNT, Database
+
+from .schema import setup
+
+OLD_SQL = """select systems.*,
+array(select uid from accounts where system = (select system from accounts where uid = $1)) as accounts,
+(select count(*) from members where system = (select system from accounts where uid = $1)) as member_count
+from systems where id = (select system from accounts where uid = $1)"""
+
+
+async def populate(db: Database, systems: int):
+    await db.execute(
+        """insert into systems (hid, name)
+        select lpad(to_hex(i), 5, '0'), 'system ' || i from generate_series(1, $1) i""",
+        systems,
+    )
+    # one to three accounts per system
+    await db.execute("""insert into accounts (uid, system)
+        select s.id * 10 + n, s.id from systems s, generate_series(0, (s.id % 3)) n""")
+    # up to 50 members per system
+    await db.execute("""insert into members (hid, system, name)
+        select lpad(to_hex(s.id * 64 + n), 5, '0'), s.id, 'member ' || n
+        from systems s, generate_series(1, s.id % 51) n""")
+    await db.execute("analyze")
+
+
+async def timed(db: Database, query, uids: list) -> list:
+    latencies = []
+    for uid in uids:
+        start = time.perf_counter()
+        await db.fetchrow(query, uid)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+async def run(systems: int, queries: int):
+    db = await setup(1, 1)
+    await populate(db, systems)
+
+    rng = random.Random(0)
+    uids = [rng.randint(1, systems) * 10 for _ in range(queries)]
+
+    # warm up both, so neither pays for preparing the statement
+    await timed(db, OLD_SQL, uids[:100])
+    await timed(db, SYSTEM_BY_ACCOUNT, uids[:100])
+
+    old = await timed(db, OLD_SQL, uids)
+    new = await timed(db, SYSTEM_BY_ACCOUNT, uids)
+    await db.close()
+
+    print(f"{systems} systems, {queries} queries")
+    for name, lat in (("nested subqueries", old), ("single join", new)):
+        p50 = lat[len(lat) // 2] * 1e6
+        p99 = lat[int(len(lat) * 0.99)] * 1e6
+        print(f"{name:20} p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+
+
+def main():
+    systems = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    asyncio.run(run(systems, queries))
+
+
+if __name__ == "__main__":
+    main()
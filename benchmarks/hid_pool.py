@@ -0,0 +1,106 @@
+"""Compares creating systems with the old random-retry ID search and with the free ID pool,
+as the system ID space fills up.
+
+Needs a database, see benchmarks/schema.py.
+Run from the repository root: python -m benchmarks.hid_pool [fill percentages] [systems]
+e.g. python -m benchmarks.hid_pool 10,50,90 2000
+"""
+
+import asyncio
+import sys
+import time
+
+from proxytools.core import Database
+
+from .schema import setup
+
+# find_free_system_hid before the pool was added
+OLD_FUNCTION = """create function old_find_free_system_hid() returns char(5) as $$
+declare new_hid char(5);
+begin
+    loop
+        new_hid := generate_hid();
+        if not exists (select 1 from systems where hid = new_hid) then return new_hid; end if;
+    end loop;
+end
+$$ language plpgsql volatile;"""
+
+HID_SPACE = 26**5
+CONCURRENCY = 8
+
+
+async def fill(db: Database, percent: int):
+    """Fills roughly the given percentage of the system ID space."""
+
+    await db.execute("truncate systems cascade")
+    await db.execute("truncate free_system_hids")
+    await db.execute(
+        """insert into systems (hid)
+        select chr(97 + i / 456976) || chr(97 + i / 17576 % 26) || chr(97 + i / 676 % 26)
+            || chr(97 + i / 26 % 26) || chr(97 + i % 26)
+        from generate_series(0, $1 - 1) i
+        where random() < $2""",
+        HID_SPACE,
+        percent / 100,
+    )
+    await db.execute("analyze systems")
+
+
+async def create(db: Database, function: str, count: int) -> list:
+    """Creates `count` systems from CONCURRENCY tasks at once, returning each one's latency."""
+
+    latencies = []
+
+    async def worker(n: int):
+        for _ in range(n):
+            start = time.perf_counter()
+            await db.execute(f"insert into systems (hid) values ({function}())")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[worker(count // CONCURRENCY) for _ in range(CONCURRENCY)])
+    return sorted(latencies)
+
+
+def summary(name: str, latencies: list, elapsed: float):
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(
+        f"  {name:12} p50 {p50:8.1f} us   p99 {p99:8.1f} us   {len(latencies) / elapsed:8.0f} systems/s"
+    )
+
+
+async def run(fills: list, systems: int):
+    db = await setup(CONCURRENCY, CONCURRENCY)
+    await db.execute(OLD_FUNCTION)
+
+    for percent in fills:
+        await fill(db, percent)
+        print(f"{percent}% of system IDs taken, creating {systems} systems")
+
+        start = time.perf_counter()
+        old = await create(db, "old_find_free_system_hid", systems)
+        summary("retry loop", old, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        added = await db.fetchval("select refill_system_hids($1)", systems)
+        print(
+            f"  refilled {added} IDs in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+        start = time.perf_counter()
+        new = await create(db, "find_free_system_hid", systems)
+        summary("pool", new, time.perf_counter() - start)
+
+    await db.close()
+
+
+def main():
+    fills = [
+        int(f) for f in (sys.argv[1] if len(sys.argv) > 1 else "10,50,90").split(",")
+    ]
+    systems = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    asyncio.run(run(fills, systems))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compares looking up proxied messages in an unpartitioned messages table without an index on
+original_mid (as before migration 008) with the partitioned and indexed table.
+
+Needs a database, see benchmarks/schema.py.
+Run from the repository root: python -m benchmarks.message_lookup [messages] [queries]
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+from proxytools.core import MESSAGE_BY_ID, Database
+
+from .schema import setup
+
+OLD_SQL = "select * from messages_flat where mid = $1 or original_mid = $1"
+# Discord's epoch, for generating snowflakes
+EPOCH = 1420070400000
+
+
+async def populate(db: Database, messages: int) -> int:
+    """Logs `messages` proxied messages spread over the last year, and returns the newest ID."""
+
+    await db.execute("""insert into systems (hid, name) values ('aaaaa', 'system');
+        insert into members (hid, system, name) values ('aaaaa', 1, 'member');""")
+    await db.fetchval("select create_message_partitions(1)")
+    now = (int(time.time() * 1000) - EPOCH) << 22
+    year = (365 * 24 * 3600 * 1000) << 22
+    # the original is sent a second before the proxied message
+    await db.execute(
+        """insert into messages (mid, channel, member, sender, original_mid)
+        select m, 1, 1, 1, m - (1000::bigint << 22)
+        from (select $2::bigint - i * ($3::bigint / $1) as m from generate_series(1, $1) i) s""",
+        messages,
+        now,
+        year,
+    )
+    await db.execute("""create table messages_flat as select * from messages;
+        alter table messages_flat add primary key (mid);
+        analyze""")
+    return now
+
+
+async def timed(db: Database, query, ids: list) -> list:
+    latencies = []
+    for id in ids:
+        start = time.perf_counter()
+        await db.fetchrow(query, id)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+async def run(messages: int, queries: int):
+    db = await setup(1, 1)
+    await populate(db, messages)
+
+    # look up proxied messages by their original, which is what the old query had to scan for
+    rng = random.Random(0)
+    mids = [row[0] for row in await db.fetch("select mid from messages")]
+    ids = [mid - (1000 << 22) for mid in (rng.choice(mids) for _ in range(queries))]
+
+    await timed(db, OLD_SQL, ids[:10])
+    await timed(db, MESSAGE_BY_ID, ids[:10])
+
+    old = await timed(db, OLD_SQL, ids)
+    new = await timed(db, MESSAGE_BY_ID, ids)
+    await db.close()
+
+    print(f"{messages} messages, {queries} queries")
+    for name, lat in (("single table", old), ("partitioned", new)):
+        p50 = lat[len(lat) // 2] * 1e6
+        p99 = lat[int(len(lat) * 0.99)] * 1e6
+        print(f"{name:20} p50 {p50:10.1f} us   p99 {p99:10.1f} us")
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(run(messages, queries))
+
+
+if __name__ == "__main__":
+    main()
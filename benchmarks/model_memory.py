@@ -0,0 +1,89 @@
+"""Compares the memory used by cached members with the old kwargs-based classes and the slotted models.
+
+Needs a database, see benchmarks/schema.py.
+Run from the repository root: python -m benchmarks.model_memory [members]
+"""
+
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from proxytools.core import Member, Privacy
+
+from .schema import setup
+
+
+class OldProxyTag:
+    def __init__(self, **kwargs):
+        self.prefix = kwargs.get("prefix", None)
+        self.suffix = kwargs.get("suffix", None)
+
+
+class OldMember:
+    def __init__(self, **kwargs):
+        self.id = kwargs.get("id")
+        self.hid = kwargs.get("hid")
+        self.system_hid = kwargs.get("system_hid", None)
+        self.name = kwargs.get("name")
+        self.display_name = kwargs.get("display_name", None)
+        self.colour = kwargs.get("colour", None)
+        self.avatar_url = kwargs.get("avatar_url", None)
+        self.created = kwargs.get("created")
+        self.keep_proxy = kwargs.get("keep_proxy")
+
+        proxy_tags = kwargs.get("proxy_tags", [])
+        self.proxy_tags = [OldProxyTag(**row) for row in proxy_tags]
+
+        self.description_privacy = Privacy.__dict__[
+            kwargs.get("description_privacy").upper()
+        ]
+
+
+def measure(name: str, build, rows: list):
+    # timed separately, as tracing slows down allocations
+    gc.collect()
+    start = time.perf_counter()
+    objects = build(rows)
+    elapsed = time.perf_counter() - start
+    del objects
+
+    gc.collect()
+    tracemalloc.start()
+    objects = build(rows)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{name:12} {size / 1024 / 1024:8.1f} MiB   {size / len(objects):6.0f} B/member   {elapsed:6.2f} s"
+    )
+    del objects
+
+
+async def fetch(count: int) -> list:
+    db = await setup(1, 1)
+    rows = await db.fetch(
+        """select i as id, lpad(to_hex(i), 5, '0') as hid, 1 as system,
+        'member ' || i as name, null::text as display_name, null::char(6) as colour,
+        null::text as description, null::text as avatar_url, now() as created, false as keep_proxy,
+        'PUBLIC'::privacy as description_privacy,
+        array[row('[' || i, i || ']')::proxy_tag] as proxy_tags
+        from generate_series(1, $1) i""",
+        count,
+    )
+    await db.close()
+    return rows
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rows = asyncio.run(fetch(count))
+
+    print(f"{count} members, memory allocated building them (not counting the rows)")
+    measure("kwargs", lambda rows: [OldMember(**row) for row in rows], rows)
+    measure("slotted", Member.from_records, rows)
+
+
+if __name__ == "__main__":
+    main()
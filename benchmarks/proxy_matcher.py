@@ -0,0 +1,92 @@
+"""Compares ProxyMatcher against looping over Member.match_proxy for every member.
+
+Run from the repository root: python -m benchmarks.proxy_matcher [members] [tags per member]
+"""
+
+import random
+import string
+import sys
+import timeit
+
+from proxytools.core import Member, ProxyMatcher
+
+
+def make_members(count: int, tags: int) -> list:
+    rng = random.Random(0)
+    members = []
+    for i in range(count):
+        proxy_tags = []
+        for _ in range(tags):
+            word = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 4)))
+            kind = rng.randrange(3)
+            if kind == 0:
+                proxy_tags.append({"prefix": f"{word}:", "suffix": None})
+            elif kind == 1:
+                proxy_tags.append({"prefix": None, "suffix": f"-{word}"})
+            else:
+                proxy_tags.append({"prefix": f"[{word}", "suffix": f"{word}]"})
+
+        members.append(
+            Member(
+                id=i,
+                hid=f"{i:05}",
+                name=f"member {i}",
+                proxy_tags=proxy_tags,
+                keep_proxy=False,
+                description_privacy="PUBLIC",
+            )
+        )
+    return members
+
+
+def make_messages(members: list, count: int) -> list:
+    rng = random.Random(1)
+    messages = []
+    for _ in range(count):
+        text = " ".join(
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 8)))
+            for _ in range(rng.randint(3, 20))
+        )
+        # roughly half of all messages are proxied
+        if rng.random() < 0.5:
+            tag = rng.choice(rng.choice(members).proxy_tags)
+            text = f"{tag.prefix or ''}{text}{tag.suffix or ''}"
+        messages.append(text)
+    return messages
+
+
+def linear(members: list, messages: list):
+    for content in messages:
+        for member in members:
+            matched, _ = member.match_proxy(content)
+            if matched:
+                break
+
+
+def compiled(matcher: ProxyMatcher, messages: list):
+    for content in messages:
+        matcher.match(content)
+
+
+def main():
+    member_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    tag_count = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    members = make_members(member_count, tag_count)
+    messages = make_messages(members, 1000)
+
+    build = min(timeit.repeat(lambda: ProxyMatcher(members), number=1, repeat=5))
+    matcher = ProxyMatcher(members)
+
+    old = min(timeit.repeat(lambda: linear(members, messages), number=1, repeat=5))
+    new = min(timeit.repeat(lambda: compiled(matcher, messages), number=1, repeat=5))
+
+    print(f"{member_count} members, {tag_count} tags each, {len(messages)} messages")
+    print(f"build ProxyMatcher:   {build * 1e3:8.3f} ms")
+    print(f"Member.match_proxy:   {old / len(messages) * 1e6:8.3f} us/message")
+    print(f"ProxyMatcher.match:   {new / len(messages) * 1e6:8.3f} us/message")
+    print(f"speedup:              {old / new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
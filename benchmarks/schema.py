@@ -0,0 +1,49 @@
+"""Sets up a scratch schema for benchmarks that need a database.
+
+Benchmarks take the database URL from the PROXYTOOLS_BENCH_DB environment variable.
+Everything is created in its own schema, which is dropped and recreated on every run,
+so the rest of the database is left alone."""
+
+import logging
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import asyncpg
+
+from proxytools.core import Database, Migrator
+
+SCHEMA = "proxytools_bench"
+
+
+def dsn() -> str:
+    url = os.environ.get("PROXYTOOLS_BENCH_DB")
+    if url is None:
+        raise SystemExit(
+            "Set PROXYTOOLS_BENCH_DB to a Postgres URL to run this benchmark"
+        )
+    return url
+
+
+def schema_dsn(url: str) -> str:
+    """Adds the benchmark schema to the search path of the given URL."""
+
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query["search_path"] = SCHEMA
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+async def setup(min_size: int = 2, max_size: int = 10) -> Database:
+    """Recreates the benchmark schema, applies all migrations and returns a pool using it."""
+
+    url = dsn()
+    conn = await asyncpg.connect(url)
+    try:
+        await conn.execute(f"drop schema if exists {SCHEMA} cascade")
+        await conn.execute(f"create schema {SCHEMA}")
+    finally:
+        await conn.close()
+
+    db = await Database.create(schema_dsn(url), min_size=min_size, max_size=max_size)
+    await Migrator(db, logging.getLogger("benchmarks")).run()
+    return db
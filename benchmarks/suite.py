@@ -0,0 +1,378 @@
+"""Runs the whole bot offline and measures proxying, commands, proxy matching and the database layer.
+
+Messages are dispatched through the bot's event manager as synthetic GuildMessageCreateEvents,
+the bot's REST client and webhook executor talk to an in-process fake Discord (see fake_discord.py),
+and systems and members are generated in the benchmark database (see schema.py).
+
+Every scenario reports p50/p99 latency and operations per second. Results can be saved as JSON
+and compared against an earlier run:
+
+python -m benchmarks.suite --output before.json
+python -m benchmarks.suite --compare before.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import hikari
+
+from .fake_discord import FakeDiscord, user_payload
+from .schema import dsn, schema_dsn, setup
+
+# __main__ imports `core` and the bot loads its extensions as `commands.*`,
+# both from the proxytools directory, so import the bot the same way here
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "proxytools"))
+import core  # noqa: E402
+
+PREFIX = "pt;"
+GUILD = 1
+# account and channel IDs start here, so they don't collide with anything the fake generates
+ACCOUNT_BASE = 10_000_000
+CHANNEL_BASE = 20_000_000
+
+
+class Scenario:
+    """Latencies and throughput of one benchmark scenario."""
+
+    name: str
+    latencies: List[float]
+    elapsed: float
+
+    def __init__(self, name: str, latencies: List[float], elapsed: float):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.elapsed = elapsed
+
+    def percentile(self, p: float) -> float:
+        return self.latencies[
+            min(len(self.latencies) - 1, int(len(self.latencies) * p))
+        ]
+
+    def result(self) -> dict:
+        return {
+            "count": len(self.latencies),
+            "seconds": self.elapsed,
+            "per_second": len(self.latencies) / self.elapsed,
+            "mean_ms": sum(self.latencies) / len(self.latencies) * 1000,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+        }
+
+
+async def populate(db: core.Database, systems: int, members: int):
+    """Creates `systems` systems with one account and `members` members each.
+    Member k of every system has the proxy tag `mk:`."""
+
+    await db.execute(
+        """insert into systems (hid, name)
+        select lpad(to_hex(i), 5, '0'), 'system ' || i from generate_series(1, $1) i""",
+        systems,
+    )
+    await db.execute(
+        """insert into accounts (uid, system)
+        select $2 + i, i from generate_series(1, $1) i""",
+        systems,
+        ACCOUNT_BASE,
+    )
+    await db.execute(
+        """insert into members (hid, system, name, display_name, proxy_tags)
+        select lpad(to_hex((s - 1) * $2 + k), 5, '0'), s, 'member ' || k, 'Member ' || k,
+        array[row('m' || k || ':', null)::proxy_tag]
+        from generate_series(1, $1) s, generate_series(1, $2) k""",
+        systems,
+        members,
+    )
+    await db.execute("analyze")
+
+
+class Harness:
+    """Drives synthetic messages through a bot backed by a fake Discord."""
+
+    bot: core.Proxytools
+    fake: FakeDiscord
+    rng: random.Random
+
+    systems: int
+    members: int
+    channels: int
+    concurrency: int
+
+    def __init__(
+        self,
+        bot: core.Proxytools,
+        fake: FakeDiscord,
+        systems: int,
+        members: int,
+        channels: int,
+        concurrency: int,
+    ):
+        self.bot = bot
+        self.fake = fake
+        self.rng = random.Random(0)
+        self.systems = systems
+        self.members = members
+        self.channels = channels
+        self.concurrency = concurrency
+
+    def event(self, content: str) -> hikari.GuildMessageCreateEvent:
+        """Returns a message event from a random account in a random channel."""
+
+        account = ACCOUNT_BASE + self.rng.randint(1, self.systems)
+        channel = CHANNEL_BASE + self.rng.randrange(self.channels)
+        payload = self.fake.message_payload(
+            channel, GUILD, user_payload(account), content
+        )
+        message = self.bot.entity_factory.deserialize_message(payload)
+        return hikari.GuildMessageCreateEvent(message=message, shard=None)
+
+    def proxy_content(self) -> str:
+        return f"m{self.rng.randint(1, self.members)}: hello from the benchmark"
+
+    async def measure(
+        self, name: str, count: int, op: Callable[[], Awaitable]
+    ) -> Scenario:
+        """Runs `op` `count` times, `concurrency` at a time.
+        It's run `concurrency` times first without being measured, to fill the connection pool.
+        """
+
+        await asyncio.gather(*[op() for _ in range(self.concurrency)])
+        latencies = []
+
+        async def worker(n: int):
+            for _ in range(n):
+                start = time.perf_counter()
+                await op()
+                latencies.append(time.perf_counter() - start)
+
+        per_worker, extra = divmod(count, self.concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                worker(per_worker + (1 if i < extra else 0))
+                for i in range(self.concurrency)
+            ]
+        )
+        return Scenario(name, latencies, time.perf_counter() - start)
+
+    async def dispatch(self, content: str):
+        await self.bot.dispatch(self.event(content))
+
+    async def warm_up(self):
+        """Creates a webhook for every channel, so the measured runs don't include creating them."""
+
+        for i in range(self.channels):
+            payload = self.fake.message_payload(
+                CHANNEL_BASE + i,
+                GUILD,
+                user_payload(ACCOUNT_BASE + 1),
+                "m1: warming up",
+            )
+            message = self.bot.entity_factory.deserialize_message(payload)
+            await self.bot.dispatch(
+                hikari.GuildMessageCreateEvent(message=message, shard=None)
+            )
+
+    async def run(self, messages: int, commands: int, queries: int) -> List[Scenario]:
+        db = self.bot.db
+        scenarios = []
+
+        # in-memory proxy tag matching, against the matchers the bot would use
+        matchers = [
+            await self.bot.proxier.matcher(s)
+            for s in range(1, min(self.systems, 100) + 1)
+        ]
+        contents = [self.proxy_content() for _ in range(1000)]
+        it = iter(range(messages * 10 + self.concurrency))
+
+        async def match():
+            i = next(it)
+            matchers[i % len(matchers)].match(contents[i % len(contents)])
+
+        scenarios.append(await self.measure("match", messages * 10, match))
+
+        # the database layer, without the bot's caches in front of it
+        async def system_by_account():
+            await core.System.fetch_from_user(
+                db, ACCOUNT_BASE + self.rng.randint(1, self.systems)
+            )
+
+        async def members_by_system():
+            await core.Member.fetch_for_system(db, self.rng.randint(1, self.systems))
+
+        scenarios.append(
+            await self.measure("db.system_by_account", queries, system_by_account)
+        )
+        scenarios.append(
+            await self.measure("db.members_by_system", queries, members_by_system)
+        )
+
+        await self.warm_up()
+
+        scenarios.append(
+            await self.measure(
+                "proxy", messages, lambda: self.dispatch(self.proxy_content())
+            )
+        )
+        scenarios.append(
+            await self.measure(
+                "not_proxied",
+                messages,
+                lambda: self.dispatch("just a normal message without tags"),
+            )
+        )
+        scenarios.append(
+            await self.measure(
+                "command.system", commands, lambda: self.dispatch(f"{PREFIX}system")
+            )
+        )
+        scenarios.append(
+            await self.measure(
+                "command.fronter",
+                commands,
+                lambda: self.dispatch(f"{PREFIX}system fronter"),
+            )
+        )
+        return scenarios
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def report(results: Dict[str, dict], baseline: Dict[str, dict] = None):
+    for name, r in results.items():
+        line = (
+            f"{name:22} {r['count']:7} ops  {r['per_second']:9.0f}/s   "
+            f"p50 {r['p50_ms']:8.3f} ms   p99 {r['p99_ms']:8.3f} ms"
+        )
+        old = (baseline or {}).get(name)
+        if old is not None:
+            line += (
+                f"   ({(r['per_second'] / old['per_second'] - 1) * 100:+.1f}% /s, "
+                f"{(r['p99_ms'] / old['p99_ms'] - 1) * 100:+.1f}% p99)"
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the bot offline against a fake Discord."
+    )
+    parser.add_argument("--systems", type=int, default=1000)
+    parser.add_argument("--members", type=int, default=20, help="members per system")
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--commands", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--latency", type=float, default=20, help="simulated REST latency, in ms"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=5,
+        help="webhook executes allowed per 2 seconds, per webhook",
+    )
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved earlier")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    loop = asyncio.get_event_loop()
+
+    async def prepare() -> FakeDiscord:
+        db = await setup()
+        await populate(db, args.systems, args.members)
+        await db.close()
+
+        fake = FakeDiscord(
+            latency=args.latency / 1000, rate_limit=args.rate_limit, guild=GUILD
+        )
+        await fake.start()
+        return fake
+
+    fake = loop.run_until_complete(prepare())
+    bot = core.Proxytools(
+        "fake token",
+        [PREFIX],
+        schema_dsn(dsn()),
+        db_max_size=args.concurrency,
+        rest_url=fake.url,
+        banner=None,
+        logs="WARNING",
+    )
+
+    async def run() -> List[Scenario]:
+        bot.rest.start()
+        await bot.dispatch(hikari.StartingEvent(app=bot))
+        try:
+            harness = Harness(
+                bot,
+                fake,
+                args.systems,
+                args.members,
+                args.channels,
+                args.concurrency,
+            )
+            return await harness.run(args.messages, args.commands, args.queries)
+        finally:
+            await bot.dispatch(hikari.StoppingEvent(app=bot))
+            await bot.rest.close()
+            await bot.db.close()
+            await fake.close()
+
+    scenarios = loop.run_until_complete(run())
+    results = {s.name: s.result() for s in scenarios}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    print(
+        f"{args.systems} systems x {args.members} members, {args.channels} channels, "
+        f"concurrency {args.concurrency}, {args.latency:.0f} ms REST latency"
+    )
+    report(results, baseline)
+    print(
+        f"fake Discord: {fake.executes} webhook executes, {fake.ratelimited} 429s, "
+        f"{fake.deleted} deletes, {fake.created} messages"
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "timestamp": datetime.datetime.now(
+                        datetime.timezone.utc
+                    ).isoformat(),
+                    "commit": git_commit(),
+                    "python": sys.version.split()[0],
+                    "config": vars(args),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measures export and import throughput and peak memory on a large synthetic system.
+
+Needs a database, see benchmarks/schema.py.
+Run from the repository root: python -m benchmarks.transfer [members] [switches]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from proxytools.core import Database, export_system, import_system
+
+from .schema import setup
+
+
+async def populate(db: Database, members: int, switches: int):
+    await db.execute("insert into systems (hid, name) values ('aaaaa', 'benchmark')")
+    await db.execute("insert into accounts (uid, system) values (1, 1)")
+    await db.execute(
+        """insert into members (hid, system, name, display_name, description, colour, proxy_tags)
+        select lpad(to_hex(i), 5, '0'), 1, 'member ' || i, 'Member Number ' || i,
+        repeat('A fairly ordinary member description. ', 5), 'ff8800',
+        array[row('[' || i, ']')::proxy_tag, row(i || ':', null)::proxy_tag]
+        from generate_series(1, $1) i""",
+        members,
+    )
+    await db.execute(
+        """insert into switches (system, timestamp)
+        select 1, now() - i * interval '1 minute' from generate_series(1, $1) i""",
+        switches,
+    )
+    # one to three members per switch
+    await db.execute(
+        """insert into switch_members (switch, member)
+        select s, ((s * 7 + n) % $1) + 1 from generate_series(1, $2) s, generate_series(0, s % 3) n""",
+        members,
+        switches,
+    )
+
+
+async def read(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                return
+            yield chunk
+
+
+def report(name: str, elapsed: float, size: int, rows: int, peak: int):
+    print(
+        f"{name:8} {elapsed:6.2f} s   {size / elapsed / 1024 / 1024:6.1f} MiB/s   "
+        f"{rows / elapsed:8.0f} rows/s   peak {peak / 1024 / 1024:6.1f} MiB"
+    )
+
+
+async def export(db: Database, path: str):
+    with open(path, "wb") as f:
+        async for chunk in export_system(db, 1):
+            f.write(chunk)
+
+
+async def measure(fn) -> (float, int):
+    """Runs `fn` twice: once timed, and once with allocations traced to find its peak memory use."""
+
+    start = time.perf_counter()
+    await fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    await fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+async def run(members: int, switches: int):
+    db = await setup()
+    await populate(db, members, switches)
+    rows = members + switches
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "export.json")
+
+        elapsed, peak = await measure(lambda: export(db, path))
+        size = os.path.getsize(path)
+        print(f"{members} members, {switches} switches, {size / 1024 / 1024:.1f} MiB")
+        report("export", elapsed, size, rows, peak)
+
+        users = iter(range(2, 4))
+        elapsed, peak = await measure(
+            lambda: import_system(db, next(users), read(path))
+        )
+        report("import", elapsed, size, rows, peak)
+
+    await db.close()
+
+
+def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    switches = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    asyncio.run(run(members, switches))
+
+
+if __name__ == "__main__":
+    main()
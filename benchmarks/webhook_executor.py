@@ -0,0 +1,155 @@
+"""Runs WebhookExecutor against a local fake of Discord's webhook endpoint.
+
+The fake enforces a per-webhook rate limit and reports it in the usual headers,
+so this shows both how many 429s the executor runs into and that busy webhooks
+don't slow down the others.
+
+Run from the repository root:
+python -m benchmarks.webhook_executor [webhooks] [messages per webhook] [limit] [window]
+"""
+
+import asyncio
+import sys
+import time
+
+from aiohttp import web
+from hikari.impl import entity_factory
+
+from proxytools.core import ProxyWebhook, WebhookExecutor
+
+
+class FakeDiscord:
+    """Allows `limit` executions per webhook every `window` seconds."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.buckets = {}
+        self.requests = 0
+        self.ratelimited = 0
+        self.next_id = 1
+
+    async def execute(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        webhook = int(request.match_info["id"])
+
+        now = time.monotonic()
+        reset_at, used = self.buckets.get(webhook, (now + self.window, 0))
+        if now >= reset_at:
+            reset_at, used = now + self.window, 0
+
+        if used >= self.limit:
+            self.ratelimited += 1
+            return web.json_response(
+                {"retry_after": reset_at - now, "global": False}, status=429
+            )
+
+        self.buckets[webhook] = (reset_at, used + 1)
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.limit - used - 1),
+            "X-RateLimit-Reset-After": f"{reset_at - now:.3f}",
+        }
+
+        body = await request.json()
+        self.next_id += 1
+        return web.json_response(
+            message(self.next_id, webhook, body["content"]), headers=headers
+        )
+
+
+def message(id: int, webhook: int, content: str) -> dict:
+    return {
+        "id": str(id),
+        "channel_id": str(webhook),
+        "webhook_id": str(webhook),
+        "author": {
+            "id": str(webhook),
+            "username": "proxied member",
+            "discriminator": "0000",
+            "avatar": None,
+        },
+        "content": content,
+        "timestamp": "2021-09-15T22:39:48.000000+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+
+class App:
+    def __init__(self):
+        self.entity_factory = entity_factory.EntityFactoryImpl(self)
+
+
+async def run(webhooks: int, messages: int, limit: int, window: float):
+    fake = FakeDiscord(limit, window)
+    server = web.Application()
+    server.router.add_post("/webhooks/{id}/{token}", fake.execute)
+    runner = web.AppRunner(server)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    app = App()
+    executor = WebhookExecutor(
+        app, base_url=f"http://127.0.0.1:{port}", max_queue=messages
+    )
+
+    async def send(webhook: ProxyWebhook, count: int) -> list:
+        latencies = []
+
+        async def one(i: int):
+            start = time.perf_counter()
+            await executor.execute(webhook, f"message {i}")
+            latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*[one(i) for i in range(count)])
+        return latencies
+
+    # the first webhook is the busy channel, every other one sends a single message
+    busy = ProxyWebhook(app, 1, 1, "token")
+    quiet = [ProxyWebhook(app, i, i, "token") for i in range(2, webhooks + 1)]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(send(busy, messages), *[send(w, 1) for w in quiet])
+    elapsed = time.perf_counter() - start
+
+    await executor.close()
+    await runner.cleanup()
+
+    busy_latencies = sorted(results[0])
+    quiet_latencies = sorted(lat for r in results[1:] for lat in r)
+
+    print(
+        f"{messages} messages to 1 busy webhook, 1 message each to {len(quiet)} others"
+    )
+    print(f"rate limit: {limit} per {window}s per webhook")
+    print(f"total time:           {elapsed:8.3f} s")
+    print(f"requests:             {fake.requests:8}")
+    print(f"429 responses:        {fake.ratelimited:8}")
+    print(
+        f"busy webhook p50:     {busy_latencies[len(busy_latencies) // 2] * 1e3:8.1f} ms"
+    )
+    if quiet_latencies:
+        print(f"other webhooks max:   {quiet_latencies[-1] * 1e3:8.1f} ms")
+
+
+def main():
+    webhooks = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    window = float(sys.argv[4]) if len(sys.argv) > 4 else 2
+
+    asyncio.run(run(webhooks, messages, limit, window))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,55 +16,260 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import argparse
 import asyncio
 import logging
+import multiprocessing
 import os
 import configparser
-from pathlib import Path
+import time
+
+import hikari
 
 import core
 
+CONFIG = "./proxytools.ini"
 
-def main():
+
+def read_config(path: str) -> configparser.ConfigParser:
+    config = configparser.ConfigParser()
+    config.read(path)
+    for section in (
+        "bot",
+        "database",
+        "proxy",
+        "cluster",
+        "metrics",
+        "logging",
+        "ratelimit",
+    ):
+        if not config.has_section(section):
+            config.add_section(section)
+    return config
+
+
+def parse_limits(value: str) -> dict:
+    """Parses a comma-separated list of `logger:number` pairs."""
+
+    limits = dict()
+    for item in value.split(","):
+        if item.strip():
+            name, number = item.rsplit(":", 1)
+            limits[name.strip()] = float(number)
+    return limits
+
+
+def parse_upload_limits(value: str) -> dict:
+    """Parses a comma-separated list of upload limits in megabytes, one per boost level."""
+
+    limits = dict()
+    tiers = list(hikari.GuildPremiumTier)
+    sizes = [s for s in value.split(",") if s.strip()]
+    if len(sizes) > len(tiers):
+        raise ValueError(f"upload_limits_mb has more than {len(tiers)} sizes")
+    for tier, size in zip(tiers, sizes):
+        limits[tier] = int(size) * core.MiB
+    return limits
+
+
+def configure_logging(config: configparser.ConfigParser):
+    section = config["logging"]
+    core.setup_logging(
+        level=section.get("level", "INFO").upper(),
+        json_format=section.get("format", "text").lower() == "json",
+        file=section.get("file", None) or None,
+        max_queue=section.getint("queue_size", 10000),
+        limiter=core.LogLimiter(
+            rates=parse_limits(section.get("rate_limits", "")),
+            samples=parse_limits(section.get("samples", "")),
+        ),
+    )
+
+
+def create_limits(config: configparser.ConfigParser, kind: str) -> core.RateLimits:
+    section = config["ratelimit"]
+    return core.RateLimits(
+        kind,
+        user=core.RateLimiter.parse(section.get(f"{kind}_user", "")),
+        channel=core.RateLimiter.parse(section.get(f"{kind}_channel", "")),
+        guild=core.RateLimiter.parse(section.get(f"{kind}_guild", "")),
+        sweep_interval=section.getfloat("sweep_interval", 60),
+    )
+
+
+def install_uvloop():
     if os.name != "nt":
         import uvloop
 
         uvloop.install()
 
-    config = configparser.ConfigParser()
-    config.read("./proxytools.ini")
 
-    bot = core.Proxytools(
+def create_bot(config: configparser.ConfigParser, worker: int = 0) -> core.Proxytools:
+    metrics_port = None
+    if config["metrics"].getboolean("enabled", False):
+        # every worker serves its own metrics, on consecutive ports
+        metrics_port = config["metrics"].getint("port", 9100) + worker
+
+    return core.Proxytools(
         config["bot"]["token"],
         config["bot"]["prefixes"].split(","),
         config["database"].get("url", None),
+        db_min_size=config["database"].getint("pool_min_size", 2),
+        db_max_size=config["database"].getint("pool_max_size", 10),
+        messages_flush_interval=config["database"].getint(
+            "messages_flush_interval", 1000
+        )
+        / 1000,
+        messages_flush_rows=config["database"].getint("messages_flush_rows", 500),
+        messages_max_buffered=config["database"].getint("messages_max_buffered", 10000),
+        messages_retention_days=config["database"].getint("messages_retention_days", 0)
+        or None,
+        hid_pool_size=config["database"].getint("hid_pool_size", 1000),
+        webhook_cache_size=config["bot"].getint("webhook_cache_size", 10000),
+        system_cache_size=config["bot"].getint("system_cache_size", 10000),
+        system_cache_ttl=config["bot"].getint("system_cache_ttl", 300),
+        front_cache_size=config["bot"].getint("front_cache_size", 10000),
+        identity_cache_size=config["proxy"].getint("identity_cache_size", 10000),
+        attachment_concurrency=config["proxy"].getint("attachment_concurrency", 4),
+        attachment_max_bytes=config["proxy"].getint("attachment_max_mb", 100)
+        * core.MiB,
+        upload_limits=parse_upload_limits(config["proxy"].get("upload_limits_mb", "")),
+        user_cache_size=config["bot"].getint("user_cache_size", 1000),
+        user_cache_ttl=config["bot"].getint("user_cache_ttl", 60),
+        resolve_accounts=config["bot"].getboolean("resolve_accounts", True),
+        import_max_bytes=config["bot"].getint("import_max_mb", 50) * core.MiB,
+        proxy_queue_size=config["proxy"].getint("queue_size", 50),
+        proxy_queue_policy=core.QueuePolicy.get(
+            config["proxy"].get("queue_policy", "delay")
+        ),
+        autoproxy_cache_size=config["proxy"].getint("autoproxy_cache_size", 10000),
+        autoproxy_flush_interval=config["proxy"].getint(
+            "autoproxy_flush_interval", 5000
+        )
+        / 1000,
+        command_limits=create_limits(config, "commands"),
+        proxy_limits=create_limits(config, "proxy"),
+        metrics_host=config["metrics"].get("host", "127.0.0.1"),
+        metrics_port=metrics_port,
     )
 
-    db_log = core.getLogger("database", logging.INFO)
 
-    migrations = []
-    for file in Path("proxytools/core/sql/migrations").iterdir():
-        if file.is_file():
-            migrations.append((file.name, file.read_text()))
+async def migrate(db: core.Database, log: logging.Logger) -> dict:
+    """Runs the migrations, exiting if one fails. Returns how long each step took."""
 
-    migrations.sort(key=lambda m: m[0])
-    migrations = [m[1] for m in migrations]
+    try:
+        result = await core.Migrator(db, log).run()
+    except core.MigrationError as e:
+        log.critical(str(e))
+        raise SystemExit(1)
 
-    loop = asyncio.get_event_loop()
+    if result.applied:
+        log.info("Applied %d migration(s)", len(result.applied))
+    if not result.functions_updated:
+        log.info("SQL functions are up to date")
+    return result.timings
 
-    applied = loop.run_until_complete(bot.run_migrations(migrations))
-    if applied != 0:
-        db_log.info(f"Applied {applied} migration(s)!")
 
-    clean = Path("proxytools/core/sql/clean.sql").read_text()
-    loop.run_until_complete(bot.db.execute(clean))
-    db_log.info(f"Cleaned existing functions and views.")
+def log_timings(log: logging.Logger, timings: dict):
+    log.info(
+        "Startup: " + ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in timings.items())
+    )
 
-    funcs = Path("proxytools/core/sql/functions.sql").read_text()
-    loop.run_until_complete(bot.db.execute(funcs))
-    db_log.info(f"Created SQL functions")
 
-    bot.run()
+def run_worker(
+    worker: int,
+    shard_ids: list,
+    shard_count: int,
+    queue: multiprocessing.Queue,
+    path: str = CONFIG,
+):
+    """Runs the bot for the given shards in a worker process. The supervisor has already run the migrations."""
+
+    install_uvloop()
+    config = read_config(path)
+    configure_logging(config)
+
+    start = time.perf_counter()
+    bot = create_bot(config, worker)
+    log_timings(
+        core.getLogger("database", logging.INFO),
+        {"pool": time.perf_counter() - start},
+    )
+
+    core.HeartbeatSender(
+        bot, queue, worker, config["cluster"].getfloat("heartbeat_interval", 10)
+    )
+    bot.run(shard_ids=set(shard_ids), shard_count=shard_count)
+
+
+async def prepare_cluster(config: configparser.ConfigParser, shard_count: int) -> int:
+    """Runs the migrations once for all workers, and fetches the recommended shard count if none was given."""
+
+    log = core.getLogger("database", logging.INFO)
+    start = time.perf_counter()
+    db = await core.Database.create(config["database"]["url"], min_size=1, max_size=1)
+    timings = {"pool": time.perf_counter() - start}
+    try:
+        timings.update(await migrate(db, log))
+    finally:
+        await db.close()
+    log_timings(log, timings)
+
+    if not shard_count:
+        shard_count = await core.fetch_shard_count(config["bot"]["token"])
+    return shard_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run proxytools.")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="the number of worker processes to split the shards between",
+    )
+    parser.add_argument(
+        "-s",
+        "--shards",
+        type=int,
+        help="the total number of shards (default: the number Discord recommends)",
+    )
+    args = parser.parse_args()
+
+    config = read_config(CONFIG)
+    configure_logging(config)
+    workers = args.workers or config["cluster"].getint("workers", 1)
+    shard_count = args.shards or config["cluster"].getint("shard_count", 0)
+
+    if workers > 1:
+        log = core.getLogger("cluster", logging.INFO)
+        shard_count = asyncio.run(prepare_cluster(config, shard_count))
+        core.Supervisor(
+            run_worker,
+            log,
+            workers,
+            shard_count,
+            heartbeat_timeout=config["cluster"].getfloat("heartbeat_timeout", 60),
+            start_timeout=config["cluster"].getfloat("start_timeout", 300),
+            health_interval=config["cluster"].getfloat("health_interval", 60),
+        ).run()
+        return
+
+    install_uvloop()
+
+    start = time.perf_counter()
+    bot = create_bot(config)
+    timings = {"pool": time.perf_counter() - start}
+
+    db_log = core.getLogger("database", logging.INFO)
+    loop = asyncio.get_event_loop()
+    timings.update(loop.run_until_complete(migrate(bot.db, db_log)))
+    log_timings(db_log, timings)
+
+    if shard_count:
+        bot.run(shard_ids=set(range(shard_count)), shard_count=shard_count)
+    else:
+        bot.run()
 
 
 if __name__ == "__main__":
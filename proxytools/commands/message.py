@@ -0,0 +1,78 @@
+import logging
+import re
+from typing import Optional
+
+import hikari
+import lightbulb
+
+import core
+
+# a message ID, or the last part of a message link
+MESSAGE_ID = re.compile(r"(?:/|^)(\d{15,20})/?$")
+
+
+class Message(lightbulb.Plugin):
+    _log: logging.Logger
+
+    def __init__(self, bot: core.Proxytools):
+        super().__init__(name="Message")
+        self._log = bot.log
+
+    @lightbulb.command(aliases=["msg"])
+    async def message(self, ctx: core.Context, id: Optional[str] = None):
+        """Show who sent a proxied message in this server. Give its ID or link, or reply to it."""
+
+        if ctx.guild_id is None:
+            raise core.UserError("This command can only be used in a server.")
+
+        if id is not None:
+            match = MESSAGE_ID.search(id.strip("<>"))
+            if match is None:
+                raise core.UserError(f"`{id}` isn't a message ID or link.")
+            mid = hikari.Snowflake(match.group(1))
+        elif ctx.message.referenced_message is not None:
+            mid = ctx.message.referenced_message.id
+        else:
+            raise core.UserError(
+                f"You need to give a message ID or link, or reply to a message with `{ctx.prefix}message`."
+            )
+
+        msg = await ctx.bot.messages.fetch(mid)
+        if msg is not None:
+            # messages from other servers are treated as unknown, so nothing about them is revealed
+            channel = ctx.bot.cache.get_guild_channel(msg.channel)
+            if channel is None or channel.guild_id != ctx.guild_id:
+                msg = None
+        if msg is None:
+            raise core.UserError(
+                "That message wasn't proxied, or it was proxied too long ago."
+            )
+
+        row = await ctx.db.fetchrow(
+            """select members.hid, members.name, systems.hid as system_hid, systems.name as system_name
+            from members join systems on systems.id = members.system
+            where members.id = $1""",
+            msg.member,
+        )
+        if row is None:
+            raise core.UserError("The member that message was proxied as was deleted.")
+
+        system = f"`{row['system_hid']}`"
+        if row["system_name"]:
+            system = f"{row['system_name']} ({system})"
+
+        embed = hikari.Embed(colour=ctx.Colour.DEFAULT)
+        embed.add_field(name="System", value=system, inline=True)
+        embed.add_field(
+            name="Member", value=f"{row['name']} (`{row['hid']}`)", inline=True
+        )
+        embed.add_field(name="Sent by", value=f"<@{msg.sender}>", inline=True)
+        embed.set_footer(
+            text=f"Message ID: {msg.mid} | Original ID: {msg.original_mid}"
+        )
+        embed.timestamp = hikari.Snowflake(msg.mid).created_at
+        await ctx.respond(embed=embed)
+
+
+def load(bot: core.Proxytools):
+    bot.add_plugin(Message(bot))
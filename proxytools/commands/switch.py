@@ -0,0 +1,66 @@
+import logging
+from typing import List
+
+import lightbulb
+
+import core
+
+
+class Switch(lightbulb.Plugin):
+    _log: logging.Logger
+
+    def __init__(self, bot: core.Proxytools):
+        super().__init__(name="Switch")
+        self._log = bot.log
+
+    @core.has_system()
+    @lightbulb.group(aliases=["sw"])
+    async def switch(self, ctx: core.Context, *members: str):
+        """Register a switch to the given members."""
+
+        sys = await ctx.get_system()
+        if not members:
+            return await ctx.reply(
+                f"You need to give at least one member to switch to. Use `{ctx.prefix}switch out` to switch out."
+            )
+
+        matcher = await ctx.bot.proxier.matcher(sys.id)
+        switched: List[core.Member] = []
+        for name in members:
+            member = matcher.find(name)
+            if member is None:
+                raise core.UserError(f"Couldn't find a member named `{name}`.")
+            if member in switched:
+                raise core.UserError(f"Member **{member.name}** is listed twice.")
+            switched.append(member)
+
+        front = await ctx.bot.fronts.get(sys.id)
+        if front.members == tuple(m.id for m in switched):
+            return await ctx.reply(
+                "Those members are already fronting.", colour=ctx.Colour.WARNING
+            )
+
+        await ctx.bot.fronts.register_switch(sys.id, [m.id for m in switched])
+        await ctx.reply(
+            f"Switch registered. Current fronter(s): {', '.join(m.name for m in switched)}",
+            colour=ctx.Colour.SUCCESS,
+        )
+
+    @core.has_system()
+    @switch.command()
+    async def out(self, ctx: core.Context):
+        """Register a switch with no members."""
+
+        sys = await ctx.get_system()
+        front = await ctx.bot.fronts.get(sys.id)
+        if front.switch is not None and not front.members:
+            return await ctx.reply(
+                "You're already switched out.", colour=ctx.Colour.WARNING
+            )
+
+        await ctx.bot.fronts.register_switch(sys.id, [])
+        await ctx.reply("Switch-out registered.", colour=ctx.Colour.SUCCESS)
+
+
+def load(bot: core.Proxytools):
+    bot.add_plugin(Switch(bot))
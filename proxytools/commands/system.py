@@ -1,10 +1,12 @@
 import logging
+import os
+import tempfile
 from typing import Optional, Union
 
 import hikari
 import lightbulb
 
-import proxytools.core as core
+import core
 
 
 class System(lightbulb.Plugin):
@@ -25,11 +27,13 @@ class System(lightbulb.Plugin):
         await ctx.respond(f"Your input: {id}")
 
     async def _own_system(self, ctx: core.Context):
-        sys = await core.System.fetch_from_user(ctx.db, ctx.author.id)
+        sys = await ctx.get_system()
         if sys is None:
             raise ctx.errors.no_system(ctx, ctx.author)
 
-        await ctx.respond(embed=await sys.embed(ctx))
+        await ctx.respond(
+            embed=await sys.embed(ctx, resolve_accounts=ctx.bot.resolve_accounts)
+        )
 
     @core.not_has_system()
     @system.command(aliases=["create"])
@@ -41,6 +45,7 @@ class System(lightbulb.Plugin):
             )
 
         sys = await core.System.create_system(ctx.db, ctx.author.id, name)
+        await ctx.bot.invalidate(core.Invalidation.ACCOUNT, ctx.author.id)
 
         s = "Your system, "
         s += f"{sys.name} (`{sys.hid}`)" if sys.name is not None else f"`{sys.hid}`"
@@ -52,7 +57,7 @@ class System(lightbulb.Plugin):
     async def description(self, ctx: core.Context, *, desc: str = None):
         """View, reset, or update your system's description."""
 
-        sys = await core.System.fetch_from_user(ctx.db, ctx.author.id)
+        sys = await ctx.get_system()
 
         if not desc:
             if not sys.description:
@@ -78,6 +83,7 @@ class System(lightbulb.Plugin):
             await ctx.db.execute(
                 "update systems set description = null where id = $1", sys.id
             )
+            await ctx.bot.invalidate(core.Invalidation.ACCOUNT, *sys.accounts)
             return await ctx.reply("System description cleared!")
 
         if len(desc) > core.Limits.DESCRIPTION_LIMIT:
@@ -88,13 +94,116 @@ class System(lightbulb.Plugin):
         await ctx.db.execute(
             "update systems set description = $1 where id = $2", desc, sys.id
         )
+        await ctx.bot.invalidate(core.Invalidation.ACCOUNT, *sys.accounts)
         return await ctx.reply("System description updated!")
 
+    @core.has_system()
+    @system.command(aliases=["f", "front", "fronters"])
+    async def fronter(self, ctx: core.Context):
+        """Show your system's current fronters."""
+
+        sys = await ctx.get_system()
+        front = await ctx.bot.fronts.get(sys.id)
+        if front.switch is None:
+            return await ctx.reply(
+                f"You haven't registered any switches yet. Use `{ctx.prefix}switch <members...>` to register one."
+            )
+
+        matcher = await ctx.bot.proxier.matcher(sys.id)
+        names = [
+            m.name
+            for m in (matcher.member(id) for id in front.members)
+            if m is not None
+        ]
+
+        embed = hikari.Embed(
+            title="Current fronter" + ("s" if len(names) != 1 else ""),
+            description="\n".join(names) or "*(switched out)*",
+            colour=ctx.Colour.DEFAULT,
+        )
+        embed.set_footer(text="Since")
+        embed.timestamp = front.timestamp
+        await ctx.respond(embed=embed)
+
+    @core.ratelimit_cost(5)
+    @core.has_system()
+    @system.command()
+    async def export(self, ctx: core.Context):
+        """Export your system as a PluralKit-compatible file."""
+
+        sys = await ctx.get_system()
+        with tempfile.TemporaryDirectory() as tmp:
+            # spooled to disk so the upload (and any retries of it) doesn't hold a database connection
+            path = os.path.join(tmp, f"system-{sys.hid}.json")
+            await core.export_to_file(ctx.db, sys.id, path)
+
+            try:
+                await ctx.author.send(
+                    "Here's your system export:", attachment=hikari.File(path)
+                )
+            except hikari.ForbiddenError:
+                return await ctx.reply(
+                    "I couldn't send you a DM. Make sure your DMs are open and try again.",
+                    colour=ctx.Colour.ERROR,
+                )
+
+        if ctx.guild_id is not None:
+            await ctx.reply("Check your DMs!")
+
+    @core.ratelimit_cost(5)
+    @system.command(name="import")
+    async def import_(self, ctx: core.Context):
+        """Import a system from a PluralKit-compatible export file.
+        Members and switches are added to your existing system, if you have one."""
+
+        if not ctx.attachments:
+            return await ctx.reply(
+                "You need to attach an export file to import it.",
+                colour=ctx.Colour.ERROR,
+            )
+        if ctx.attachments[0].size > ctx.bot.import_max_bytes:
+            return await ctx.reply(
+                f"That file is too large to import, the limit is {ctx.bot.import_max_bytes // core.MiB} MiB.",
+                colour=ctx.Colour.ERROR,
+            )
+
+        sys = await ctx.get_system()
+        if sys is not None:
+            yes, timeout, _ = await ctx.prompt(
+                "You already have a system. Imported members and switches will be added to it, "
+                "and its name, description and tag will be replaced. Continue?",
+                colour=ctx.Colour.WARNING,
+            )
+            if timeout:
+                return await ctx.reply("Timed out.")
+            if not yes:
+                return await ctx.reply("Cancelled.")
+
+        async with ctx.attachments[0].stream() as reader:
+            result = await core.import_system(ctx.db, ctx.author.id, reader)
+
+        await ctx.bot.invalidate(
+            core.Invalidation.ACCOUNT, *(sys.accounts if sys else [ctx.author.id])
+        )
+        await ctx.bot.invalidate(core.Invalidation.SYSTEM, result.system)
+        await ctx.bot.invalidate(core.Invalidation.FRONT, result.system)
+
+        await ctx.reply(
+            f"Imported {result.members} member(s) and {result.switches} switch(es).",
+            colour=ctx.Colour.SUCCESS,
+        )
+
     @lightbulb.listener()
     async def on_command_error(self, event: lightbulb.CommandErrorEvent) -> bool:
         if isinstance(event.exception, lightbulb.errors.CommandNotFound):
             return True
 
+        elif isinstance(event.exception, core.RateLimitedError):
+            # only told once until the limit resets, so replies can't be flooded either
+            if event.exception.notify:
+                await event.message.respond(f":x: {event.exception}")
+            return True
+
         elif isinstance(event.exception, core.UserError):
             await event.message.respond(f":x: {event.exception}")
             return True
@@ -107,8 +216,8 @@ class System(lightbulb.Plugin):
 
         await event.message.respond(":x: Internal error occurred.")
 
-        self._log.error(f"Error in command {event.command}:")
-        self._log.exception(event.exception)
+        # the exception isn't being handled here, so it has to be passed explicitly to log its traceback
+        self._log.error("Error in command %s", event.command, exc_info=event.exception)
 
 
 def load(bot: core.Proxytools):
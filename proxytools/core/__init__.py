@@ -1,11 +1,33 @@
 from .bot import *
+from .statements import *
+from .db import *
+from .migrations import *
+from .metrics import *
+from .cluster import *
+from .cache import *
+from .invalidation import *
 from .webhook import *
 from .error import *
 from .log import *
 from .enums import *
 
+from .model import *
 from .member import *
 from .system import *
+from .users import *
+from .matcher import *
+from .attachments import *
+from .executor import *
+from .messages import *
+from .hids import *
+from .guild import *
+from .front import *
+from .identity import *
+from .autoproxy import *
+from .prompts import *
+from .proxy import *
+from .ratelimit import *
+from .transfer import *
 
 from .checks import *
 from .limits import *
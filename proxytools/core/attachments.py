@@ -0,0 +1,222 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+import aiohttp.payload
+import hikari
+
+from .metrics import ATTACHMENT_BYTES
+
+MiB = 1024 * 1024
+
+# the most a webhook can upload in one message, by the guild's boost level
+UPLOAD_LIMITS = {
+    hikari.GuildPremiumTier.NONE: 10 * MiB,
+    hikari.GuildPremiumTier.TIER_1: 10 * MiB,
+    hikari.GuildPremiumTier.TIER_2: 50 * MiB,
+    hikari.GuildPremiumTier.TIER_3: 100 * MiB,
+}
+
+
+class AttachmentError(Exception):
+    """An attachment couldn't be downloaded, or wasn't the size Discord said it was."""
+
+
+class _ByteBudget:
+    """Limits the total size of the attachments being relayed at once.
+    Waiters are let in first come, first served, so large files aren't starved by small ones.
+    """
+
+    _waiters: Deque[Tuple[int, asyncio.Future]]
+
+    limit: int
+    in_flight: int = 0
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._waiters = deque()
+
+    async def acquire(self, size: int) -> int:
+        """Waits until `size` bytes fit in the budget, and returns the amount that has to be released.
+        Files larger than the whole budget are let through on their own."""
+
+        size = min(size, self.limit)
+        if not self._waiters and self.in_flight + size <= self.limit:
+            self.in_flight += size
+            return size
+
+        fut = asyncio.get_event_loop().create_future()
+        self._waiters.append((size, fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # it was let in just as it was cancelled
+                self.release(size)
+            else:
+                # the waiters behind it may fit now
+                self._wake()
+            raise
+        return size
+
+    def release(self, size: int):
+        self.in_flight -= size
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            size, fut = self._waiters[0]
+            if fut.done():
+                self._waiters.popleft()
+                continue
+            if self.in_flight + size > self.limit:
+                return
+            self._waiters.popleft()
+            self.in_flight += size
+            fut.set_result(None)
+
+
+class _AttachmentPayload(aiohttp.payload.Payload):
+    """A multipart file part that's streamed from the attachment's URL while the request is sent."""
+
+    _relay: "AttachmentRelay"
+
+    def __init__(self, relay: "AttachmentRelay", attachment: hikari.Attachment):
+        super().__init__(
+            attachment,
+            content_type=attachment.media_type or "application/octet-stream",
+            filename=attachment.filename,
+        )
+        self._relay = relay
+        # known up front, so the upload has a Content-Length rather than being chunked
+        self._size = attachment.size
+
+    async def write(self, writer):
+        await self._relay.copy(self._value, writer)
+
+
+class AttachmentRelay:
+    """Re-uploads the attachments of proxied messages without holding whole files in memory.
+
+    Each file is downloaded in chunks of `chunk_size` bytes, and every chunk is written straight
+    into the webhook's multipart upload as it arrives. At most `max_concurrency` files are
+    transferred at once, and at most `max_bytes` bytes worth of files are in flight at any time;
+    anything over that waits its turn."""
+
+    _session: Optional[aiohttp.ClientSession] = None
+    _semaphore: asyncio.Semaphore
+    _budget: _ByteBudget
+
+    chunk_size: int
+    timeout: float
+    upload_limits: Dict[hikari.GuildPremiumTier, int]
+
+    # statistics
+    relayed: int = 0
+    skipped: int = 0
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_bytes: int = 100 * MiB,
+        chunk_size: int = 64 * 1024,
+        timeout: float = 30,
+        upload_limits: Optional[Dict[hikari.GuildPremiumTier, int]] = None,
+    ):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._budget = _ByteBudget(max_bytes)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.upload_limits = {**UPLOAD_LIMITS, **(upload_limits or {})}
+
+    def upload_limit(self, guild: Optional[hikari.Guild]) -> int:
+        """Returns the upload limit of the given guild, or the lowest limit if it isn't known."""
+
+        lowest = self.upload_limits[hikari.GuildPremiumTier.NONE]
+        if guild is None:
+            return lowest
+        return self.upload_limits.get(guild.premium_tier, lowest)
+
+    def select(
+        self, attachments: Sequence[hikari.Attachment], limit: int
+    ) -> Tuple[List[hikari.Attachment], List[hikari.Attachment]]:
+        """Splits attachments into the ones that fit in a single upload of at most `limit` bytes,
+        in order, and the ones that don't. Only uses the sizes Discord reports, so nothing is downloaded.
+        """
+
+        fits, skipped = [], []
+        total = 0
+        for attachment in attachments:
+            if total + attachment.size <= limit:
+                fits.append(attachment)
+                total += attachment.size
+            else:
+                skipped.append(attachment)
+
+        self.skipped += len(skipped)
+        return fits, skipped
+
+    def form(
+        self, payload_json: str, attachments: Sequence[hikari.Attachment]
+    ) -> aiohttp.MultipartWriter:
+        """Returns a multipart body with the given JSON payload, streaming the attachments.
+        Each body can only be sent once, so a new one has to be made to retry a request.
+        """
+
+        writer = aiohttp.MultipartWriter("form-data")
+        part = writer.append(payload_json, {"Content-Type": "application/json"})
+        part.set_content_disposition("form-data", name="payload_json")
+
+        for i, attachment in enumerate(attachments):
+            part = writer.append_payload(_AttachmentPayload(self, attachment))
+            part.set_content_disposition(
+                "form-data", name=f"file{i}", filename=attachment.filename
+            )
+        return writer
+
+    async def copy(self, attachment: hikari.Attachment, writer):
+        """Downloads the given attachment into `writer`, a chunk at a time."""
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=self.timeout)
+            )
+
+        async with self._semaphore:
+            reserved = await self._budget.acquire(attachment.size)
+            try:
+                async with self._session.get(attachment.url) as resp:
+                    if resp.status != 200:
+                        raise AttachmentError(
+                            f"Downloading attachment {attachment.id} failed with status {resp.status}"
+                        )
+
+                    written = 0
+                    async for chunk in resp.content.iter_chunked(self.chunk_size):
+                        written += len(chunk)
+                        # the upload's Content-Length was set from the reported size
+                        if written > attachment.size:
+                            break
+                        await writer.write(chunk)
+                        ATTACHMENT_BYTES.inc(amount=len(chunk))
+
+                    if written != attachment.size:
+                        raise AttachmentError(
+                            f"Attachment {attachment.id} is {written} bytes, expected {attachment.size}"
+                        )
+            finally:
+                self._budget.release(reserved)
+
+        self.relayed += 1
+
+    @property
+    def in_flight(self) -> int:
+        """The total size of the attachments being relayed right now, in bytes."""
+
+        return self._budget.in_flight
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
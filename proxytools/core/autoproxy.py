@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from typing import Dict, Optional, Sequence, Tuple
+
+import asyncpg
+
+from .cache import LRUCache
+from .db import Database
+from .enums import AutoproxyMode
+from .metrics import track_cache
+from .statements import AUTOPROXY_STATE
+
+_NOT_SET = object()
+
+
+class AutoproxyState:
+    """A system's proxy settings in a single guild."""
+
+    __slots__ = ("system", "guild", "proxy_enabled", "mode", "member")
+
+    system: int
+    guild: int
+    proxy_enabled: bool
+    mode: AutoproxyMode
+    member: Optional[int]
+
+    def __init__(
+        self,
+        system: int,
+        guild: int,
+        proxy_enabled: bool = True,
+        mode: AutoproxyMode = AutoproxyMode.OFF,
+        member: Optional[int] = None,
+    ):
+        self.system = system
+        self.guild = guild
+        self.proxy_enabled = proxy_enabled
+        self.mode = mode
+        self.member = member
+
+    def record(self) -> tuple:
+        return self.system, self.guild, self.proxy_enabled, self.mode.name, self.member
+
+    def __repr__(self):
+        return f"AutoproxyState(system={self.system}, guild={self.guild}, mode={self.mode.name}, member={self.member})"
+
+
+class AutoproxyEngine:
+    """Holds autoproxy and latch state in memory, keyed by (system, guild).
+
+    State is loaded from `systems_guild` the first time a system is seen in a guild,
+    after which resolving autoproxy never touches the database.
+    Changes (such as the latched member changing on every proxied message)
+    are only made in memory and written back in bulk every `interval` seconds,
+    with every change to the same state coalesced into a single upsert.
+
+    A guild is only ever handled by one shard, so the state for it isn't shared between processes.
+    """
+
+    _db: Database
+    _log: logging.Logger
+    _states: LRUCache[Tuple[int, int], AutoproxyState]
+    _pending: Dict[Tuple[int, int], asyncio.Future]
+    _dirty: Dict[Tuple[int, int], AutoproxyState]
+    _lock: asyncio.Lock
+    _task: Optional[asyncio.Task] = None
+
+    interval: float
+
+    def __init__(
+        self,
+        db: Database,
+        log: logging.Logger,
+        maxsize: int = 10000,
+        interval: float = 5.0,
+    ):
+        self._db = db
+        self._log = log
+        self._states = LRUCache(maxsize)
+        track_cache("autoproxy", self._states)
+        self._pending = dict()
+        self._dirty = dict()
+        self._lock = asyncio.Lock()
+
+        self.interval = interval
+
+    def start(self):
+        """Starts writing changed state in the background."""
+
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def get(self, system: int, guild: int) -> AutoproxyState:
+        """Returns the state for the given system and guild, loading it if it isn't cached."""
+
+        key = (system, guild)
+        state = self._states.get(key)
+        if state is not None:
+            return state
+
+        # evicted before its changes were written
+        state = self._dirty.get(key)
+        if state is not None:
+            self._states[key] = state
+            return state
+
+        fut = self._pending.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._load(system, guild))
+            self._pending[key] = fut
+            fut.add_done_callback(lambda f: self._done(key, f))
+
+        # shielded so one waiter being cancelled doesn't cancel the load for everyone else
+        return await asyncio.shield(fut)
+
+    def _done(self, key: Tuple[int, int], fut: asyncio.Future):
+        if self._pending.get(key) is fut:
+            del self._pending[key]
+
+    async def _load(self, system: int, guild: int) -> AutoproxyState:
+        row = await self._db.fetchrow(AUTOPROXY_STATE, system, guild)
+        if row is None:
+            state = AutoproxyState(system, guild)
+        else:
+            state = AutoproxyState(
+                system,
+                guild,
+                row["proxy_enabled"],
+                AutoproxyMode.get(row["autoproxy_mode"]),
+                row["autoproxy_member"],
+            )
+
+        self._states[(system, guild)] = state
+        return state
+
+    @staticmethod
+    def resolve(state: AutoproxyState, front: Sequence[int] = ()) -> Optional[int]:
+        """Returns the ID of the member a message without proxy tags should be proxied as, if any.
+        `front` is the system's current fronters, only needed in front mode."""
+
+        if not state.proxy_enabled:
+            return None
+        if state.mode is AutoproxyMode.LATCH or state.mode is AutoproxyMode.MEMBER:
+            return state.member
+        if state.mode is AutoproxyMode.FRONT and front:
+            return front[0]
+        return None
+
+    def proxied(self, state: AutoproxyState, member: int):
+        """Updates the state after a message is proxied as the given member."""
+
+        if state.mode is AutoproxyMode.LATCH and state.member != member:
+            state.member = member
+            self._dirty[(state.system, state.guild)] = state
+
+    async def set(
+        self,
+        system: int,
+        guild: int,
+        *,
+        mode: Optional[AutoproxyMode] = None,
+        member: Optional[int] = _NOT_SET,
+        proxy_enabled: Optional[bool] = None,
+    ) -> AutoproxyState:
+        """Changes the state for the given system and guild. Arguments that aren't given are left as is."""
+
+        state = await self.get(system, guild)
+        if mode is not None:
+            state.mode = mode
+        if member is not _NOT_SET:
+            state.member = member
+        if proxy_enabled is not None:
+            state.proxy_enabled = proxy_enabled
+
+        self._dirty[(system, guild)] = state
+        return state
+
+    async def flush(self) -> int:
+        """Writes all changed state to the database. Returns the number of states flushed.
+        If the write fails, the changes are kept to be written next time."""
+
+        async with self._lock:
+            if not self._dirty:
+                return 0
+
+            batch = {key: state.record() for key, state in self._dirty.items()}
+            try:
+                await self._db.execute(
+                    """insert into systems_guild (system, guild, proxy_enabled, autoproxy_mode, autoproxy_member)
+                    select s.system, s.guild, s.proxy_enabled, s.autoproxy_mode::autoproxy_mode,
+                    (select id from members where id = s.member)
+                    from unnest($1::int[], $2::bigint[], $3::bool[], $4::text[], $5::int[])
+                    as s (system, guild, proxy_enabled, autoproxy_mode, member)
+                    where exists (select 1 from systems where id = s.system)
+                    on conflict (system, guild) do update set
+                    proxy_enabled = excluded.proxy_enabled,
+                    autoproxy_mode = excluded.autoproxy_mode,
+                    autoproxy_member = excluded.autoproxy_member""",
+                    *[list(col) for col in zip(*batch.values())],
+                )
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                self._log.error(
+                    f"Error writing autoproxy state for {len(batch)} system(s), keeping it: {e}"
+                )
+                return 0
+
+            for key, record in batch.items():
+                # state changed while the batch was being written is written next time
+                state = self._dirty.get(key)
+                if state is not None and state.record() == record:
+                    del self._dirty[key]
+
+            return len(batch)
+
+    async def close(self):
+        """Stops the background task and writes any remaining changes."""
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        await self.flush()
+        if self._dirty:
+            self._log.error(
+                f"Couldn't write autoproxy state for {len(self._dirty)} system(s) on shutdown"
+            )
+
+    def __len__(self) -> int:
+        return len(self._states)
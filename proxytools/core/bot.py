@@ -1,26 +1,63 @@
 import asyncio
 import enum
 import logging
+import time
 import typing
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import hikari
 import asyncpg
 import lightbulb
-from hikari import Intents
-
+from hikari import Intents, urls
+
+from .attachments import AttachmentRelay, MiB
+from .autoproxy import AutoproxyEngine
+from .db import Database
+from .front import FrontIndex
+from .guild import GuildSettingsCache
+from .executor import QueuePolicy, WebhookExecutor
+from .hids import HidPool
+from .identity import IdentityResolver
+from .invalidation import Invalidation, Invalidator
+from .messages import MessageLog, MessagePartitions
+from .metrics import COMMAND_LATENCY, Gauge, MetricsServer, register_metric
+from .prompts import ReactionDispatcher
+from .proxy import Proxier
+from .ratelimit import RateLimits, check_ratelimit
+from .system import System, SystemCache
+from .users import UserCache
 from .webhook import WebhookCache
 from .log import getLogger
 from .error import *
 
-extensions = ["commands.system"]
+extensions = ["commands.system", "commands.switch", "commands.message"]
 
 
 class Proxytools(lightbulb.Bot):
-    _db: asyncpg.Connection
+    _db: Database
     _log: logging.Logger
 
+    invalidator: Invalidator
     webhooks: WebhookCache
+    systems: SystemCache
+    users: UserCache
+    webhook_executor: WebhookExecutor
+    attachments: AttachmentRelay
+    messages: MessageLog
+    partitions: MessagePartitions
+    hids: HidPool
+    autoproxy: AutoproxyEngine
+    fronts: FrontIndex
+    identities: IdentityResolver
+    command_limits: RateLimits
+    proxy_limits: RateLimits
+    guilds: GuildSettingsCache
+    proxier: Proxier
+    reactions: ReactionDispatcher
+    metrics: Optional[MetricsServer]
+    resolve_accounts: bool
+    import_max_bytes: int
+    prefixes: Tuple[str, ...]
     errors: "ErrorManager"
 
     class Colour:
@@ -35,6 +72,33 @@ class Proxytools(lightbulb.Bot):
         token: str,
         prefixes: List[str],
         db_url: str,
+        db_min_size: int = 2,
+        db_max_size: int = 10,
+        webhook_cache_size: int = 10000,
+        system_cache_size: int = 10000,
+        system_cache_ttl: float = 300,
+        user_cache_size: int = 1000,
+        user_cache_ttl: float = 60,
+        resolve_accounts: bool = True,
+        import_max_bytes: int = 50 * MiB,
+        proxy_queue_size: int = 50,
+        proxy_queue_policy: QueuePolicy = QueuePolicy.DELAY,
+        messages_flush_interval: float = 1.0,
+        messages_flush_rows: int = 500,
+        messages_max_buffered: int = 10000,
+        messages_retention_days: Optional[int] = None,
+        hid_pool_size: int = 1000,
+        autoproxy_cache_size: int = 10000,
+        autoproxy_flush_interval: float = 5.0,
+        front_cache_size: int = 10000,
+        attachment_concurrency: int = 4,
+        attachment_max_bytes: int = 100 * MiB,
+        upload_limits: Optional[Dict[hikari.GuildPremiumTier, int]] = None,
+        identity_cache_size: int = 10000,
+        command_limits: Optional[RateLimits] = None,
+        proxy_limits: Optional[RateLimits] = None,
+        metrics_host: str = "127.0.0.1",
+        metrics_port: Optional[int] = None,
         **kwargs,
     ):
         self._log = getLogger("proxytools", logging.DEBUG)
@@ -59,11 +123,87 @@ class Proxytools(lightbulb.Bot):
             **kwargs,
         )
 
-        self.webhooks = WebhookCache(self)
+        loop = asyncio.get_event_loop()
+        self._db = loop.run_until_complete(
+            Database.create(db_url, min_size=db_min_size, max_size=db_max_size)
+        )
+
+        self.invalidator = Invalidator(self._db, db_url, self._log)
+        self.webhooks = WebhookCache(
+            self, self._db, self.invalidator, webhook_cache_size
+        )
+        self.systems = SystemCache(system_cache_size, system_cache_ttl)
+        self.invalidator.register(
+            Invalidation.ACCOUNT, self.systems.invalidate, self.systems.clear
+        )
+        self.users = UserCache(self, user_cache_size, user_cache_ttl)
+        self.resolve_accounts = resolve_accounts
+        self.import_max_bytes = import_max_bytes
+        self.prefixes = tuple(prefixes)
         self.errors = ErrorManager(self)
+        self.command_limits = (
+            RateLimits("commands") if command_limits is None else command_limits
+        )
+        self.proxy_limits = (
+            RateLimits("proxy") if proxy_limits is None else proxy_limits
+        )
 
-        loop = asyncio.get_event_loop()
-        self._db = loop.run_until_complete(asyncpg.connect(db_url))
+        self.subscribe(hikari.WebhookUpdateEvent, self.webhooks.on_webhook_update)
+        self.subscribe(hikari.GuildChannelDeleteEvent, self.webhooks.on_channel_delete)
+
+        self.attachments = AttachmentRelay(
+            max_concurrency=attachment_concurrency,
+            max_bytes=attachment_max_bytes,
+            upload_limits=upload_limits,
+        )
+        self.webhook_executor = WebhookExecutor(
+            self,
+            base_url=kwargs.get("rest_url") or urls.REST_API_URL,
+            relay=self.attachments,
+            max_queue=proxy_queue_size,
+            policy=proxy_queue_policy,
+        )
+        self.messages = MessageLog(
+            self._db,
+            self._log,
+            interval=messages_flush_interval,
+            max_rows=messages_flush_rows,
+            max_buffered=messages_max_buffered,
+        )
+        self.partitions = MessagePartitions(
+            self._db, self._log, retention_days=messages_retention_days
+        )
+        self.hids = HidPool(self._db, self._log, target=hid_pool_size)
+        self.autoproxy = AutoproxyEngine(
+            self._db,
+            self._log,
+            maxsize=autoproxy_cache_size,
+            interval=autoproxy_flush_interval,
+        )
+        self.fronts = FrontIndex(self._db, self.invalidator, front_cache_size)
+        self.guilds = GuildSettingsCache(self._db, self._log, self.invalidator)
+        self.subscribe(hikari.GuildAvailableEvent, self.guilds.on_guild_available)
+        self.subscribe(hikari.GuildLeaveEvent, self.guilds.on_guild_leave)
+        self.identities = IdentityResolver(self._db, identity_cache_size)
+        self.invalidator.register(
+            Invalidation.SYSTEM, self.identities.invalidate, self.identities.clear
+        )
+        self.proxier = Proxier(self, self.webhook_executor)
+        self.invalidator.register(
+            Invalidation.SYSTEM, self.proxier.invalidate, self.proxier.clear
+        )
+
+        self.reactions = ReactionDispatcher()
+
+        self.metrics = None
+        if metrics_port is not None:
+            self.metrics = MetricsServer(self._log, metrics_host, metrics_port)
+        self._register_metrics()
+
+        self.subscribe(hikari.GuildMessageCreateEvent, self.proxier.on_message)
+        self.subscribe(hikari.ReactionAddEvent, self.reactions.on_reaction)
+        self.subscribe(hikari.StartingEvent, self._on_starting)
+        self.subscribe(hikari.StoppingEvent, self._on_stopping)
 
         for ext in extensions:
             try:
@@ -73,36 +213,116 @@ class Proxytools(lightbulb.Bot):
                 self.log.error(f'Error loading extension "{ext}"')
                 self.log.exception(e)
 
-    async def run_migrations(
-        self, migrations: List[str], logger: logging.Logger = None
-    ) -> int:
-        """Runs the needed migrations. Returns the number of applied migrations."""
+    async def _on_starting(self, _: hikari.StartingEvent):
+        await self.invalidator.start()
+        self.messages.start()
+        self.partitions.start()
+        self.command_limits.start()
+        self.proxy_limits.start()
+        self.hids.start()
+        self.autoproxy.start()
+        # loaded in the background so connecting to the gateway doesn't wait for it
+        asyncio.ensure_future(self._load_webhooks())
+        if self.metrics is not None:
+            await self.metrics.start()
+
+    async def _load_webhooks(self):
+        start = time.perf_counter()
+        try:
+            loaded = await self.webhooks.load()
+        except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            self._log.error(f"Error loading webhooks: {e}")
+            return
+        self._log.info(
+            f"Loaded {loaded} webhook(s) in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+    async def _on_stopping(self, _: hikari.StoppingEvent):
+        await self.webhook_executor.close()
+        await self.attachments.close()
+        await self.messages.close()
+        self.partitions.close()
+        self.command_limits.close()
+        self.proxy_limits.close()
+        await self.autoproxy.close()
+        await self.invalidator.close()
+        self.hids.close()
+        if self.metrics is not None:
+            await self.metrics.close()
+
+    def _register_metrics(self):
+        register_metric(
+            Gauge(
+                "proxytools_shard_latency_seconds",
+                "Gateway heartbeat latency, by shard.",
+                ("shard",),
+                lambda: {
+                    (shard,): latency
+                    for shard, latency in self.heartbeat_latencies.items()
+                },
+            ),
+            replace=True,
+        )
+        register_metric(
+            Gauge(
+                "proxytools_db_pool_connections",
+                "Database connections, by state.",
+                ("state",),
+                lambda: {
+                    ("in_use",): self._db.stats.in_use,
+                    ("waiting",): self._db.stats.waiting,
+                    ("max",): self._db.stats.max_size,
+                },
+            ),
+            replace=True,
+        )
+        register_metric(
+            Gauge(
+                "proxytools_webhook_queued",
+                "Messages waiting to be sent, across all webhooks.",
+                fn=lambda: {(): self.webhook_executor.queued},
+            ),
+            replace=True,
+        )
+        register_metric(
+            Gauge(
+                "proxytools_attachment_bytes_in_flight",
+                "Total size of the attachments being relayed right now.",
+                fn=lambda: {(): self.attachments.in_flight},
+            ),
+            replace=True,
+        )
+
+    async def invalidate(self, kind: str, *keys):
+        """Invalidates cached data in this and every other bot process.
+        Must be called after anything cached is changed in the database."""
+
+        await self.invalidator.invalidate(kind, *keys)
 
-        logger = logger or self._log
+    async def _evaluate_checks(
+        self, command: lightbulb.Command, context: lightbulb.Context
+    ) -> bool:
+        # checked before, and apart from, the other checks, so a rate limited user
+        # can't make them query the database (lightbulb runs every check even if one fails)
+        await check_ratelimit(context)
+        return await super()._evaluate_checks(command, context)
 
-        # noinspection PyBroadException
+    async def _invoke_command(
+        self,
+        command: lightbulb.Command,
+        context: lightbulb.Context,
+        args: typing.Sequence[str],
+        kwargs: typing.Mapping[str, str],
+    ):
+        start = time.perf_counter()
+        outcome = "error"
         try:
-            current: int = await self._db.fetchval("select schema_version from info")
-        except:
-            current: int = 0
-
-        if len(migrations) <= current:
-            return 0
-
-        applied = 0
-        async with self._db.transaction():
-            for m in migrations[current:]:
-                # noinspection PyBroadException
-                try:
-                    await self._db.execute(m)
-                    logger.info(f"Executed migration {current + 1}")
-                    current += 1
-                    applied += 1
-                except Exception as e:
-                    logger.error(f"Error executing migration {current + 1}")
-                    logger.exception(e)
-
-        return applied
+            await super()._invoke_command(command, context, args, kwargs)
+            outcome = "ok"
+        finally:
+            COMMAND_LATENCY.observe(
+                time.perf_counter() - start, command.qualified_name, outcome
+            )
 
     def get_context(
         self,
@@ -114,7 +334,7 @@ class Proxytools(lightbulb.Bot):
         return Context(self, message, prefix, invoked_with, invoked_command)
 
     @property
-    def db(self) -> asyncpg.Connection:
+    def db(self) -> Database:
         return self._db
 
     @property
@@ -123,8 +343,10 @@ class Proxytools(lightbulb.Bot):
 
 
 class Context(lightbulb.Context):
-    _db: asyncpg.Connection
+    _db: Database
     _errors: "ErrorManager"
+    _system: Optional[System]
+    _system_fetched: bool = False
 
     class Colour(Proxytools.Colour):
         pass
@@ -174,23 +396,31 @@ class Context(lightbulb.Context):
         - the confirmation message"""
 
         msg = await self.reply(prompt, colour=colour)
-        await msg.add_reaction("✅")
-        await msg.add_reaction("❌")
-
-        def check(ev: hikari.ReactionAddEvent):
-            return ev.user_id == self.author.id and ev.emoji_name in ("✅", "❌")
-
+        # waiting starts before the reactions are added, so an early reaction isn't missed
+        waiter = self.bot.reactions.wait(msg.id, self.author.id, ("✅", "❌"), timeout)
         try:
-            event: hikari.ReactionAddEvent = await self.bot.wait_for(
-                hikari.ReactionAddEvent, timeout, check
-            )
-        except TimeoutError:
+            await msg.add_reaction("✅")
+            await msg.add_reaction("❌")
+            event: hikari.ReactionAddEvent = await waiter
+        except asyncio.TimeoutError:
             return False, True, msg
+        finally:
+            waiter.cancel()
 
         return event.emoji_name == "✅", False, msg
 
+    async def get_system(self) -> Optional[System]:
+        """Returns the author's system, or None if they don't have one.
+        Only fetched once per command, so checks and the command itself share the result.
+        """
+
+        if not self._system_fetched:
+            self._system = await self.bot.systems.fetch(self._db, self.author.id)
+            self._system_fetched = True
+        return self._system
+
     @property
-    def db(self) -> asyncpg.Connection:
+    def db(self) -> Database:
         return self._db
 
     @property
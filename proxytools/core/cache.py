@@ -0,0 +1,135 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Iterator, Optional, Tuple, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """A size-bounded cache that evicts the least recently used entry once full.
+    `on_evict` is called with the key of every entry evicted to make room."""
+
+    _data: "OrderedDict[K, V]"
+    _maxsize: int
+    _on_evict: Optional[Callable[[K], None]]
+
+    hits: int = 0
+    misses: int = 0
+
+    def __init__(self, maxsize: int, on_evict: Optional[Callable[[K], None]] = None):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+
+        self._data = OrderedDict()
+        self._maxsize = maxsize
+        self._on_evict = on_evict
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Returns the value for `key` and marks it as recently used, or `default` if it isn't cached."""
+
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+    def __getitem__(self, key: K) -> V:
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: K, value: V):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self._maxsize:
+            evicted, _ = self._data.popitem(last=False)
+            if self._on_evict is not None:
+                self._on_evict(evicted)
+
+    def __delitem__(self, key: K):
+        del self._data[key]
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self._data)
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class TTLCache(LRUCache[K, V]):
+    """A size-bounded cache whose entries also expire `ttl` seconds after being set."""
+
+    _data: "OrderedDict[K, Tuple[float, V]]"
+    _ttl: float
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize)
+        self._ttl = ttl
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        if expires < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        try:
+            return self._data.pop(key)[1]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key: K) -> V:
+        expires, value = self._data[key]
+        if expires < time.monotonic():
+            del self._data[key]
+            raise KeyError(key)
+
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: K, value: V):
+        super().__setitem__(key, (time.monotonic() + self._ttl, value))
+
+    def __contains__(self, key: K) -> bool:
+        try:
+            expires, _ = self._data[key]
+        except KeyError:
+            return False
+        return expires >= time.monotonic()
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl
@@ -8,13 +8,13 @@ from .error import UserError
 
 
 async def _has_system(ctx: Context):
-    if not await System.has_system(ctx.db, ctx.author.id):
-        raise await ctx.errors.no_system(ctx, ctx.author)
+    if await ctx.get_system() is None:
+        raise ctx.errors.no_system(ctx, ctx.author)
     return True
 
 
 async def _not_has_system(ctx: Context):
-    if await System.has_system(ctx.db, ctx.author.id):
+    if await ctx.get_system() is not None:
         user = ctx.bot.get_me()
         raise UserError(
             f"You already have a system registered with {user.username}. Type `{ctx.prefix}system` to view it."
@@ -36,3 +36,15 @@ def not_has_system() -> typing.Callable[[T_inv], T_inv]:
         return command
 
     return decorate
+
+
+def ratelimit_cost(cost: int) -> typing.Callable[[T_inv], T_inv]:
+    """Makes a command count as `cost` commands against the rate limits, for commands that do a lot of work.
+    Every command is rate limited (see `check_ratelimit`), before any of its own checks run.
+    """
+
+    def decorate(command: T_inv) -> T_inv:
+        command.ratelimit_cost = cost
+        return command
+
+    return decorate
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import math
+import multiprocessing
+import queue
+import signal
+import time
+from typing import Callable, Dict, List, Optional
+
+import hikari
+
+
+def shard_ranges(shard_count: int, workers: int) -> List[range]:
+    """Splits `shard_count` shards into `workers` contiguous ranges of (nearly) equal size."""
+
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+
+    ranges = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(range(start, end))
+        start = end
+    return ranges
+
+
+async def fetch_shard_count(token: str) -> int:
+    """Returns the number of shards Discord recommends for the bot."""
+
+    async with hikari.RESTApp().acquire(token, "Bot") as client:
+        info = await client.fetch_gateway_bot_info()
+    return info.shard_count
+
+
+class Heartbeat:
+    """A worker's health, sent to the supervisor every few seconds once the bot has connected."""
+
+    __slots__ = ("worker", "pid", "latencies", "guilds", "timestamp")
+
+    worker: int
+    pid: int
+    latencies: Dict[int, float]
+    guilds: int
+    timestamp: float
+
+    def __init__(
+        self,
+        worker: int,
+        pid: int,
+        latencies: Dict[int, float],
+        guilds: int,
+    ):
+        self.worker = worker
+        self.pid = pid
+        self.latencies = latencies
+        self.guilds = guilds
+        self.timestamp = time.time()
+
+
+class HeartbeatSender:
+    """Sends the bot's health to the supervisor every `interval` seconds."""
+
+    _bot: hikari.GatewayBot
+    _queue: multiprocessing.Queue
+    _task: Optional[asyncio.Task] = None
+
+    worker: int
+    interval: float
+
+    def __init__(
+        self,
+        bot: hikari.GatewayBot,
+        queue: multiprocessing.Queue,
+        worker: int,
+        interval: float = 10,
+    ):
+        self._bot = bot
+        self._queue = queue
+        self.worker = worker
+        self.interval = interval
+
+        bot.subscribe(hikari.StartedEvent, self._on_started)
+        bot.subscribe(hikari.StoppingEvent, self._on_stopping)
+
+    async def _on_started(self, _: hikari.StartedEvent):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _on_stopping(self, _: hikari.StoppingEvent):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self.send()
+            await asyncio.sleep(self.interval)
+
+    def send(self):
+        # the queue's feeder thread does the actual writing, so this doesn't block
+        self._queue.put_nowait(
+            Heartbeat(
+                self.worker,
+                multiprocessing.current_process().pid,
+                dict(self._bot.heartbeat_latencies),
+                len(self._bot.cache.get_available_guilds_view()),
+            )
+        )
+
+
+class _Worker:
+    __slots__ = (
+        "id",
+        "shards",
+        "process",
+        "started_at",
+        "heartbeat",
+        "restarts",
+        "restart_at",
+    )
+
+    id: int
+    shards: range
+    process: Optional[multiprocessing.Process]
+    started_at: float
+    heartbeat: Optional[Heartbeat]
+    restarts: int
+    restart_at: Optional[float]
+
+    def __init__(self, id: int, shards: range):
+        self.id = id
+        self.shards = shards
+        self.process = None
+        self.started_at = 0.0
+        self.heartbeat = None
+        self.restarts = 0
+        self.restart_at = None
+
+
+class Supervisor:
+    """Runs the bot in `workers` processes, each with a contiguous range of shards.
+
+    `target` is called in each worker process as `target(worker, shard_ids, shard_count, queue)`
+    and should run the bot until it stops, sending heartbeats to `queue` with a `HeartbeatSender`.
+    Workers are started one at a time, each once the one before it has connected (or `start_timeout`
+    has passed), so identifying stays within Discord's limits. Workers that exit or stop sending
+    heartbeats for `heartbeat_timeout` seconds are restarted, with a backoff if they keep failing.
+    """
+
+    _log: logging.Logger
+    _target: Callable
+    _workers: List[_Worker]
+    _context: multiprocessing.context.SpawnContext
+    _queue: multiprocessing.Queue
+    _stopping: bool = False
+
+    shard_count: int
+    heartbeat_timeout: float
+    start_timeout: float
+    health_interval: float
+    max_restart_delay: float
+
+    def __init__(
+        self,
+        target: Callable,
+        log: logging.Logger,
+        workers: int,
+        shard_count: int,
+        heartbeat_timeout: float = 60,
+        start_timeout: float = 300,
+        health_interval: float = 60,
+        max_restart_delay: float = 60,
+    ):
+        self._log = log
+        self._target = target
+        self._workers = [
+            _Worker(i, shards)
+            for i, shards in enumerate(shard_ranges(shard_count, workers))
+        ]
+        # spawned rather than forked, so workers don't inherit the supervisor's state
+        self._context = multiprocessing.get_context("spawn")
+        self._queue = self._context.Queue()
+
+        self.shard_count = shard_count
+        self.heartbeat_timeout = heartbeat_timeout
+        self.start_timeout = start_timeout
+        self.health_interval = health_interval
+        self.max_restart_delay = max_restart_delay
+
+    def run(self):
+        """Starts the workers and supervises them until interrupted."""
+
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+
+        try:
+            for worker in self._workers:
+                if self._stopping:
+                    break
+                self._start(worker)
+                self._wait_started(worker)
+
+            next_health = time.monotonic() + self.health_interval
+            while not self._stopping:
+                self._receive(timeout=1)
+                self._check()
+
+                if time.monotonic() >= next_health:
+                    self._log_health()
+                    next_health = time.monotonic() + self.health_interval
+        finally:
+            self._stop()
+
+    def _on_signal(self, signum, _):
+        self._log.info(f"Received {signal.Signals(signum).name}, stopping workers")
+        self._stopping = True
+
+    def _start(self, worker: _Worker):
+        worker.started_at = time.time()
+        worker.heartbeat = None
+        worker.restart_at = None
+        worker.process = self._context.Process(
+            target=self._target,
+            args=(worker.id, list(worker.shards), self.shard_count, self._queue),
+            name=f"proxytools-worker-{worker.id}",
+        )
+        worker.process.start()
+        self._log.info(
+            f"Started worker {worker.id} (pid {worker.process.pid}) "
+            f"for shards {worker.shards.start}-{worker.shards.stop - 1} of {self.shard_count}"
+        )
+
+    def _wait_started(self, worker: _Worker):
+        deadline = time.monotonic() + self.start_timeout
+        while not self._stopping and time.monotonic() < deadline:
+            if worker.heartbeat is not None:
+                return
+            if not worker.process.is_alive():
+                return
+            self._receive(timeout=1)
+
+        if not self._stopping and worker.process.is_alive():
+            self._log.warning(
+                f"Worker {worker.id} didn't connect within {self.start_timeout:.0f}s"
+            )
+
+    def _receive(self, timeout: float):
+        try:
+            heartbeat: Heartbeat = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        while True:
+            worker = self._workers[heartbeat.worker]
+            # ignore heartbeats from a process that has since been replaced
+            if worker.process is not None and worker.process.pid == heartbeat.pid:
+                worker.heartbeat = heartbeat
+                # only forget about earlier crashes once the worker has stayed up for a while
+                if heartbeat.timestamp - worker.started_at > self.heartbeat_timeout:
+                    worker.restarts = 0
+
+            try:
+                heartbeat = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _check(self):
+        now = time.monotonic()
+        for worker in self._workers:
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    self._start(worker)
+                continue
+
+            # workers that haven't connected yet get longer before they're considered stuck
+            if worker.heartbeat is None:
+                last, timeout = worker.started_at, self.start_timeout
+            else:
+                last, timeout = worker.heartbeat.timestamp, self.heartbeat_timeout
+
+            process = worker.process
+            if not process.is_alive():
+                self._log.error(
+                    f"Worker {worker.id} exited with code {process.exitcode}"
+                )
+            elif time.time() - last > timeout:
+                self._log.error(
+                    f"Worker {worker.id} hasn't sent a heartbeat in {timeout:.0f}s, restarting it"
+                )
+                process.kill()
+                process.join()
+            else:
+                continue
+
+            delay = min(2**worker.restarts, self.max_restart_delay)
+            worker.restarts += 1
+            worker.restart_at = now + delay
+            self._log.info(f"Restarting worker {worker.id} in {delay}s")
+
+    def _log_health(self):
+        up = [
+            w
+            for w in self._workers
+            if w.heartbeat is not None
+            and w.process is not None
+            and w.process.is_alive()
+        ]
+        latencies = [
+            latency
+            for w in up
+            for latency in w.heartbeat.latencies.values()
+            if not math.isnan(latency)
+        ]
+        latency = sum(latencies) / len(latencies) * 1000 if latencies else float("nan")
+
+        self._log.info(
+            f"{len(up)}/{len(self._workers)} worker(s) up, "
+            f"{len(latencies)}/{self.shard_count} shard(s) connected, "
+            f"{sum(w.heartbeat.guilds for w in up)} guild(s), "
+            f"average latency {latency:.0f}ms"
+        )
+
+    def _stop(self):
+        processes = [w.process for w in self._workers if w.process is not None]
+        for process in processes:
+            if process.is_alive():
+                # the bot closes cleanly on SIGTERM
+                process.terminate()
+
+        deadline = time.monotonic() + 30
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                self._log.warning(f"Worker pid {process.pid} didn't stop, killing it")
+                process.kill()
+                process.join()
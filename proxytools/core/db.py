@@ -0,0 +1,189 @@
+import contextlib
+import time
+from typing import AsyncIterator, List, Optional, Union
+
+import asyncpg
+
+from . import statements
+from .metrics import DB_QUERY_LATENCY
+from .statements import Statement
+
+
+class PoolStats:
+    """A snapshot of a database pool's usage."""
+
+    min_size: int
+    max_size: int
+    in_use: int
+    waiting: int
+    acquisitions: int
+    total_wait: float
+    max_wait: float
+
+    def __init__(self, **kwargs):
+        self.min_size = kwargs.get("min_size")
+        self.max_size = kwargs.get("max_size")
+        self.in_use = kwargs.get("in_use")
+        self.waiting = kwargs.get("waiting")
+        self.acquisitions = kwargs.get("acquisitions")
+        self.total_wait = kwargs.get("total_wait")
+        self.max_wait = kwargs.get("max_wait")
+
+    @property
+    def mean_wait(self) -> float:
+        """Average time spent waiting for a connection, in seconds."""
+
+        if self.acquisitions == 0:
+            return 0.0
+        return self.total_wait / self.acquisitions
+
+    def __repr__(self):
+        return (
+            f"PoolStats(in_use={self.in_use}/{self.max_size}, waiting={self.waiting}, "
+            f"mean_wait={self.mean_wait * 1000:.2f}ms, max_wait={self.max_wait * 1000:.2f}ms)"
+        )
+
+
+class Database:
+    """A pool of database connections.
+
+    The query methods acquire a connection for the duration of a single query,
+    so concurrent handlers never queue behind each other on one connection.
+    Use `acquire` or `transaction` to run several queries on the same connection.
+
+    Queries can either be SQL strings or registered statements (see `statements.py`),
+    which are only prepared once per connection. Query latency is recorded by statement name,
+    with plain SQL strings grouped together as "sql"."""
+
+    # room for every registered statement, plus asyncpg's default for everything else
+    STATEMENT_CACHE_SIZE = 100
+
+    _pool: asyncpg.Pool
+    _min_size: int
+    _max_size: int
+
+    _in_use: int = 0
+    _waiting: int = 0
+    _acquisitions: int = 0
+    _total_wait: float = 0.0
+    _max_wait: float = 0.0
+
+    def __init__(self, pool: asyncpg.Pool, min_size: int, max_size: int):
+        self._pool = pool
+        self._min_size = min_size
+        self._max_size = max_size
+
+    @classmethod
+    async def create(
+        cls, dsn: str, min_size: int = 2, max_size: int = 10
+    ) -> "Database":
+        """Connects to the database and returns a new pool."""
+
+        pool = await asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            statement_cache_size=len(statements.registry) + cls.STATEMENT_CACHE_SIZE,
+        )
+        return cls(pool, min_size, max_size)
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Acquires a connection from the pool for the duration of the block."""
+
+        start = time.perf_counter()
+        self._waiting += 1
+        try:
+            conn = await self._pool.acquire()
+        finally:
+            self._waiting -= 1
+
+        wait = time.perf_counter() - start
+        self._acquisitions += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+
+        self._in_use += 1
+        try:
+            yield conn
+        finally:
+            self._in_use -= 1
+            await self._pool.release(conn)
+
+    @contextlib.asynccontextmanager
+    async def transaction(self) -> AsyncIterator[asyncpg.Connection]:
+        """Acquires a connection and starts a transaction on it for the duration of the block."""
+
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                yield conn
+
+    async def execute(
+        self, query: Union[str, Statement], *args, timeout: float = None
+    ) -> str:
+        name = "sql"
+        if isinstance(query, Statement):
+            query, name = query.sql, query.name
+
+        with DB_QUERY_LATENCY.time(name):
+            async with self.acquire() as conn:
+                return await conn.execute(query, *args, timeout=timeout)
+
+    async def executemany(self, query: str, args, *, timeout: float = None):
+        with DB_QUERY_LATENCY.time("sql"):
+            async with self.acquire() as conn:
+                return await conn.executemany(query, args, timeout=timeout)
+
+    async def fetch(
+        self, query: Union[str, Statement], *args, timeout: float = None
+    ) -> List[asyncpg.Record]:
+        name = "sql"
+        if isinstance(query, Statement):
+            query, name = query.sql, query.name
+
+        with DB_QUERY_LATENCY.time(name):
+            async with self.acquire() as conn:
+                return await conn.fetch(query, *args, timeout=timeout)
+
+    async def fetchrow(
+        self, query: Union[str, Statement], *args, timeout: float = None
+    ) -> Optional[asyncpg.Record]:
+        name = "sql"
+        if isinstance(query, Statement):
+            query, name = query.sql, query.name
+
+        with DB_QUERY_LATENCY.time(name):
+            async with self.acquire() as conn:
+                return await conn.fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(
+        self,
+        query: Union[str, Statement],
+        *args,
+        column: int = 0,
+        timeout: float = None,
+    ):
+        name = "sql"
+        if isinstance(query, Statement):
+            query, name = query.sql, query.name
+
+        with DB_QUERY_LATENCY.time(name):
+            async with self.acquire() as conn:
+                return await conn.fetchval(query, *args, column=column, timeout=timeout)
+
+    @property
+    def stats(self) -> PoolStats:
+        """Wait time and in-use gauges for the pool, used to size it."""
+
+        return PoolStats(
+            min_size=self._min_size,
+            max_size=self._max_size,
+            in_use=self._in_use,
+            waiting=self._waiting,
+            acquisitions=self._acquisitions,
+            total_wait=self._total_wait,
+            max_wait=self._max_wait,
+        )
+
+    async def close(self):
+        await self._pool.close()
@@ -1,6 +1,9 @@
 import enum
 import typing
 
+# name (as stored in the database, and lowercase) -> member, per enum class
+_lookups: typing.Dict[type, typing.Dict[str, enum.Enum]] = dict()
+
 
 class Enum(enum.Enum):
     """Base enum class"""
@@ -9,8 +12,22 @@ class Enum(enum.Enum):
     def get(
         cls, item: str, fallback: typing.Optional[__qualname__] = None
     ) -> __qualname__:
+        if isinstance(item, cls):
+            return item
+
+        lookup = _lookups.get(cls)
+        if lookup is None:
+            lookup = _lookups[cls] = dict()
+            for name, member in cls.__members__.items():
+                lookup[name] = lookup[name.lower()] = member
+
+        try:
+            return lookup[item]
+        except KeyError:
+            pass
+
         try:
-            return cls.__dict__[item.upper()]
+            return lookup[item.upper()]
         except KeyError:
             if fallback is None:
                 raise
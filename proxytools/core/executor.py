@@ -0,0 +1,290 @@
+import asyncio
+import json
+import time
+from typing import Optional, Sequence
+
+import aiohttp
+import hikari
+from hikari import urls
+
+from .attachments import AttachmentRelay
+from .enums import Enum
+from .metrics import (
+    WEBHOOK_EXECUTE_LATENCY,
+    WEBHOOK_RATELIMITS,
+    WEBHOOK_REQUEST_LATENCY,
+)
+
+
+class QueuePolicy(Enum):
+    """What to do when a webhook's send queue is full"""
+
+    DROP = 1  # fail the send immediately with QueueFullError
+    DELAY = 2  # wait until there is room in the queue
+
+
+class WebhookExecuteError(Exception):
+    """Executing a webhook failed."""
+
+    status: int
+
+    def __init__(self, status: int, body: str):
+        super().__init__(f"Executing webhook failed with status {status}: {body}")
+        self.status = status
+
+
+class WebhookNotFoundError(WebhookExecuteError):
+    """The webhook was deleted."""
+
+
+class QueueFullError(Exception):
+    """A webhook's send queue is full and the queue policy is DROP."""
+
+
+class _Bucket:
+    """Rate limit state for a single webhook, as reported by Discord."""
+
+    __slots__ = ("remaining", "reset_at")
+
+    remaining: int
+    reset_at: float
+
+    def __init__(self):
+        self.remaining = 1
+        self.reset_at = 0.0
+
+    def update(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is not None and reset_after is not None:
+            self.remaining = int(remaining)
+            self.reset_at = time.monotonic() + float(reset_after)
+
+    def delay(self) -> float:
+        """Returns how long to wait before the next request may be sent."""
+
+        if self.remaining > 0:
+            return 0.0
+        return max(0.0, self.reset_at - time.monotonic())
+
+
+class _Request:
+    __slots__ = ("payload", "attachments", "future")
+
+    payload: dict
+    attachments: Sequence[hikari.Attachment]
+    future: asyncio.Future
+
+    def __init__(self, payload: dict, attachments: Sequence[hikari.Attachment] = ()):
+        self.payload = payload
+        self.attachments = attachments
+        self.future = asyncio.get_event_loop().create_future()
+
+
+class _WebhookQueue:
+    __slots__ = ("webhook", "queue", "bucket", "worker")
+
+    webhook: hikari.ExecutableWebhook
+    queue: asyncio.Queue
+    bucket: _Bucket
+    worker: Optional[asyncio.Task]
+
+    def __init__(self, webhook: hikari.ExecutableWebhook, maxsize: int):
+        self.webhook = webhook
+        self.queue = asyncio.Queue(maxsize)
+        self.bucket = _Bucket()
+        self.worker = None
+
+
+class WebhookExecutor:
+    """Executes webhooks for proxied messages.
+
+    Every webhook gets its own queue and worker, so a burst in one busy channel
+    never holds up any other channel. Each worker tracks its webhook's rate limit
+    from Discord's response headers and waits out the bucket before sending,
+    rather than running into 429s.
+    Attachments are streamed into the upload by `relay`, which must be set to send any.
+    """
+
+    _app: hikari.EntityFactoryAware
+    _base_url: str
+    _relay: Optional[AttachmentRelay]
+    _queues: dict[hikari.Snowflake, _WebhookQueue]
+    _session: Optional[aiohttp.ClientSession] = None
+    _global_reset: float = 0.0
+
+    max_queue: int
+    policy: QueuePolicy
+    idle_timeout: float
+    max_retries: int
+
+    # statistics
+    sent: int = 0
+    ratelimited: int = 0
+    dropped: int = 0
+
+    def __init__(
+        self,
+        app: hikari.EntityFactoryAware,
+        *,
+        base_url: str = urls.REST_API_URL,
+        relay: Optional[AttachmentRelay] = None,
+        max_queue: int = 50,
+        policy: QueuePolicy = QueuePolicy.DELAY,
+        idle_timeout: float = 60,
+        max_retries: int = 3,
+    ):
+        self._app = app
+        self._base_url = base_url.rstrip("/")
+        self._relay = relay
+        self._queues = dict()
+
+        self.max_queue = max_queue
+        self.policy = policy
+        self.idle_timeout = idle_timeout
+        self.max_retries = max_retries
+
+    async def execute(
+        self,
+        webhook: hikari.ExecutableWebhook,
+        content: str,
+        *,
+        username: Optional[str] = None,
+        avatar_url: Optional[str] = None,
+        attachments: Sequence[hikari.Attachment] = (),
+    ) -> hikari.Message:
+        """Queues a message to be sent with the given webhook, and waits for it to be sent.
+        Raises QueueFullError if the webhook's queue is full and the policy is DROP."""
+
+        if attachments and self._relay is None:
+            raise ValueError("Sending attachments needs an attachment relay")
+
+        payload = {"content": content, "allowed_mentions": {"parse": ["users"]}}
+        if username is not None:
+            payload["username"] = username
+        if avatar_url is not None:
+            payload["avatar_url"] = avatar_url
+
+        request = _Request(payload, attachments)
+        q = self._queue_for(webhook)
+        start = time.perf_counter()
+
+        if self.policy is QueuePolicy.DROP:
+            try:
+                q.queue.put_nowait(request)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                raise QueueFullError(
+                    f"Send queue for webhook {webhook.webhook_id} is full"
+                ) from None
+        else:
+            await q.queue.put(request)
+
+        msg = await request.future
+        WEBHOOK_EXECUTE_LATENCY.observe(time.perf_counter() - start)
+        return msg
+
+    def _queue_for(self, webhook: hikari.ExecutableWebhook) -> _WebhookQueue:
+        q = self._queues.get(webhook.webhook_id)
+        if q is None:
+            q = self._queues[webhook.webhook_id] = _WebhookQueue(
+                webhook, self.max_queue
+            )
+        if q.worker is None or q.worker.done():
+            q.worker = asyncio.ensure_future(self._work(q))
+        return q
+
+    async def _work(self, q: _WebhookQueue):
+        while True:
+            try:
+                request: _Request = await asyncio.wait_for(
+                    q.queue.get(), self.idle_timeout
+                )
+            except asyncio.TimeoutError:
+                # nothing was sent for a while, so stop holding on to the queue
+                if q.queue.empty():
+                    if self._queues.get(q.webhook.webhook_id) is q:
+                        del self._queues[q.webhook.webhook_id]
+                    return
+                continue
+
+            if request.future.done():
+                continue
+
+            try:
+                msg = await self._send(q, request.payload, request.attachments)
+            except Exception as e:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            else:
+                if not request.future.done():
+                    request.future.set_result(msg)
+
+    async def _send(
+        self,
+        q: _WebhookQueue,
+        payload: dict,
+        attachments: Sequence[hikari.Attachment] = (),
+    ) -> hikari.Message:
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+
+        url = f"{self._base_url}/webhooks/{q.webhook.webhook_id}/{q.webhook.token}"
+        payload_json = json.dumps(payload)
+
+        for _ in range(self.max_retries + 1):
+            delay = max(q.bucket.delay(), self._global_reset - time.monotonic(), 0.0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if attachments:
+                # a streamed body can't be sent twice, so every attempt gets a new one
+                body = {"data": self._relay.form(payload_json, attachments)}
+            else:
+                body = {"json": payload}
+
+            start = time.perf_counter()
+            async with self._session.post(url, params={"wait": "true"}, **body) as resp:
+                WEBHOOK_REQUEST_LATENCY.observe(
+                    time.perf_counter() - start, resp.status
+                )
+                q.bucket.update(resp.headers)
+
+                if resp.status == 429:
+                    self.ratelimited += 1
+                    data = await resp.json()
+                    retry_after = float(data.get("retry_after", 1))
+                    if data.get("global", False):
+                        WEBHOOK_RATELIMITS.inc("global")
+                        self._global_reset = time.monotonic() + retry_after
+                    else:
+                        WEBHOOK_RATELIMITS.inc("webhook")
+                        q.bucket.remaining = 0
+                        q.bucket.reset_at = time.monotonic() + retry_after
+                    continue
+
+                if resp.status == 404:
+                    raise WebhookNotFoundError(resp.status, await resp.text())
+                if resp.status >= 400:
+                    raise WebhookExecuteError(resp.status, await resp.text())
+
+                self.sent += 1
+                return self._app.entity_factory.deserialize_message(await resp.json())
+
+        raise WebhookExecuteError(429, "Too many retries")
+
+    @property
+    def queued(self) -> int:
+        """The number of messages waiting to be sent, across all webhooks."""
+
+        return sum(q.queue.qsize() for q in self._queues.values())
+
+    async def close(self):
+        for q in self._queues.values():
+            if q.worker is not None:
+                q.worker.cancel()
+        self._queues.clear()
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,139 @@
+import asyncio
+import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+from .cache import LRUCache
+from .db import Database
+from .invalidation import Invalidation, Invalidator
+from .metrics import track_cache
+from .statements import CURRENT_FRONT
+
+
+class Front:
+    """The members in a system's latest switch."""
+
+    __slots__ = ("system", "switch", "timestamp", "members")
+
+    system: int
+    switch: Optional[int]  # None if the system has never switched
+    timestamp: Optional[datetime.datetime]
+    members: Tuple[int, ...]
+
+    def __init__(
+        self,
+        system: int,
+        switch: Optional[int] = None,
+        timestamp: Optional[datetime.datetime] = None,
+        members: Sequence[int] = (),
+    ):
+        self.system = system
+        self.switch = switch
+        self.timestamp = timestamp
+        self.members = tuple(members)
+
+    def __repr__(self):
+        return (
+            f"Front(system={self.system}, switch={self.switch}, members={self.members})"
+        )
+
+
+class FrontIndex:
+    """A cache of every system's current fronters.
+
+    A system's front is loaded the first time it's needed, and kept up to date
+    by `register_switch` rather than being looked up again.
+    Other processes are notified to drop their copy when a switch is registered."""
+
+    _db: Database
+    _invalidator: Invalidator
+    _fronts: LRUCache[int, Front]
+    _pending: Dict[int, asyncio.Future]
+    # bumped whenever a system's cached front changes while it's being loaded,
+    # so the load isn't cached. only systems with a load in flight are tracked
+    _generations: Dict[int, int]
+
+    def __init__(self, db: Database, invalidator: Invalidator, maxsize: int = 10000):
+        self._db = db
+        self._invalidator = invalidator
+        self._fronts = LRUCache(maxsize)
+        track_cache("fronts", self._fronts)
+        self._pending = dict()
+        self._generations = dict()
+        invalidator.register(Invalidation.FRONT, self.invalidate, self.clear)
+
+    async def get(self, system: int) -> Front:
+        """Returns the given system's current front, loading it if it isn't cached."""
+
+        front = self._fronts.get(system)
+        if front is not None:
+            return front
+
+        fut = self._pending.get(system)
+        if fut is None:
+            fut = asyncio.ensure_future(self._load(system))
+            self._pending[system] = fut
+            fut.add_done_callback(lambda f: self._done(system, f))
+
+        # shielded so one waiter being cancelled doesn't cancel the load for everyone else
+        return await asyncio.shield(fut)
+
+    def _done(self, system: int, fut: asyncio.Future):
+        if self._pending.get(system) is fut:
+            del self._pending[system]
+            self._generations.pop(system, None)
+
+    def _bump(self, system: int):
+        if system in self._pending:
+            self._generations[system] = self._generations.get(system, 0) + 1
+
+    async def _load(self, system: int) -> Front:
+        generation = self._generations.get(system, 0)
+        row = await self._db.fetchrow(CURRENT_FRONT, system)
+        if row is None:
+            front = Front(system)
+        else:
+            front = Front(system, row["id"], row["timestamp"], row["members"])
+
+        if self._generations.get(system, 0) != generation:
+            # a switch was registered or invalidated while loading, so this may be out of date
+            return self._fronts[system] if system in self._fronts else front
+
+        self._fronts[system] = front
+        return front
+
+    async def register_switch(self, system: int, members: Sequence[int]) -> Front:
+        """Registers a switch to the given members (in order), or a switch-out if `members` is empty."""
+
+        async with self._db.transaction() as conn:
+            row = await conn.fetchrow(
+                "insert into switches (system) values ($1) returning id, timestamp",
+                system,
+            )
+            await conn.execute(
+                """insert into switch_members (switch, member)
+                select $1, m from unnest($2::int[]) with ordinality as u (m, i) order by i""",
+                row["id"],
+                list(members),
+            )
+
+        # invalidating evicts the system here too, so the new front is cached afterwards
+        await self._invalidator.invalidate(Invalidation.FRONT, system)
+        self._bump(system)
+        front = self._fronts[system] = Front(
+            system, row["id"], row["timestamp"], members
+        )
+        return front
+
+    def invalidate(self, system: int):
+        """Drops the given system's cached front."""
+
+        self._bump(system)
+        self._fronts.pop(system)
+
+    def clear(self):
+        for system in self._pending:
+            self._bump(system)
+        self._fronts.clear()
+
+    def __len__(self) -> int:
+        return len(self._fronts)
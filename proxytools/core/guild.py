@@ -0,0 +1,205 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+import asyncpg
+import hikari
+
+from .db import Database
+from .invalidation import Invalidation, Invalidator
+
+_NOT_SET = object()
+
+
+class GuildSettings:
+    """A guild's settings from the guilds table, with its blacklists as sets."""
+
+    __slots__ = ("id", "log_channel", "log_blacklist", "blacklist")
+
+    id: hikari.Snowflake
+    log_channel: Optional[hikari.Snowflake]
+    log_blacklist: frozenset
+    blacklist: frozenset
+
+    def __init__(
+        self,
+        id: hikari.Snowflake,
+        log_channel: Optional[hikari.Snowflake] = None,
+        log_blacklist: Iterable[hikari.Snowflake] = (),
+        blacklist: Iterable[hikari.Snowflake] = (),
+    ):
+        self.id = id
+        self.log_channel = log_channel
+        self.log_blacklist = frozenset(log_blacklist)
+        self.blacklist = frozenset(blacklist)
+
+    def is_blacklisted(self, channel: hikari.Snowflake) -> bool:
+        """Returns True if messages in the given channel shouldn't be proxied."""
+
+        return channel in self.blacklist
+
+    def log_channel_for(self, channel: hikari.Snowflake) -> Optional[hikari.Snowflake]:
+        """Returns the channel proxied messages in the given channel should be logged to, if any."""
+
+        if self.log_channel is None or channel in self.log_blacklist:
+            return None
+        return self.log_channel
+
+    def __repr__(self):
+        return (
+            f"GuildSettings(id={self.id}, blacklist={len(self.blacklist)} channel(s))"
+        )
+
+
+class GuildSettingsCache:
+    """A cache of the settings of every guild the bot is in.
+
+    Settings are loaded when a guild becomes available, in batches of up to `batch_size` guilds
+    (so the burst of guilds on startup only takes a few queries), and dropped when the bot leaves.
+    Once a guild is loaded, nothing about it needs the database until its settings are changed.
+    """
+
+    _db: Database
+    _log: logging.Logger
+    _invalidator: Invalidator
+    _settings: Dict[hikari.Snowflake, GuildSettings]
+    _queue: Dict[hikari.Snowflake, asyncio.Future]
+    _task: Optional[asyncio.Task] = None
+
+    batch_size: int
+    batch_delay: float
+
+    def __init__(
+        self,
+        db: Database,
+        log: logging.Logger,
+        invalidator: Invalidator,
+        batch_size: int = 1000,
+        batch_delay: float = 0.1,
+    ):
+        self._db = db
+        self._log = log
+        self._invalidator = invalidator
+        self._settings = dict()
+        self._queue = dict()
+
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        invalidator.register(Invalidation.GUILD, self.invalidate, self.clear)
+
+    async def on_guild_available(self, event: hikari.GuildAvailableEvent):
+        # also dispatched when the bot joins a guild
+        if event.guild_id not in self._settings:
+            self._enqueue(event.guild_id)
+
+    async def on_guild_leave(self, event: hikari.GuildLeaveEvent):
+        self._settings.pop(event.guild_id, None)
+
+    async def get(self, guild: hikari.Snowflake) -> GuildSettings:
+        """Returns the given guild's settings, loading them if they aren't cached."""
+
+        settings = self._settings.get(guild)
+        if settings is not None:
+            return settings
+
+        # shielded so one waiter being cancelled doesn't cancel the load for everyone else
+        return await asyncio.shield(self._enqueue(guild))
+
+    def _enqueue(self, guild: hikari.Snowflake) -> asyncio.Future:
+        fut = self._queue.get(guild)
+        if fut is None:
+            fut = self._queue[guild] = asyncio.get_event_loop().create_future()
+            # guilds loaded in the background have nobody waiting for them,
+            # so mark errors as retrieved; they're logged when the batch fails
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        return fut
+
+    async def _run(self):
+        try:
+            while self._queue:
+                # wait for more guilds to arrive, unless there's already a full batch
+                if len(self._queue) < self.batch_size:
+                    await asyncio.sleep(self.batch_delay)
+
+                batch = dict()
+                for guild in list(self._queue)[: self.batch_size]:
+                    batch[guild] = self._queue.pop(guild)
+
+                try:
+                    await self._load(batch)
+                except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                    self._log.error(
+                        f"Error loading settings for {len(batch)} guild(s): {e}"
+                    )
+                    for fut in batch.values():
+                        if not fut.done():
+                            fut.set_exception(e)
+        finally:
+            self._task = None
+
+    async def _load(self, batch: Dict[hikari.Snowflake, asyncio.Future]):
+        rows = await self._db.fetch(
+            "select * from guilds where id = any($1::bigint[])", list(batch)
+        )
+        rows = {row["id"]: row for row in rows}
+
+        for guild, fut in batch.items():
+            row = rows.get(guild)
+            if row is None:
+                settings = GuildSettings(guild)
+            else:
+                settings = GuildSettings(
+                    guild, row["log_channel"], row["log_blacklist"], row["blacklist"]
+                )
+
+            self._settings[guild] = settings
+            if not fut.done():
+                fut.set_result(settings)
+
+    async def update(
+        self,
+        guild: hikari.Snowflake,
+        *,
+        log_channel: Optional[hikari.Snowflake] = _NOT_SET,
+        log_blacklist: Optional[Iterable[hikari.Snowflake]] = None,
+        blacklist: Optional[Iterable[hikari.Snowflake]] = None,
+    ) -> GuildSettings:
+        """Changes the given guild's settings. Arguments that aren't given are left as is."""
+
+        settings = await self.get(guild)
+        if log_channel is _NOT_SET:
+            log_channel = settings.log_channel
+        log_blacklist = frozenset(
+            settings.log_blacklist if log_blacklist is None else log_blacklist
+        )
+        blacklist = frozenset(settings.blacklist if blacklist is None else blacklist)
+
+        await self._db.execute(
+            """insert into guilds (id, log_channel, log_blacklist, blacklist) values ($1, $2, $3, $4)
+            on conflict (id) do update set log_channel = $2, log_blacklist = $3, blacklist = $4""",
+            guild,
+            log_channel,
+            list(log_blacklist),
+            list(blacklist),
+        )
+
+        # invalidating evicts the guild here too, so the new settings are cached afterwards
+        await self._invalidator.invalidate(Invalidation.GUILD, guild)
+        settings = self._settings[guild] = GuildSettings(
+            guild, log_channel, log_blacklist, blacklist
+        )
+        return settings
+
+    def invalidate(self, guild: hikari.Snowflake):
+        """Drops the given guild's settings, so they're loaded again the next time they're needed."""
+
+        self._settings.pop(guild, None)
+
+    def clear(self):
+        self._settings.clear()
+
+    def __len__(self) -> int:
+        return len(self._settings)
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import Optional
+
+import asyncpg
+
+from .db import Database
+
+
+class HidPool:
+    """Keeps the pools of free system and member IDs topped up in the background.
+
+    Creating a system or member claims an ID from its pool, which stays quick
+    no matter how full the ID space is. The refill does the searching instead,
+    in bulk and outside of any creation transaction."""
+
+    _db: Database
+    _log: logging.Logger
+    _task: Optional[asyncio.Task] = None
+
+    target: int
+    interval: float
+
+    def __init__(
+        self,
+        db: Database,
+        log: logging.Logger,
+        target: int = 1000,
+        interval: float = 60,
+    ):
+        self._db = db
+        self._log = log
+
+        self.target = target
+        self.interval = interval
+
+    def start(self):
+        """Starts refilling the pools in the background."""
+
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refill()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                self._log.error(f"Error refilling ID pools: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def refill(self) -> (int, int):
+        """Tops up both pools. Returns the number of system and member IDs added."""
+
+        systems: int = await self._db.fetchval(
+            "select refill_system_hids($1)", self.target
+        )
+        members: int = await self._db.fetchval(
+            "select refill_member_hids($1)", self.target
+        )
+
+        if systems or members:
+            self._log.debug(
+                f"Added {systems} system ID(s) and {members} member ID(s) to the pools"
+            )
+        return systems, members
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
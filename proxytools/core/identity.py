@@ -0,0 +1,121 @@
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+from .cache import LRUCache
+from .db import Database
+from .limits import Limits
+from .metrics import track_cache
+from .statements import MEMBER_IDENTITIES
+
+
+def webhook_name(name: str, tag: Optional[str] = None) -> str:
+    """Returns the webhook username for a member name and system tag, within Discord's limit.
+    If both don't fit, the name is shortened so the tag is kept."""
+
+    limit = Limits.WEBHOOK_NAME_LIMIT
+    if not tag:
+        return name[:limit]
+    if len(tag) + 2 > limit:
+        return f"{name} {tag}"[:limit]
+    return f"{name[: limit - len(tag) - 1]} {tag}"
+
+
+class Identity:
+    """The username and avatar a member is proxied with in a guild."""
+
+    __slots__ = ("username", "avatar_url")
+
+    username: str
+    avatar_url: Optional[str]
+
+    def __init__(self, username: str, avatar_url: Optional[str] = None):
+        self.username = username
+        self.avatar_url = avatar_url
+
+    def __repr__(self):
+        return f"Identity({self.username!r})"
+
+
+class IdentityResolver:
+    """A cache of the identities members are proxied with, by (member, guild).
+
+    Identities combine the member's name, display name and guild display name,
+    the system tag, and the member's or system's avatar. They're loaded for a whole
+    system in a guild at once, so the first message in a guild takes one query, and
+    every message after that only takes dictionary lookups.
+    Changes to a system, its members or their guild settings must invalidate `Invalidation.SYSTEM`.
+    """
+
+    _db: Database
+    _identities: LRUCache[Tuple[int, int], Dict[int, Identity]]
+    _guilds: Dict[int, Set[int]]
+    _pending: Dict[Tuple[int, int], asyncio.Future]
+
+    def __init__(self, db: Database, maxsize: int = 10000):
+        self._db = db
+        self._identities = LRUCache(maxsize, on_evict=self._evicted)
+        track_cache("identities", self._identities)
+        # the guilds each system has identities cached for, so they can all be invalidated at once
+        self._guilds = dict()
+        self._pending = dict()
+
+    async def get(self, system: int, member: int, guild: int) -> Optional[Identity]:
+        """Returns the identity of the given member of `system` in the given guild,
+        or None if the member doesn't exist."""
+
+        identities = self._identities.get((system, guild))
+        if identities is None:
+            key = (system, guild)
+            fut = self._pending.get(key)
+            if fut is None:
+                fut = asyncio.ensure_future(self._load(system, guild))
+                self._pending[key] = fut
+                fut.add_done_callback(lambda f: self._done(key, f))
+
+            # shielded so one waiter being cancelled doesn't cancel the load for everyone else
+            identities = await asyncio.shield(fut)
+
+        return identities.get(member)
+
+    def _done(self, key: Tuple[int, int], fut: asyncio.Future):
+        # a load that was invalidated while running may have read stale rows, so it isn't cached
+        if self._pending.get(key) is not fut:
+            return
+
+        del self._pending[key]
+        if not fut.cancelled() and fut.exception() is None:
+            self._identities[key] = fut.result()
+            self._guilds.setdefault(key[0], set()).add(key[1])
+
+    def _evicted(self, key: Tuple[int, int]):
+        system, guild = key
+        guilds = self._guilds.get(system)
+        if guilds is not None:
+            guilds.discard(guild)
+            if not guilds:
+                del self._guilds[system]
+
+    async def _load(self, system: int, guild: int) -> Dict[int, Identity]:
+        rows = await self._db.fetch(MEMBER_IDENTITIES, system, guild)
+        return {
+            row["id"]: Identity(
+                webhook_name(row["name"], row["tag"]), row["avatar_url"]
+            )
+            for row in rows
+        }
+
+    def invalidate(self, system: int):
+        """Drops the given system's cached identities in every guild."""
+
+        for guild in self._guilds.pop(system, ()):
+            self._identities.pop((system, guild))
+        for key in [key for key in self._pending if key[0] == system]:
+            del self._pending[key]
+
+    def clear(self):
+        self._identities.clear()
+        self._guilds.clear()
+        self._pending.clear()
+
+    def __len__(self) -> int:
+        return len(self._identities)
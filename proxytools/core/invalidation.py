@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Callable, Dict, Hashable, List, Optional
+
+import asyncpg
+
+from .db import Database
+
+CHANNEL = "proxytools_invalidate"
+
+
+class Invalidation:
+    """Kinds of cached data that can be invalidated, and what their keys are."""
+
+    ACCOUNT = "account"  # account IDs, for systems cached by account
+    SYSTEM = "system"  # system IDs, for anything cached per system (such as proxy tags and webhook names)
+    WEBHOOK = "webhook"  # channel IDs, for proxy webhooks
+    FRONT = "front"  # system IDs, for current fronters
+    GUILD = "guild"  # guild IDs, for guild settings
+
+
+class Invalidator:
+    """Invalidates cached data in every bot process, using Postgres LISTEN/NOTIFY.
+
+    Every process holds its own connection listening on the invalidation channel.
+    `invalidate` evicts the keys locally and notifies every other process to evict them too.
+    If the listening connection is lost, notifications may have been missed,
+    so all caches are cleared once it is listening again."""
+
+    _db: Database
+    _dsn: str
+    _log: logging.Logger
+    _origin: str
+    _conn: Optional[asyncpg.Connection] = None
+    _handlers: Dict[str, List[Callable[[Hashable], None]]]
+    _resets: List[Callable[[], None]]
+    _closing: bool = False
+
+    def __init__(self, db: Database, dsn: str, log: logging.Logger):
+        self._db = db
+        self._dsn = dsn
+        self._log = log
+        self._origin = uuid.uuid4().hex
+        self._handlers = dict()
+        self._resets = list()
+
+    def register(
+        self,
+        kind: str,
+        handler: Callable[[Hashable], None],
+        reset: Optional[Callable[[], None]] = None,
+    ):
+        """Registers a handler that evicts a single key of the given kind.
+        `reset` is called to clear the whole cache if notifications may have been missed.
+        """
+
+        self._handlers.setdefault(kind, []).append(handler)
+        if reset is not None:
+            self._resets.append(reset)
+
+    async def start(self):
+        """Connects to the database and starts listening for invalidations."""
+
+        self._closing = False
+        self._conn = await asyncpg.connect(self._dsn)
+        self._conn.add_termination_listener(self._on_terminated)
+        await self._conn.add_listener(CHANNEL, self._on_notification)
+
+    async def close(self):
+        self._closing = True
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def invalidate(self, kind: str, *keys: Hashable):
+        """Evicts the given keys in this process, and notifies all other processes to do the same."""
+
+        if not keys:
+            return
+
+        self._evict(kind, keys)
+
+        payload = json.dumps({"origin": self._origin, "kind": kind, "keys": keys})
+        await self._db.execute("select pg_notify($1, $2)", CHANNEL, payload)
+
+    def _evict(self, kind: str, keys):
+        for handler in self._handlers.get(kind, []):
+            for key in keys:
+                # keys made up of several IDs come back from JSON as lists
+                handler(tuple(key) if isinstance(key, list) else key)
+
+    def _on_notification(self, conn, pid, channel, payload: str):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            self._log.error(f"Invalid invalidation payload: {payload!r}")
+            return
+
+        if data.get("origin") == self._origin:
+            return
+
+        self._evict(data["kind"], data["keys"])
+
+    def _on_terminated(self, conn):
+        if self._closing:
+            return
+
+        self._log.warning("Invalidation listener disconnected, clearing caches")
+        self._conn = None
+        asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 1
+        while not self._closing:
+            try:
+                await self.start()
+            except (OSError, asyncpg.PostgresError) as e:
+                self._log.error(f"Couldn't reconnect invalidation listener: {e}")
+            else:
+                # anything could have changed while nothing was listening
+                for reset in self._resets:
+                    reset()
+
+                self._log.info("Invalidation listener reconnected")
+                return
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
@@ -1,3 +1,5 @@
 class Limits:
     SYSTEM_NAME_LIMIT = 100
+    MEMBER_NAME_LIMIT = 100
     DESCRIPTION_LIMIT = 1000
+    WEBHOOK_NAME_LIMIT = 80
@@ -1,16 +1,210 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# attributes every LogRecord has, so anything else was passed with `extra`
+_RECORD_ATTRS = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__.keys()
+) | {"message", "asctime"}
+
+TEXT_FORMAT = "%(levelname)-1.1s %(asctime)23.23s %(name)s: %(message)s"
 
 
 def getLogger(name=None, level=logging.INFO):
+    """Returns a logger with the given level. Its records are written by the handlers
+    set up by `setup_logging`, so nothing is written from the calling thread."""
+
     name = __name__ if name is None else name
     logger = logging.getLogger(name)
     logger.setLevel(level)
+    return logger
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including any fields passed with `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str)
+
+    def formatTime(self, record: logging.LogRecord, datefmt=None) -> str:
+        return (
+            time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z"
+        )
+
+
+class _Limit:
+    __slots__ = ("rate", "burst", "sample", "tokens", "updated")
+
+    rate: Optional[float]
+    burst: float
+    sample: Optional[float]
+    tokens: float
+    updated: float
+
+    def __init__(self, rate: Optional[float], sample: Optional[float]):
+        self.rate = rate
+        self.burst = rate or 0.0
+        self.sample = sample
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+
+class LogLimiter(logging.Filter):
+    """Limits how much each logger logs, so verbose logging can stay on in hot paths.
+
+    `rates` maps logger names to the most records per second they may log (with bursts of up
+    to a second's worth), and `samples` maps logger names to the fraction of their debug records
+    that are kept. Both apply to child loggers too, with the most specific name winning.
+    Warnings and errors are never dropped."""
+
+    _rates: Dict[str, float]
+    _samples: Dict[str, float]
+    _limits: Dict[str, Optional[_Limit]]
+    _lock: threading.Lock
+
+    dropped: int = 0
+
+    def __init__(
+        self,
+        rates: Optional[Dict[str, float]] = None,
+        samples: Optional[Dict[str, float]] = None,
+    ):
+        super().__init__()
+        self._rates = dict(rates or {})
+        self._samples = dict(samples or {})
+        self._limits = dict()
+        self._lock = threading.Lock()
 
-    handler = logging.StreamHandler()
+    def _lookup(self, settings: Dict[str, float], name: str) -> Optional[float]:
+        while True:
+            if name in settings:
+                return settings[name]
+            if "." not in name:
+                return settings.get("")
+            name = name.rsplit(".", 1)[0]
+
+    def _limit_for(self, name: str) -> Optional[_Limit]:
+        try:
+            return self._limits[name]
+        except KeyError:
+            pass
+
+        rate = self._lookup(self._rates, name)
+        sample = self._lookup(self._samples, name)
+        limit = None if rate is None and sample is None else _Limit(rate, sample)
+        self._limits[name] = limit
+        return limit
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        limit = self._limit_for(record.name)
+        if limit is None:
+            return True
+
+        if (
+            limit.sample is not None
+            and record.levelno <= logging.DEBUG
+            and random.random() >= limit.sample
+        ):
+            self.dropped += 1
+            return False
+
+        if limit.rate is not None:
+            with self._lock:
+                now = time.monotonic()
+                limit.tokens = min(
+                    limit.burst, limit.tokens + (now - limit.updated) * limit.rate
+                )
+                limit.updated = now
+                if limit.tokens < 1:
+                    self.dropped += 1
+                    return False
+                limit.tokens -= 1
+
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread, dropping them if the queue is full rather than waiting."""
+
+    dropped: int = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # arguments may change after this returns, so the message is built now,
+        # but the record isn't formatted, so JSON output keeps its fields.
+        # This is the only handler, so the record is changed in place rather than copied
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(
+    level=logging.INFO,
+    json_format: bool = False,
+    file: Optional[str] = None,
+    max_queue: int = 10000,
+    limiter: Optional[LogLimiter] = None,
+) -> Tuple[_QueueHandler, logging.handlers.QueueListener]:
+    """Routes all logging through a queue to a background thread, which writes it to stderr
+    (and to `file`, if given), so logging never blocks the event loop on I/O.
+    Replaces any handlers already on the root logger. The listener is stopped on exit,
+    after writing everything still queued."""
+
+    formatter = JSONFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if file:
+        handlers.append(logging.FileHandler(file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    handler = _QueueHandler(queue.Queue(max_queue))
+    # loggers like the bot's set their own, lower levels, so the root logger's level isn't enough
     handler.setLevel(level)
-    # handler.setFormatter(
-    #     logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    # )
-    # logger.addHandler(handler)
+    if limiter is not None:
+        handler.addFilter(limiter)
+    listener = logging.handlers.QueueListener(
+        handler.queue, *handlers, respect_handler_level=True
+    )
 
-    return logger
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return handler, listener
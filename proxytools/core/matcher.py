@@ -0,0 +1,123 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .member import Member, ProxyTag
+
+# Marks a trie node as the end of a prefix (or reversed suffix).
+# Never a valid key for a single character, so it can't collide with a child.
+_END = ""
+
+
+def _insert(root: dict, chars: Iterable[str]):
+    node = root
+    for c in chars:
+        node = node.setdefault(c, {})
+    node[_END] = True
+
+
+def _walk(root: dict, chars: Iterable[str]) -> List[int]:
+    """Walks the trie along `chars`, returning the length of every stored key
+    that is a prefix of `chars`, shortest first."""
+
+    matched = [0] if _END in root else []
+    node = root
+    for i, c in enumerate(chars, 1):
+        node = node.get(c)
+        if node is None:
+            break
+        if _END in node:
+            matched.append(i)
+    return matched
+
+
+class ProxyMatcher:
+    """A compiled matcher for every proxy tag in a system.
+
+    Tags are stored in a prefix trie and a reversed-suffix trie, so matching a message
+    walks the content once from each end, no matter how many members or tags the system has.
+    Like PluralKit, the longest tag (prefix and suffix combined) wins."""
+
+    _prefixes: dict
+    _suffixes: dict
+    _tags: Dict[Tuple[str, str], Tuple[Member, ProxyTag]]
+    _members: Dict[int, Member]
+
+    def __init__(self, members: Iterable[Member]):
+        self._prefixes = dict()
+        self._suffixes = dict()
+        self._tags = dict()
+        self._members = dict()
+
+        for member in members:
+            self._members[member.id] = member
+            for tag in member.proxy_tags:
+                prefix = tag.prefix or ""
+                suffix = tag.suffix or ""
+                if not prefix and not suffix:
+                    continue
+
+                # if two members share a tag, the first one keeps it
+                if (prefix, suffix) in self._tags:
+                    continue
+
+                self._tags[(prefix, suffix)] = (member, tag)
+                _insert(self._prefixes, prefix)
+                _insert(self._suffixes, reversed(suffix))
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def member(self, id: Optional[int]) -> Optional[Member]:
+        """Returns the system's member with the given ID, or None if there isn't one."""
+
+        return self._members.get(id)
+
+    def find(self, name: str) -> Optional[Member]:
+        """Finds one of the system's members by ID or (case-insensitive) name."""
+
+        name = name.lower()
+        for member in self._members.values():
+            if member.hid == name:
+                return member
+        for member in self._members.values():
+            if member.name.lower() == name:
+                return member
+        return None
+
+    def match(self, content: str) -> (Optional[Member], Optional[str]):
+        """Matches the given message content against every proxy tag in the system.
+        Returns the matched member and the content without the proxy tags
+        (or with them, if the member has keep_proxy set), or None, None if nothing matched.
+        """
+
+        prefixes = _walk(self._prefixes, content)
+        if not prefixes:
+            return None, None
+        suffixes = _walk(self._suffixes, reversed(content))
+        if not suffixes:
+            return None, None
+
+        length = len(content)
+        best: Optional[Tuple[Member, ProxyTag]] = None
+        best_len, best_prefix, best_suffix = -1, 0, 0
+
+        # both lists are sorted shortest first, so walk them backwards
+        # and stop as soon as a pair can't beat the current best
+        for p in reversed(prefixes):
+            for s in reversed(suffixes):
+                total = p + s
+                if total <= best_len:
+                    break
+                if total > length:
+                    continue
+
+                entry = self._tags.get((content[:p], content[length - s :]))
+                if entry is not None:
+                    best, best_len, best_prefix, best_suffix = entry, total, p, s
+
+        if best is None:
+            return None, None
+
+        member = best[0]
+        if member.keep_proxy:
+            return member, content
+        return member, content[best_prefix : length - best_suffix].strip()
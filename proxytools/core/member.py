@@ -1,21 +1,26 @@
 from datetime import datetime
-from typing import Union, Optional, List
+from typing import Union, Optional, List, Tuple
 
 import asyncpg
 import hikari
 
+from .db import Database
 from .enums import *
+from .model import Model
+from .statements import MEMBERS_BY_SYSTEM
 
 
 class ProxyTag:
-    """A proxy tag object."""
+    """A proxy tag object. Compares and hashes by its prefix and suffix."""
+
+    __slots__ = ("prefix", "suffix")
 
     prefix: Optional[str]
     suffix: Optional[str]
 
-    def __init__(self, **kwargs):
-        self.prefix = kwargs.get("prefix", None)
-        self.suffix = kwargs.get("suffix", None)
+    def __init__(self, prefix: Optional[str] = None, suffix: Optional[str] = None):
+        self.prefix = prefix
+        self.suffix = suffix
 
     def match(self, content: str, keep_proxy: bool = False) -> (bool, Optional[str]):
         """Matches this proxy tag with the given message content.
@@ -41,6 +46,14 @@ class ProxyTag:
                 return True, content.removesuffix(self.suffix).strip()
         return False, None
 
+    def __eq__(self, other):
+        if not isinstance(other, ProxyTag):
+            return NotImplemented
+        return self.prefix == other.prefix and self.suffix == other.suffix
+
+    def __hash__(self):
+        return hash((self.prefix, self.suffix))
+
     def __str__(self):
         return f"{self.prefix or 'None'}text{self.suffix or 'None'}"
 
@@ -48,39 +61,60 @@ class ProxyTag:
         return f"ProxyTag({self.prefix or 'None'}, {self.suffix or 'None'})"
 
 
-class Member:
+def _proxy_tags(rows) -> Tuple[ProxyTag, ...]:
+    return tuple(ProxyTag(row["prefix"], row["suffix"]) for row in rows)
+
+
+class Member(Model):
     """A member object from the database."""
 
+    __slots__ = (
+        "id",
+        "hid",
+        "system",
+        "system_hid",
+        "name",
+        "display_name",
+        "colour",
+        "description",
+        "proxy_tags",
+        "avatar_url",
+        "created",
+        "keep_proxy",
+        "description_privacy",
+    )
+
+    _fields = (
+        ("id", None, None),
+        ("hid", None, None),
+        ("system", None, None),
+        ("system_hid", None, None),
+        ("name", None, None),
+        ("display_name", None, None),
+        ("colour", None, None),
+        ("description", None, None),
+        ("proxy_tags", (), _proxy_tags),
+        ("avatar_url", None, None),
+        ("created", None, None),
+        ("keep_proxy", None, None),
+        ("description_privacy", None, Privacy.get),
+    )
+
     id: int
     hid: str
+    system: Optional[int]
     system_hid: Optional[str]  # Only optional because not every view returns this
     name: str
     display_name: Optional[str]
     colour: Optional[str]
     description: Optional[str]
-    proxy_tags: List[ProxyTag]
+    proxy_tags: Tuple[ProxyTag, ...]
     avatar_url: Optional[str]
     created: datetime
 
     keep_proxy: bool
     description_privacy: Privacy
 
-    def __init__(self, **kwargs):
-        self.id = kwargs.get("id")
-        self.hid = kwargs.get("hid")
-        self.system_hid = kwargs.get("system_hid", None)
-        self.name = kwargs.get("name")
-        self.display_name = kwargs.get("display_name", None)
-        self.colour = kwargs.get("colour", None)
-        self.avatar_url = kwargs.get("avatar_url", None)
-        self.created = kwargs.get("created")
-        self.keep_proxy = kwargs.get("keep_proxy")
-
-        proxy_tags: List[dict] = kwargs.get("proxy_tags", [])
-        self.proxy_tags = [ProxyTag(**row) for row in proxy_tags]
-
-        self.description_privacy = Privacy.get(kwargs.get("description_privacy"))
-
     def match_proxy(self, content: str) -> (bool, Optional[str]):
         """Matches all of this member's proxies, and returns the first one that matches.
         Returns False, None if none of the proxies matched."""
@@ -94,21 +128,28 @@ class Member:
 
     @staticmethod
     async def fetch(
-        conn: asyncpg.Connection, id: str, user_id: Optional[hikari.Snowflake] = None
+        db: Database, id: str, user_id: Optional[hikari.Snowflake] = None
     ) -> Optional["Member"]:
         """Fetches a member by name, ID, or display name (for own members),
         or by ID (for other members)"""
 
         if user_id is not None:
-            return await Member._fetch_own(conn, user_id, id)
-        return await Member._fetch(conn, id)
+            return await Member._fetch_own(db, user_id, id)
+        return await Member._fetch(db, id)
 
     @staticmethod
     async def _fetch_own(
-        conn: asyncpg.Connection, user_id: hikari.Snowflake, id: str
+        db: Database, user_id: hikari.Snowflake, id: str
     ) -> Optional["Member"]:
         pass
 
     @staticmethod
-    async def _fetch(conn: asyncpg.Connection, id: str) -> Optional["Member"]:
+    async def _fetch(db: Database, id: str) -> Optional["Member"]:
         pass
+
+    @staticmethod
+    async def fetch_for_system(db: Database, system: int) -> List["Member"]:
+        """Fetches all members of the given system."""
+
+        rows = await db.fetch(MEMBERS_BY_SYSTEM, system)
+        return Member.from_records(rows)
@@ -0,0 +1,299 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+import hikari
+
+from .db import Database
+from .statements import MESSAGE_BY_ID
+
+# raised by asyncpg for values it can't encode, before anything is sent
+_ENCODE_ERRORS = (ValueError, TypeError, OverflowError)
+
+
+class ProxiedMessage:
+    """A proxied message from the messages table."""
+
+    mid: int
+    channel: int
+    member: int
+    sender: int
+    original_mid: Optional[int]
+
+    def __init__(self, **kwargs):
+        self.mid = kwargs.get("mid")
+        self.channel = kwargs.get("channel")
+        self.member = kwargs.get("member")
+        self.sender = kwargs.get("sender")
+        self.original_mid = kwargs.get("original_mid", None)
+
+    def record(self) -> tuple:
+        return self.mid, self.channel, self.member, self.sender, self.original_mid
+
+    def __repr__(self):
+        return f"ProxiedMessage(mid={self.mid}, member={self.member}, sender={self.sender})"
+
+
+class MessageLog:
+    """A write-behind buffer for the messages table.
+
+    Messages are added to the buffer and written in bulk, either every `interval` seconds
+    or as soon as `max_rows` messages are waiting. Rows stay in the buffer until
+    the write succeeds, and lookups check the buffer first, so a message can
+    always be found as soon as it's added.
+
+    If the database is unavailable for long enough that `max_buffered` messages are waiting,
+    the oldest ones are dropped. Rows the database rejects are dropped and logged."""
+
+    COLUMNS = ("mid", "channel", "member", "sender", "original_mid")
+
+    _db: Database
+    _log: logging.Logger
+    _buffer: Dict[int, ProxiedMessage]
+    _by_original: Dict[int, int]
+    _lock: asyncio.Lock
+    _task: Optional[asyncio.Task] = None
+    _flush_task: Optional[asyncio.Task] = None
+
+    interval: float
+    max_rows: int
+    max_buffered: int
+
+    # statistics
+    dropped: int = 0
+
+    def __init__(
+        self,
+        db: Database,
+        log: logging.Logger,
+        interval: float = 1.0,
+        max_rows: int = 500,
+        max_buffered: int = 10000,
+    ):
+        self._db = db
+        self._log = log
+        self._buffer = dict()
+        self._by_original = dict()
+        self._lock = asyncio.Lock()
+
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_buffered = max(max_buffered, max_rows)
+
+    def start(self):
+        """Starts flushing the buffer in the background."""
+
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def add(self, message: ProxiedMessage):
+        """Adds a message to the buffer."""
+
+        self._buffer[message.mid] = message
+        if message.original_mid is not None:
+            self._by_original[message.original_mid] = message.mid
+
+        if len(self._buffer) > self.max_buffered:
+            # the database has been failing for a while, so the oldest message is given up on
+            self._discard(next(iter(self._buffer.values())))
+            self.dropped += 1
+
+        if len(self._buffer) >= self.max_rows and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> int:
+        """Writes all buffered messages to the database. Returns the number of messages written.
+        If the database can't be reached, the messages stay in the buffer to be written next time.
+        If it rejects the batch, the messages are written one at a time, dropping the ones it rejects.
+        """
+
+        async with self._lock:
+            if not self._buffer:
+                return 0
+
+            batch = list(self._buffer.values())
+            try:
+                try:
+                    await self._write(batch)
+                except (asyncpg.PostgresError, *_ENCODE_ERRORS) as e:
+                    self._log.warning(
+                        "Error writing %d message(s), writing them one at a time: %s",
+                        len(batch),
+                        e,
+                    )
+                    await self._write_each(batch)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                self._log.error(
+                    "Error writing %d message(s), keeping them buffered (%d dropped so far): %s",
+                    len(batch),
+                    self.dropped,
+                    e,
+                )
+                return 0
+
+            for m in batch:
+                self._discard(m)
+
+            return len(batch)
+
+    def _discard(self, m: ProxiedMessage):
+        # a message re-added while the batch was being written is written next time
+        if self._buffer.get(m.mid) is m:
+            del self._buffer[m.mid]
+        if m.original_mid is not None and (
+            self._by_original.get(m.original_mid) == m.mid
+        ):
+            del self._by_original[m.original_mid]
+
+    async def _write(self, batch: List[ProxiedMessage]):
+        records = [m.record() for m in batch]
+        try:
+            async with self._db.acquire() as conn:
+                await conn.copy_records_to_table(
+                    "messages", records=records, columns=self.COLUMNS
+                )
+        except asyncpg.IntegrityConstraintViolationError:
+            # a message was already written, or its member was deleted in the meantime,
+            # so fall back to an insert that skips those rows
+            await self._db.execute(
+                """insert into messages (mid, channel, member, sender, original_mid)
+                select m.* from unnest($1::bigint[], $2::bigint[], $3::int[], $4::bigint[], $5::bigint[])
+                as m (mid, channel, member, sender, original_mid)
+                where exists (select 1 from members where id = m.member)
+                on conflict (mid) do nothing""",
+                *[list(col) for col in zip(*records)],
+            )
+
+    async def _write_each(self, batch: List[ProxiedMessage]):
+        """Inserts messages one at a time, dropping the ones with bad data.
+        Any other error is raised, and the batch is tried again later."""
+
+        async with self._db.acquire() as conn:
+            for m in batch:
+                try:
+                    await conn.execute(
+                        """insert into messages (mid, channel, member, sender, original_mid)
+                        select $1, $2, $3, $4, $5
+                        where exists (select 1 from members where id = $3)
+                        on conflict (mid) do nothing""",
+                        *m.record(),
+                    )
+                except (
+                    asyncpg.DataError,
+                    asyncpg.IntegrityConstraintViolationError,
+                    *_ENCODE_ERRORS,
+                ) as e:
+                    self.dropped += 1
+                    self._log.error("Dropping message %s, couldn't write it: %s", m, e)
+
+    async def fetch(self, id: hikari.Snowflake) -> Optional[ProxiedMessage]:
+        """Fetches a proxied message by either its own ID or the ID of the original message."""
+
+        mid = self._by_original.get(id, id)
+        msg = self._buffer.get(mid)
+        if msg is not None:
+            return msg
+
+        row = await self._db.fetchrow(MESSAGE_BY_ID, id)
+        return ProxiedMessage(**row) if row else None
+
+    async def close(self):
+        """Stops the background task and writes any remaining messages."""
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        for _ in range(3):
+            await self.flush()
+            if not self._buffer:
+                return
+            await asyncio.sleep(1)
+
+        self._log.error(f"Couldn't write {len(self._buffer)} message(s) on shutdown")
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+
+class MessagePartitions:
+    """Keeps the partitions of the messages table ready and drops expired ones in the background.
+
+    Partitions are created `months_ahead` months in advance. If `retention_days` is set,
+    partitions that only hold messages older than that are dropped, which is much cheaper
+    than deleting rows and leaves no dead tuples behind."""
+
+    _db: Database
+    _log: logging.Logger
+    _task: Optional[asyncio.Task] = None
+
+    retention_days: Optional[int]
+    months_ahead: int
+    interval: float
+
+    def __init__(
+        self,
+        db: Database,
+        log: logging.Logger,
+        retention_days: Optional[int] = None,
+        months_ahead: int = 2,
+        interval: float = 3600,
+    ):
+        self._db = db
+        self._log = log
+
+        self.retention_days = retention_days
+        self.months_ahead = months_ahead
+        self.interval = interval
+
+    def start(self):
+        """Starts maintaining the partitions in the background."""
+
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.maintain()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                self._log.error(f"Error maintaining message partitions: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def maintain(self) -> Tuple[int, List[str]]:
+        """Creates upcoming partitions and drops expired ones.
+        Returns the number of partitions created and the names of the dropped partitions.
+        """
+
+        created: int = await self._db.fetchval(
+            "select create_message_partitions($1)", self.months_ahead
+        )
+        if created:
+            self._log.info(f"Created {created} message partition(s)")
+
+        dropped = []
+        if self.retention_days:
+            rows = await self._db.fetch(
+                "select * from drop_message_partitions(now() - make_interval(days => $1))",
+                self.retention_days,
+            )
+            dropped = [row[0] for row in rows]
+            if dropped:
+                self._log.info(
+                    f"Dropped expired message partition(s): {', '.join(dropped)}"
+                )
+
+        return created, dropped
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
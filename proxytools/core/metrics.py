@@ -0,0 +1,373 @@
+import asyncio
+import bisect
+import contextlib
+import logging
+import math
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .cache import LRUCache
+
+# latency buckets in seconds, from a fraction of a millisecond up to slow REST calls
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(value)
+
+
+class Metric:
+    """A named metric, with optional labels. Label values are passed positionally, in the order of `labels`."""
+
+    type: str = "untyped"
+
+    name: str
+    help: str
+    labels: Tuple[str, ...]
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name})"
+
+
+class _Value(Metric):
+    """A single value per set of labels. Either updated directly, or read from `fn` whenever metrics
+    are collected, for values something else already keeps track of.
+    `fn` returns a dictionary of label value tuples to values."""
+
+    _values: Dict[tuple, float]
+    _fn: Optional[Callable[[], Dict[tuple, float]]]
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        fn: Optional[Callable[[], Dict[tuple, float]]] = None,
+    ):
+        super().__init__(name, help, labels)
+        self._values = dict()
+        self._fn = fn
+
+    def get(self, *labels) -> float:
+        values = self._values if self._fn is None else self._fn()
+        return values.get(labels, 0)
+
+    def _samples(self) -> Iterator[str]:
+        values = self._values if self._fn is None else self._fn()
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Counter(_Value):
+    """A value that only goes up, such as a number of requests."""
+
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Value):
+    """A value that can go up and down, such as a queue size."""
+
+    type = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "sum", "count")
+
+    counts: List[int]
+    sum: float
+    count: int
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    """Counts observations, such as latencies, into buckets. Quantiles are estimated from the buckets when querying.
+
+    Observing only does a binary search over the bucket bounds, so it's cheap enough for hot paths.
+    """
+
+    type = "histogram"
+
+    _buckets: Tuple[float, ...]
+    _values: Dict[tuple, _HistogramValue]
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self._buckets = tuple(sorted(buckets))
+        self._values = dict()
+
+    def observe(self, value: float, *labels):
+        v = self._values.get(labels)
+        if v is None:
+            # the last count is for values above every bucket
+            v = self._values[labels] = _HistogramValue(len(self._buckets) + 1)
+
+        v.counts[bisect.bisect_left(self._buckets, value)] += 1
+        v.sum += value
+        v.count += 1
+
+    @contextlib.contextmanager
+    def time(self, *labels):
+        """Observes how long the block takes, in seconds."""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels) -> int:
+        v = self._values.get(labels)
+        return 0 if v is None else v.count
+
+    def _samples(self) -> Iterator[str]:
+        names = self.labels + ("le",)
+        for labels, v in self._values.items():
+            total = 0
+            for bound, count in zip(self._buckets + (math.inf,), v.counts):
+                total += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {total}"
+
+            suffix = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum{suffix} {_format_value(v.sum)}"
+            yield f"{self.name}_count{suffix} {v.count}"
+
+
+_metrics: Dict[str, Metric] = dict()
+_caches: Dict[str, LRUCache] = dict()
+
+
+def register_metric(metric: Metric, replace: bool = False) -> Metric:
+    """Registers a metric, so it's included in `collect_metrics`.
+    Metrics reading from a specific object should be registered with `replace`,
+    so creating a new object (such as a new bot in tests) takes over the name."""
+
+    if metric.name in _metrics and not replace:
+        raise ValueError(f"Metric {metric.name} is already registered")
+
+    _metrics[metric.name] = metric
+    return metric
+
+
+def track_cache(name: str, cache: LRUCache):
+    """Reports the hits and misses of the given cache. Replaces any cache tracked under the same name."""
+
+    _caches[name] = cache
+
+
+def collect_metrics() -> str:
+    """Returns every registered metric in Prometheus' text format."""
+
+    lines = []
+    for metric in _metrics.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+COMMAND_LATENCY = register_metric(
+    Histogram(
+        "proxytools_command_seconds",
+        "Time taken to run commands, by command and outcome.",
+        ("command", "outcome"),
+    )
+)
+
+DB_QUERY_LATENCY = register_metric(
+    Histogram(
+        "proxytools_db_query_seconds",
+        "Time taken by database queries, including waiting for a connection, by statement name.",
+        ("statement",),
+    )
+)
+
+WEBHOOK_REQUEST_LATENCY = register_metric(
+    Histogram(
+        "proxytools_webhook_request_seconds",
+        "Time taken by webhook execute requests to Discord, by status code.",
+        ("status",),
+    )
+)
+
+WEBHOOK_EXECUTE_LATENCY = register_metric(
+    Histogram(
+        "proxytools_webhook_execute_seconds",
+        "Time from queueing a webhook message to it being sent, including queueing and rate limits.",
+    )
+)
+
+WEBHOOK_RATELIMITS = register_metric(
+    Counter(
+        "proxytools_webhook_ratelimits_total",
+        "Webhook execute requests that were rate limited, by scope.",
+        ("scope",),
+    )
+)
+
+ATTACHMENT_BYTES = register_metric(
+    Counter(
+        "proxytools_attachment_bytes_total",
+        "Bytes of attachments relayed from proxied messages.",
+    )
+)
+
+PROXY_LATENCY = register_metric(
+    Histogram(
+        "proxytools_proxy_seconds",
+        "Time taken to proxy a message, from receiving it to deleting the original.",
+    )
+)
+
+GATEWAY_LAG = register_metric(
+    Histogram(
+        "proxytools_gateway_lag_seconds",
+        "Time between a message being created and its event being handled.",
+        buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+    )
+)
+
+CACHE_HITS = register_metric(
+    Counter(
+        "proxytools_cache_hits_total",
+        "Lookups that were found in the cache, by cache.",
+        ("cache",),
+        lambda: {(name,): cache.hits for name, cache in _caches.items()},
+    )
+)
+
+CACHE_MISSES = register_metric(
+    Counter(
+        "proxytools_cache_misses_total",
+        "Lookups that weren't found in the cache, by cache.",
+        ("cache",),
+        lambda: {(name,): cache.misses for name, cache in _caches.items()},
+    )
+)
+
+CACHE_SIZE = register_metric(
+    Gauge(
+        "proxytools_cache_size",
+        "Entries in the cache, by cache.",
+        ("cache",),
+        lambda: {(name,): len(cache) for name, cache in _caches.items()},
+    )
+)
+
+
+class MetricsServer:
+    """Serves the registered metrics over HTTP for Prometheus to scrape, on `/metrics`.
+
+    Only meant to be reachable locally, so it only speaks enough HTTP for that."""
+
+    _log: logging.Logger
+    _server: Optional[asyncio.AbstractServer] = None
+
+    host: str
+    port: int
+
+    def __init__(self, log: logging.Logger, host: str = "127.0.0.1", port: int = 9100):
+        self._log = log
+        self.host = host
+        self.port = port
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(
+                self._handle, self.host, self.port
+            )
+            self._log.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            method, path, _ = request.split(b"\r\n", 1)[0].decode().split(" ", 2)
+
+            if method != "GET":
+                status, body = "405 Method Not Allowed", b""
+            elif path.split("?", 1)[0] != "/metrics":
+                status, body = "404 Not Found", b""
+            else:
+                status, body = "200 OK", collect_metrics().encode()
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (
+            asyncio.TimeoutError,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+            ConnectionError,
+            ValueError,
+        ):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+
+from .db import Database
+
+SQL = Path(__file__).parent / "sql"
+
+# the advisory lock held while migrating, so replicas starting at the same time take turns
+LOCK_ID = 0x70726F7879  # "proxy"
+
+
+class MigrationError(Exception):
+    """A migration couldn't be applied."""
+
+
+def checksum(sql: str) -> str:
+    return hashlib.sha256(sql.encode()).hexdigest()
+
+
+class MigrationResult:
+    """What a migration run did, and how long each step took."""
+
+    applied: List[str]
+    functions_updated: bool
+    timings: Dict[str, float]
+
+    def __init__(self):
+        self.applied = []
+        self.functions_updated = False
+        self.timings = dict()
+
+    def __repr__(self):
+        timings = ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in self.timings.items())
+        return f"MigrationResult(applied={self.applied}, functions_updated={self.functions_updated}, {timings})"
+
+
+class Migrator:
+    """Applies database migrations and keeps the SQL functions up to date.
+
+    Each migration runs in its own transaction and its checksum is recorded,
+    so a migration that was changed after being applied is reported.
+    Functions are only dropped and recreated when `clean.sql` or `functions.sql` has changed.
+    The whole run holds an advisory lock, so several processes can start at once."""
+
+    _db: Database
+    _log: logging.Logger
+    _directory: Path
+
+    def __init__(self, db: Database, log: logging.Logger, directory: Path = SQL):
+        self._db = db
+        self._log = log
+        self._directory = directory
+
+    def _migrations(self) -> List[Tuple[str, str]]:
+        files = sorted(
+            f for f in (self._directory / "migrations").iterdir() if f.is_file()
+        )
+        return [(f.name, f.read_text()) for f in files]
+
+    async def run(self) -> MigrationResult:
+        result = MigrationResult()
+
+        start = time.perf_counter()
+        async with self._db.acquire() as conn:
+            await conn.execute("select pg_advisory_lock($1)", LOCK_ID)
+            try:
+                result.timings["lock"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                await self._migrate(conn, result)
+                result.timings["migrations"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                await self._functions(conn, result)
+                result.timings["functions"] = time.perf_counter() - start
+            finally:
+                await conn.execute("select pg_advisory_unlock($1)", LOCK_ID)
+
+        return result
+
+    async def _migrate(self, conn: asyncpg.Connection, result: MigrationResult):
+        await conn.execute("""create table if not exists schema_checksums (
+                name        text    primary key,
+                checksum    text    not null,
+                applied     timestamp with time zone not null default (current_timestamp)
+            )""")
+
+        current = await self._version(conn)
+        recorded = {
+            row["name"]: row["checksum"]
+            for row in await conn.fetch("select name, checksum from schema_checksums")
+        }
+
+        for i, (name, sql) in enumerate(self._migrations(), 1):
+            sum = checksum(sql)
+
+            if i <= current:
+                if name not in recorded:
+                    # applied before checksums were recorded
+                    await conn.execute(
+                        "insert into schema_checksums (name, checksum) values ($1, $2)",
+                        name,
+                        sum,
+                    )
+                elif recorded[name] != sum:
+                    self._log.warning(
+                        f"Migration {name} was changed after it was applied"
+                    )
+                continue
+
+            try:
+                async with conn.transaction():
+                    await conn.execute(sql)
+                    await conn.execute(
+                        """insert into schema_checksums (name, checksum) values ($1, $2)
+                        on conflict (name) do update set checksum = $2, applied = current_timestamp""",
+                        name,
+                        sum,
+                    )
+            except asyncpg.PostgresError as e:
+                raise MigrationError(f"Error executing migration {name}: {e}") from e
+
+            self._log.info("Executed migration %s", name)
+            result.applied.append(name)
+
+    @staticmethod
+    async def _version(conn: asyncpg.Connection) -> int:
+        exists = await conn.fetchval("select to_regclass('info') is not null")
+        if not exists:
+            return 0
+        version: Optional[int] = await conn.fetchval("select schema_version from info")
+        return version or 0
+
+    async def _functions(self, conn: asyncpg.Connection, result: MigrationResult):
+        clean = (self._directory / "clean.sql").read_text()
+        functions = (self._directory / "functions.sql").read_text()
+        sum = checksum(clean + functions)
+
+        recorded = await conn.fetchval(
+            "select checksum from schema_checksums where name = 'functions'"
+        )
+        if recorded == sum:
+            return
+
+        async with conn.transaction():
+            await conn.execute(clean)
+            await conn.execute(functions)
+            await conn.execute(
+                """insert into schema_checksums (name, checksum) values ('functions', $1)
+                on conflict (name) do update set checksum = $1, applied = current_timestamp""",
+                sum,
+            )
+
+        self._log.info("Created SQL functions")
+        result.functions_updated = True
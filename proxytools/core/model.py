@@ -0,0 +1,82 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+# (attribute/column name, default if the column is missing, optional converter)
+Field = Tuple[str, Any, Optional[Callable[[Any], Any]]]
+
+
+class Model:
+    """Base class for objects built from database rows.
+
+    Subclasses declare their columns in `_fields`, and an attribute for each of them in `__slots__`.
+    The position of every column in a row is only looked up once per query shape,
+    so building many objects from the same query is just indexing and a setattr per column.
+    Models compare and hash by their database ID."""
+
+    __slots__ = ()
+
+    _fields: Tuple[Field, ...] = ()
+    _mappings: Dict[Tuple[str, ...], Tuple[Tuple[str, Optional[int], Any, Any], ...]]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._mappings = dict()
+
+    def __init__(self, **kwargs):
+        for name, default, convert in self._fields:
+            if name in kwargs:
+                value = kwargs[name]
+                if convert is not None:
+                    value = convert(value)
+            else:
+                value = default
+            setattr(self, name, value)
+
+    @classmethod
+    def _mapping(cls, columns: Tuple[str, ...]):
+        mapping = cls._mappings.get(columns)
+        if mapping is None:
+            index = {column: i for i, column in enumerate(columns)}
+            mapping = cls._mappings[columns] = tuple(
+                (name, index.get(name), default, convert)
+                for name, default, convert in cls._fields
+            )
+        return mapping
+
+    @classmethod
+    def _build(cls, mapping, row: Sequence):
+        obj = cls.__new__(cls)
+        for name, i, default, convert in mapping:
+            if i is None:
+                value = default
+            else:
+                value = row[i]
+                if convert is not None:
+                    value = convert(value)
+            setattr(obj, name, value)
+        return obj
+
+    @classmethod
+    def from_record(cls, row: asyncpg.Record):
+        """Builds an object from a database row."""
+
+        return cls._build(cls._mapping(tuple(row.keys())), row)
+
+    @classmethod
+    def from_records(cls, rows: List[asyncpg.Record]) -> list:
+        """Builds objects from rows returned by the same query."""
+
+        if not rows:
+            return []
+
+        mapping = cls._mapping(tuple(rows[0].keys()))
+        return [cls._build(mapping, row) for row in rows]
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.id == other.id
+
+    def __hash__(self):
+        return hash((type(self), self.id))
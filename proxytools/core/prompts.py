@@ -0,0 +1,133 @@
+import asyncio
+import math
+from typing import Dict, Iterable, List, Optional, Set
+
+import hikari
+
+
+class _Waiter:
+    __slots__ = ("message_id", "user_id", "emojis", "future", "slot", "rounds")
+
+    message_id: hikari.Snowflake
+    user_id: hikari.Snowflake
+    emojis: frozenset
+    future: asyncio.Future
+    slot: Optional[int]
+    rounds: int
+
+    def __init__(
+        self,
+        message_id: hikari.Snowflake,
+        user_id: hikari.Snowflake,
+        emojis: Iterable[str],
+        future: asyncio.Future,
+    ):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.emojis = frozenset(emojis)
+        self.future = future
+        self.slot = None
+        self.rounds = 0
+
+
+class ReactionDispatcher:
+    """Waits for reactions on specific messages, such as the ones added by `Context.prompt`.
+
+    Pending waits are indexed by message ID, so dispatching a reaction only looks at the waits
+    for that message instead of running every pending check. Timeouts are kept in a single
+    timing wheel of `slots` slots, `resolution` seconds apart, so there's one timer for all of them
+    rather than one per wait. Waits are removed as soon as they finish, however they finish.
+    """
+
+    _waiters: Dict[hikari.Snowflake, List[_Waiter]]
+    _wheel: List[Set[_Waiter]]
+    _cursor: int = 0
+    _task: Optional[asyncio.Task] = None
+
+    resolution: float
+
+    def __init__(self, resolution: float = 1.0, slots: int = 64):
+        self._waiters = dict()
+        self._wheel = [set() for _ in range(slots)]
+        self.resolution = resolution
+
+    def wait(
+        self,
+        message_id: hikari.Snowflake,
+        user_id: hikari.Snowflake,
+        emojis: Iterable[str],
+        timeout: Optional[float] = None,
+    ) -> asyncio.Future:
+        """Returns a future for the first reaction `user_id` adds to `message_id` with one of `emojis`.
+        The future raises asyncio.TimeoutError after `timeout` seconds (give or take `resolution`).
+
+        The wait starts as soon as this is called, so it can be called before
+        adding reactions to the message and awaited after."""
+
+        future = asyncio.get_event_loop().create_future()
+        waiter = _Waiter(message_id, user_id, emojis, future)
+        self._waiters.setdefault(message_id, []).append(waiter)
+
+        if timeout is not None:
+            ticks = max(1, math.ceil(timeout / self.resolution))
+            waiter.slot = (self._cursor + ticks) % len(self._wheel)
+            waiter.rounds = (ticks - 1) // len(self._wheel)
+            self._wheel[waiter.slot].add(waiter)
+            if self._task is None:
+                self._task = asyncio.ensure_future(self._run())
+
+        future.add_done_callback(lambda _: self._remove(waiter))
+        return future
+
+    async def on_reaction(self, event: hikari.ReactionAddEvent):
+        waiters = self._waiters.get(event.message_id)
+        if waiters is None:
+            return
+
+        for waiter in waiters:
+            if (
+                waiter.user_id == event.user_id
+                and event.emoji_name in waiter.emojis
+                and not waiter.future.done()
+            ):
+                waiter.future.set_result(event)
+
+    def _remove(self, waiter: _Waiter):
+        waiters = self._waiters.get(waiter.message_id)
+        if waiters is not None:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiters[waiter.message_id]
+
+        if waiter.slot is not None:
+            self._wheel[waiter.slot].discard(waiter)
+            waiter.slot = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        ticked = 0
+
+        try:
+            while any(self._wheel):
+                await asyncio.sleep(self.resolution)
+
+                # catch up on any ticks missed while the loop was busy
+                due = int((loop.time() - start) / self.resolution)
+                while ticked < due:
+                    ticked += 1
+                    self._tick()
+        finally:
+            self._task = None
+
+    def _tick(self):
+        self._cursor = (self._cursor + 1) % len(self._wheel)
+        for waiter in list(self._wheel[self._cursor]):
+            if waiter.rounds > 0:
+                waiter.rounds -= 1
+            elif not waiter.future.done():
+                # removes the waiter through its done callback
+                waiter.future.set_exception(asyncio.TimeoutError())
+
+    def __len__(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
@@ -0,0 +1,218 @@
+import logging
+import time
+import typing
+from typing import Optional, Tuple
+
+import hikari
+
+from .attachments import AttachmentError, AttachmentRelay
+from .autoproxy import AutoproxyEngine
+from .cache import LRUCache
+from .db import Database
+from .enums import AutoproxyMode
+from .executor import (
+    QueueFullError,
+    WebhookExecuteError,
+    WebhookExecutor,
+    WebhookNotFoundError,
+)
+from .front import FrontIndex
+from .guild import GuildSettingsCache
+from .identity import IdentityResolver
+from .matcher import ProxyMatcher
+from .ratelimit import RateLimits
+from .member import Member
+from .messages import MessageLog, ProxiedMessage
+from .metrics import GATEWAY_LAG, PROXY_LATENCY, track_cache
+from .system import SystemCache
+from .webhook import WebhookCache
+
+if typing.TYPE_CHECKING:
+    from .bot import Proxytools
+
+
+class Proxier:
+    """Proxies messages sent with one of a member's proxy tags."""
+
+    _bot: "Proxytools"
+    _db: Database
+    _log: logging.Logger
+    _webhooks: WebhookCache
+    _executor: WebhookExecutor
+    _relay: AttachmentRelay
+    _messages: MessageLog
+    _systems: SystemCache
+    _autoproxy: AutoproxyEngine
+    _fronts: FrontIndex
+    _guilds: GuildSettingsCache
+    _identities: IdentityResolver
+    _limits: RateLimits
+    _prefixes: Tuple[str, ...]
+    _matchers: LRUCache[int, ProxyMatcher]
+
+    def __init__(
+        self, bot: "Proxytools", executor: WebhookExecutor, cache_size: int = 10000
+    ):
+        self._bot = bot
+        self._db = bot.db
+        # its own logger, so the proxy path's debug logging can be sampled separately
+        self._log = bot.log.getChild("proxy")
+        self._webhooks = bot.webhooks
+        self._executor = executor
+        self._relay = bot.attachments
+        self._messages = bot.messages
+        self._systems = bot.systems
+        self._autoproxy = bot.autoproxy
+        self._fronts = bot.fronts
+        self._guilds = bot.guilds
+        self._identities = bot.identities
+        self._limits = bot.proxy_limits
+        self._prefixes = bot.prefixes
+        self._matchers = LRUCache(cache_size)
+        track_cache("matchers", self._matchers)
+
+    async def on_message(self, event: hikari.GuildMessageCreateEvent):
+        if not event.is_human or not (event.content or event.message.attachments):
+            return
+        # commands are left to the command handler, even with autoproxy on
+        if event.content and event.content.startswith(self._prefixes):
+            return
+
+        start = time.perf_counter()
+        GATEWAY_LAG.observe(time.time() - event.message_id.created_at.timestamp())
+
+        settings = await self._guilds.get(event.guild_id)
+        if settings.is_blacklisted(event.channel_id):
+            return
+
+        system = await self._systems.fetch(self._db, event.author_id)
+        if system is None:
+            return
+
+        state = await self._autoproxy.get(system.id, event.guild_id)
+        if not state.proxy_enabled:
+            return
+
+        matcher = await self.matcher(system.id)
+        member, content = matcher.match(event.content or "")
+        if member is None:
+            front = ()
+            if state.mode is AutoproxyMode.FRONT:
+                front = (await self._fronts.get(system.id)).members
+            member = matcher.member(self._autoproxy.resolve(state, front))
+            content = event.content or ""
+        if member is None or not (content or event.message.attachments):
+            return
+
+        # only messages that would be proxied are counted, and limited ones are left as they are
+        retry_after, _ = self._limits.acquire(
+            event.author_id, event.channel_id, event.guild_id
+        )
+        if retry_after > 0:
+            self._log.debug(
+                "Not proxying message %s, rate limited for %.1fs",
+                event.message_id,
+                retry_after,
+            )
+            return
+
+        if await self.proxy(event.message, member, content) is not None:
+            elapsed = time.perf_counter() - start
+            PROXY_LATENCY.observe(elapsed)
+            self._autoproxy.proxied(state, member.id)
+            self._log.debug(
+                "Proxied message %s as member %s in %.1fms",
+                event.message_id,
+                member.id,
+                elapsed * 1000,
+            )
+
+    async def matcher(self, system: int) -> ProxyMatcher:
+        """Returns the proxy matcher for the given system, building it if it isn't cached."""
+
+        matcher = self._matchers.get(system)
+        if matcher is None:
+            members = await Member.fetch_for_system(self._db, system)
+            matcher = self._matchers[system] = ProxyMatcher(members)
+        return matcher
+
+    def invalidate(self, system: int):
+        """Drops the cached proxy matcher for the given system."""
+
+        self._matchers.pop(system)
+
+    def clear(self):
+        self._matchers.clear()
+
+    async def proxy(
+        self, message: hikari.Message, member: Member, content: str
+    ) -> Optional[hikari.Message]:
+        """Sends `content` and the message's attachments as `member` in the message's channel,
+        and deletes the original message. Messages with attachments that are too large
+        for the guild's upload limit are left alone, so nothing is lost."""
+
+        attachments = ()
+        if message.attachments:
+            attachments, skipped = self._relay.select(
+                message.attachments,
+                self._relay.upload_limit(self._bot.cache.get_guild(message.guild_id)),
+            )
+            if skipped:
+                self._log.debug(
+                    "Not proxying message %s, %d attachment(s) are too large",
+                    message.id,
+                    len(skipped),
+                )
+                return None
+
+        identity = await self._identities.get(
+            member.system, member.id, message.guild_id
+        )
+        if identity is None:
+            # the member was deleted since the matcher was built
+            return None
+
+        for _ in range(2):
+            webhook = await self._webhooks.get_for_channel(message.channel_id)
+            try:
+                sent = await self._executor.execute(
+                    webhook,
+                    content,
+                    username=identity.username,
+                    avatar_url=identity.avatar_url,
+                    attachments=attachments,
+                )
+                break
+            except WebhookNotFoundError:
+                # the webhook was deleted since it was cached, so get a new one
+                await self._webhooks.delete(message.channel_id, webhook.webhook_id)
+            except AttachmentError as e:
+                self._log.warning("Couldn't relay attachments of %s: %s", message.id, e)
+                return None
+            except QueueFullError as e:
+                # the original is left as it is, so nothing is lost
+                self._log.warning("Not proxying message %s: %s", message.id, e)
+                return None
+            except WebhookExecuteError as e:
+                self._log.error("Couldn't proxy message %s: %s", message.id, e)
+                return None
+        else:
+            self._log.error("Couldn't get a webhook for channel %s", message.channel_id)
+            return None
+
+        self._messages.add(
+            ProxiedMessage(
+                mid=sent.id,
+                channel=message.channel_id,
+                member=member.id,
+                sender=message.author.id,
+                original_mid=message.id,
+            )
+        )
+
+        try:
+            await message.delete()
+        except hikari.NotFoundError:
+            pass
+
+        return sent
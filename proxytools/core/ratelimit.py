@@ -0,0 +1,238 @@
+import asyncio
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import lightbulb
+
+from .error import UserError
+from .metrics import Counter, register_metric
+
+RATELIMITED = register_metric(
+    Counter(
+        "proxytools_ratelimited_total",
+        "Commands and proxied messages rejected by rate limits, by what was limited and the scope that limited it.",
+        ("kind", "scope"),
+    )
+)
+
+
+class RateLimitedError(UserError, lightbulb.errors.CheckFailure):
+    """A user ran commands too fast. `notify` is False if they were already told so
+    since the limit was hit, so flooding commands doesn't also flood replies."""
+
+    retry_after: float
+    notify: bool
+
+    def __init__(self, retry_after: float, notify: bool = True):
+        super().__init__(
+            f"You're doing that too fast, try again in {max(retry_after, 1):.0f} second(s)."
+        )
+        self.retry_after = retry_after
+        self.notify = notify
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "notified")
+
+    tokens: float
+    updated: float
+    notified: bool
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.notified = False
+
+
+class RateLimiter:
+    """A token bucket per key, allowing `limit` uses every `period` seconds with bursts of up to `limit`.
+
+    Buckets only store their token count and when it was last updated, and are refilled lazily
+    when they're used, so there's no per-key timer. Buckets that would be full again are removed by `sweep`.
+    """
+
+    _buckets: Dict[Hashable, _Bucket]
+
+    limit: int
+    period: float
+    rate: float
+
+    def __init__(self, limit: int, period: float):
+        if limit <= 0 or period <= 0:
+            raise ValueError("limit and period must be positive")
+
+        self._buckets = dict()
+        self.limit = limit
+        self.period = period
+        self.rate = limit / period
+
+    @classmethod
+    def parse(cls, value: Optional[str]) -> Optional["RateLimiter"]:
+        """Parses a limit written as `uses/seconds`, such as `5/10`. Returns None if `value` is empty."""
+
+        if not value or not value.strip():
+            return None
+        limit, period = value.split("/", 1)
+        return cls(int(limit), float(period))
+
+    def _bucket(self, key: Hashable, now: float) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(self.limit, now)
+        else:
+            bucket.tokens = min(
+                self.limit, bucket.tokens + (now - bucket.updated) * self.rate
+            )
+            bucket.updated = now
+        return bucket
+
+    def retry_after(self, bucket: _Bucket, cost: float) -> float:
+        """Returns how long until the bucket has `cost` tokens, or 0 if it already does."""
+
+        # costs above the limit are treated as the whole bucket, so they can still succeed
+        cost = min(cost, self.limit)
+        if bucket.tokens >= cost:
+            return 0.0
+        return (cost - bucket.tokens) / self.rate
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Removes buckets that would be full by now, as they're the same as new ones.
+        Returns the number of buckets removed."""
+
+        now = time.monotonic() if now is None else now
+        idle = [
+            key
+            for key, bucket in self._buckets.items()
+            if bucket.tokens + (now - bucket.updated) * self.rate >= self.limit
+        ]
+        for key in idle:
+            del self._buckets[key]
+        return len(idle)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimits:
+    """Rate limits for one kind of action, per user, per channel and per guild.
+    Any of them can be left out. An action is only allowed, and only counted, if every scope allows it.
+    """
+
+    _task: Optional[asyncio.Task] = None
+
+    kind: str
+    user: Optional[RateLimiter]
+    channel: Optional[RateLimiter]
+    guild: Optional[RateLimiter]
+    sweep_interval: float
+
+    def __init__(
+        self,
+        kind: str,
+        user: Optional[RateLimiter] = None,
+        channel: Optional[RateLimiter] = None,
+        guild: Optional[RateLimiter] = None,
+        sweep_interval: float = 60,
+    ):
+        self.kind = kind
+        self.user = user
+        self.channel = channel
+        self.guild = guild
+        self.sweep_interval = sweep_interval
+
+    def acquire(
+        self,
+        user: Optional[int],
+        channel: Optional[int],
+        guild: Optional[int] = None,
+        cost: float = 1,
+    ) -> Tuple[float, bool]:
+        """Uses `cost` tokens from each scope's bucket if they all have enough.
+        Returns 0 and False if the action is allowed. Otherwise returns how long until it would be,
+        and whether this is the first time it was refused since the limit was hit."""
+
+        now = time.monotonic()
+        scopes: List[Tuple[str, RateLimiter, _Bucket]] = [
+            (scope, limiter, limiter._bucket(key, now))
+            for scope, limiter, key in (
+                ("user", self.user, user),
+                ("channel", self.channel, channel),
+                ("guild", self.guild, guild),
+            )
+            if limiter is not None and key is not None
+        ]
+
+        wait, limited_by, notify = 0.0, None, False
+        for scope, limiter, bucket in scopes:
+            retry_after = limiter.retry_after(bucket, cost)
+            if retry_after > 0:
+                if retry_after > wait:
+                    wait, limited_by = retry_after, scope
+                notify = notify or not bucket.notified
+                bucket.notified = True
+
+        if limited_by is not None:
+            RATELIMITED.inc(self.kind, limited_by)
+            return wait, notify
+
+        for _, limiter, bucket in scopes:
+            bucket.tokens -= min(cost, limiter.limit)
+            bucket.notified = False
+        return 0.0, False
+
+    def check(
+        self,
+        user: Optional[int],
+        channel: Optional[int],
+        guild: Optional[int] = None,
+        cost: float = 1,
+    ):
+        """Like `acquire`, but raises RateLimitedError if the action isn't allowed."""
+
+        retry_after, notify = self.acquire(user, channel, guild, cost)
+        if retry_after > 0:
+            raise RateLimitedError(retry_after, notify)
+
+    def start(self):
+        """Starts removing idle buckets in the background."""
+
+        if self._task is None and any((self.user, self.channel, self.guild)):
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        return sum(
+            limiter.sweep(now)
+            for limiter in (self.user, self.channel, self.guild)
+            if limiter is not None
+        )
+
+    def __len__(self) -> int:
+        return sum(
+            len(limiter)
+            for limiter in (self.user, self.channel, self.guild)
+            if limiter is not None
+        )
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+async def check_ratelimit(ctx: lightbulb.Context) -> bool:
+    """Counts a command against the bot's command rate limits, raising RateLimitedError if it's over them.
+    Commands cost 1, or what they were given with `core.ratelimit_cost`."""
+
+    ctx.bot.command_limits.check(
+        ctx.author.id,
+        ctx.channel_id,
+        ctx.guild_id,
+        getattr(ctx.command, "ratelimit_cost", 1),
+    )
+    return True
@@ -1,3 +1,10 @@
 drop function if exists generate_hid;
 drop function if exists find_free_system_hid;
-drop function if exists find_free_member_hid;
\ No newline at end of file
+drop function if exists find_free_member_hid;
+drop function if exists refill_system_hids;
+drop function if exists refill_member_hids;
+drop function if exists claim_member_hids;
+drop function if exists drop_message_partitions;
+drop function if exists create_message_partitions;
+drop function if exists message_partitions;
+drop function if exists message_snowflake;
\ No newline at end of file
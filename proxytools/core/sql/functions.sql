@@ -3,9 +3,19 @@ create function generate_hid() returns char(5) as $$
 $$ language sql volatile;
 
 
+-- Claims an ID from the pool of free system IDs, falling back to searching for one if the pool is empty.
 create function find_free_system_hid() returns char(5) as $$
 declare new_hid char(5);
 begin
+    loop
+        delete from free_system_hids
+            where hid = (select hid from free_system_hids limit 1 for update skip locked)
+            returning hid into new_hid;
+        exit when new_hid is null;
+        -- IDs can be taken by the fallback below after being added to the pool
+        if not exists (select 1 from systems where hid = new_hid) then return new_hid; end if;
+    end loop;
+
     loop
         new_hid := generate_hid();
         if not exists (select 1 from systems where hid = new_hid) then return new_hid; end if;
@@ -14,12 +24,162 @@ end
 $$ language plpgsql volatile;
 
 
+-- Claims an ID from the pool of free member IDs, falling back to searching for one if the pool is empty.
 create function find_free_member_hid() returns char(5) as $$
 declare new_hid char(5);
 begin
+    loop
+        delete from free_member_hids
+            where hid = (select hid from free_member_hids limit 1 for update skip locked)
+            returning hid into new_hid;
+        exit when new_hid is null;
+        if not exists (select 1 from members where hid = new_hid) then return new_hid; end if;
+    end loop;
+
     loop
         new_hid := generate_hid();
         if not exists (select 1 from members where hid = new_hid) then return new_hid; end if;
     end loop;
 end
 $$ language plpgsql volatile;
+
+
+-- Tops up the pool of free system IDs to `target` IDs. Returns the number of IDs added.
+create function refill_system_hids(target int) returns int as $$
+declare
+    missing int;
+    added   int;
+    total   int := 0;
+begin
+    -- each round only keeps candidates that are still free, so more rounds are needed as the ID space fills up
+    for round in 1..20 loop
+        missing := target - (select count(*) from free_system_hids);
+        exit when missing <= 0;
+
+        insert into free_system_hids (hid)
+            select distinct candidate from (select generate_hid() as candidate from generate_series(1, missing * 4)) c
+            where not exists (select 1 from systems where hid = candidate)
+            limit missing
+            on conflict do nothing;
+
+        get diagnostics added = row_count;
+        total := total + added;
+    end loop;
+    return total;
+end
+$$ language plpgsql volatile;
+
+
+-- Tops up the pool of free member IDs to `target` IDs. Returns the number of IDs added.
+create function refill_member_hids(target int) returns int as $$
+declare
+    missing int;
+    added   int;
+    total   int := 0;
+begin
+    for round in 1..20 loop
+        missing := target - (select count(*) from free_member_hids);
+        exit when missing <= 0;
+
+        insert into free_member_hids (hid)
+            select distinct candidate from (select generate_hid() as candidate from generate_series(1, missing * 4)) c
+            where not exists (select 1 from members where hid = candidate)
+            limit missing
+            on conflict do nothing;
+
+        get diagnostics added = row_count;
+        total := total + added;
+    end loop;
+    return total;
+end
+$$ language plpgsql volatile;
+
+
+-- Claims up to `n` IDs from the pool of free member IDs at once, topping the pool up first.
+-- Returns fewer than `n` IDs if some of them were taken in the meantime.
+create function claim_member_hids(n int) returns setof char(5) as $$
+begin
+    perform refill_member_hids(n);
+    return query
+        with claimed as (
+            delete from free_member_hids
+                where hid in (select hid from free_member_hids limit n for update skip locked)
+                returning hid
+        )
+        select claimed.hid from claimed where not exists (select 1 from members where members.hid = claimed.hid);
+end
+$$ language plpgsql volatile;
+
+
+-- The lowest message ID (snowflake) that can be created at the given time.
+create function message_snowflake(ts timestamptz) returns bigint as $$
+    select ((extract(epoch from ts) * 1000)::bigint - 1420070400000) << 22;
+$$ language sql immutable;
+
+
+-- The partitions of the messages table and the message IDs they hold, not including the default partition.
+-- A null lower bound means the partition holds every message before its upper bound.
+create function message_partitions() returns table (name text, lower_bound bigint, upper_bound bigint) as $$
+    select c.relname::text,
+        nullif(substring(pg_get_expr(c.relpartbound, c.oid) from 'FROM \(''?([0-9]+|MINVALUE)''?\)'), 'MINVALUE')::bigint,
+        substring(pg_get_expr(c.relpartbound, c.oid) from 'TO \(''?([0-9]+)''?\)')::bigint
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    where i.inhparent = 'messages'::regclass
+    and pg_get_expr(c.relpartbound, c.oid) <> 'DEFAULT'
+    order by 3;
+$$ language sql stable;
+
+
+-- Creates monthly partitions for messages for this month and the next `months` months, if they don't exist yet.
+-- Messages that ended up in the default partition are moved into the new partitions.
+-- Returns the number of partitions created.
+create function create_message_partitions(months int) returns int as $$
+declare
+    start timestamptz;
+    lo bigint;
+    hi bigint;
+    partition text;
+    created int := 0;
+begin
+    for i in 0..months loop
+        start := date_trunc('month', now()) + make_interval(months => i);
+        lo := message_snowflake(start);
+        hi := message_snowflake(start + interval '1 month');
+
+        -- already covered, such as by the legacy partition
+        continue when exists (
+            select 1 from message_partitions() p where coalesce(p.lower_bound, 0) < hi and p.upper_bound > lo
+        );
+
+        partition := 'messages_p' || to_char(start, 'YYYYMM');
+        if exists (select 1 from messages_default where mid >= lo and mid < hi) then
+            execute format('create table %I (like messages including defaults)', partition);
+            execute format('insert into %I select * from messages_default where mid >= $1 and mid < $2', partition)
+                using lo, hi;
+            delete from messages_default where mid >= lo and mid < hi;
+            execute format('alter table messages attach partition %I for values from (%s) to (%s)', partition, lo, hi);
+        else
+            execute format('create table %I partition of messages for values from (%s) to (%s)', partition, lo, hi);
+        end if;
+        created := created + 1;
+    end loop;
+    return created;
+end
+$$ language plpgsql volatile;
+
+
+-- Drops the partitions of messages that only hold messages sent before the given time.
+-- Dropping a partition is much cheaper than deleting its rows. Returns the names of the dropped partitions.
+create function drop_message_partitions(before timestamptz) returns setof text as $$
+declare
+    partition text;
+begin
+    for partition in
+        select name from message_partitions() where upper_bound <= message_snowflake(before)
+    loop
+        execute format('drop table %I', partition);
+        return next partition;
+    end loop;
+end
+$$ language plpgsql volatile;
@@ -0,0 +1,10 @@
+-- Proxy webhooks, so they don't need to be fetched or created again after a restart
+
+create table webhooks
+(
+    channel bigint primary key,
+    webhook bigint not null,
+    token   text   not null
+);
+
+update info set schema_version = 2;
@@ -0,0 +1,6 @@
+-- Indexes for looking up a system's accounts and members
+
+create index accounts_system_idx on accounts (system);
+create index members_system_idx on members (system);
+
+update info set schema_version = 3;
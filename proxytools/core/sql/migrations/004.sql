@@ -0,0 +1,14 @@
+-- Pools of unused IDs, refilled in the background,
+-- so creating a system or member doesn't have to search for a free ID
+
+create table free_system_hids
+(
+    hid char(5) primary key
+);
+
+create table free_member_hids
+(
+    hid char(5) primary key
+);
+
+update info set schema_version = 4;
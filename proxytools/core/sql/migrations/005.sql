@@ -0,0 +1,6 @@
+-- Indexes for looking up a system's latest switch and the members in it
+
+create index switches_system_timestamp_idx on switches (system, timestamp desc);
+create index switch_members_switch_idx on switch_members (switch);
+
+update info set schema_version = 5;
@@ -0,0 +1,16 @@
+-- The first step of partitioning the messages table (see 008.sql).
+-- Every existing message will become part of one legacy partition, up to the start of next month.
+-- Attaching it has to prove no row is outside that bound, so the bound is added as a constraint here,
+-- without checking existing rows, and validated in 007.sql. Each migration runs in its own transaction,
+-- so the table is only locked long enough to add the constraint, and validating it doesn't block writes.
+
+do $$
+declare
+    bound bigint := ((extract(epoch from date_trunc('month', now()) + interval '1 month') * 1000)::bigint
+        - 1420070400000) << 22;
+begin
+    execute format('alter table messages add constraint messages_legacy_bound check (mid < %s) not valid', bound);
+end
+$$;
+
+update info set schema_version = 6;
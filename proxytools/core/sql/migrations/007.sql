@@ -0,0 +1,14 @@
+-- Prepares the existing messages for partitioning in 008.sql, so it only has to hold its lock briefly.
+
+-- Checks them against the legacy partition's bound (see 006.sql). This scans the whole table,
+-- but only takes a lock that lets reads and writes go on.
+alter table messages validate constraint messages_legacy_bound;
+
+-- Builds the legacy partition's indexes, which 008.sql then attaches instead of building them.
+-- This blocks writes while it runs, but not reads.
+create index messages_legacy_original_mid_idx on messages (original_mid);
+create index messages_legacy_sender_mid_idx on messages (sender, mid);
+create index messages_legacy_channel_mid_idx on messages (channel, mid);
+create index messages_legacy_member_idx on messages (member);
+
+update info set schema_version = 7;
@@ -0,0 +1,45 @@
+-- Partition messages by month, using the creation time in message IDs (snowflakes),
+-- so old messages can be dropped a whole partition at a time,
+-- and index the columns messages are looked up by.
+
+alter table messages rename to messages_legacy;
+alter index messages_pkey rename to messages_legacy_pkey;
+alter table messages_legacy alter column member drop default;
+drop sequence if exists messages_member_seq;
+
+create table messages
+(
+    mid          bigint not null,
+    channel      bigint not null,
+    member       int    not null references members (id) on delete cascade,
+    sender       bigint not null,
+    original_mid bigint,
+    primary key (mid)
+) partition by range (mid);
+
+-- Every existing message becomes part of one legacy partition, without copying any rows.
+-- Its bound was validated in 007.sql, so attaching it doesn't have to scan it while holding a lock.
+-- Its indexes were also built there, so the indexes below attach them instead.
+-- New partitions (see create_message_partitions) start from there.
+do $$
+declare
+    bound bigint;
+begin
+    select (regexp_match(pg_get_constraintdef(oid), '\d+'))[1]::bigint into bound
+    from pg_constraint where conrelid = 'messages_legacy'::regclass and conname = 'messages_legacy_bound';
+
+    execute format('alter table messages attach partition messages_legacy for values from (minvalue) to (%s)', bound);
+    alter table messages_legacy drop constraint messages_legacy_bound;
+end
+$$;
+
+-- catches messages if partitions weren't created in time, instead of failing to log them
+create table messages_default partition of messages default;
+
+create index messages_original_mid_idx on messages (original_mid);
+create index messages_sender_idx on messages (sender, mid);
+create index messages_channel_idx on messages (channel, mid);
+-- so deleting a member doesn't scan every partition for its messages
+create index messages_member_idx on messages (member);
+
+update info set schema_version = 8;
@@ -0,0 +1,100 @@
+from typing import Dict
+
+
+class Statement:
+    """A named SQL statement.
+
+    Statements are run through each connection's statement cache, which is sized to
+    always hold every registered statement, so they're prepared once per pooled connection
+    the first time they're used. (asyncpg invalidates PreparedStatement objects
+    when their connection goes back to the pool, so they can't be held on to directly.)
+    """
+
+    __slots__ = ("name", "sql")
+
+    name: str
+    sql: str
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+
+    def __repr__(self):
+        return f"Statement({self.name})"
+
+
+registry: Dict[str, Statement] = dict()
+
+
+def statement(name: str, sql: str) -> Statement:
+    """Registers a named statement."""
+
+    if name in registry:
+        raise ValueError(f"Statement {name} is already registered")
+
+    stmt = registry[name] = Statement(name, sql)
+    return stmt
+
+
+SYSTEM_BY_ACCOUNT = statement(
+    "system_by_account",
+    """select systems.*,
+    array_agg(linked.uid order by linked.uid) as accounts,
+    (select count(*) from members where members.system = systems.id) as member_count
+    from accounts
+    join systems on systems.id = accounts.system
+    join accounts linked on linked.system = systems.id
+    where accounts.uid = $1
+    group by systems.id""",
+)
+
+ACCOUNT_HAS_SYSTEM = statement(
+    "account_has_system",
+    "select exists(select * from accounts where uid = $1)",
+)
+
+MEMBERS_BY_SYSTEM = statement(
+    "members_by_system",
+    "select * from members where system = $1",
+)
+
+# a proxied message is always sent shortly after its original, so the search by original_mid
+# is limited to the hour after it, which only touches the partitions covering that hour
+MESSAGE_BY_ID = statement(
+    "message_by_id",
+    """(select * from messages where mid = $1)
+    union all
+    (select * from messages where original_mid = $1 and mid > $1 and mid < $1 + (3600000::bigint << 22))
+    limit 1""",
+)
+
+MEMBER_IDENTITIES = statement(
+    "member_identities",
+    """select members.id,
+    coalesce(member_guild.display_name, members.display_name, members.name) as name,
+    coalesce(members.avatar_url, systems.avatar_url) as avatar_url,
+    systems.tag
+    from members
+    join systems on systems.id = members.system
+    left join member_guild on member_guild.member = members.id and member_guild.guild = $2
+    where members.system = $1""",
+)
+
+AUTOPROXY_STATE = statement(
+    "autoproxy_state",
+    """select proxy_enabled, autoproxy_mode, autoproxy_member
+    from systems_guild where system = $1 and guild = $2""",
+)
+
+CURRENT_FRONT = statement(
+    "current_front",
+    """select id, timestamp,
+    array(select member from switch_members where switch = switches.id order by id) as members
+    from switches where system = $1
+    order by timestamp desc limit 1""",
+)
+
+WEBHOOK_BY_CHANNEL = statement(
+    "webhook_by_channel",
+    "select webhook, token from webhooks where channel = $1",
+)
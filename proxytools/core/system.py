@@ -1,16 +1,53 @@
-from typing import Optional, List
+from typing import Dict, Optional, List, Sequence
+import asyncio
 import datetime
+import typing
 
 import asyncpg
 import hikari
 
+from .cache import TTLCache
 from .enums import *
-from .bot import Context
+from .db import Database
+from .metrics import track_cache
+from .model import Model
+from .statements import ACCOUNT_HAS_SYSTEM, SYSTEM_BY_ACCOUNT
 
+if typing.TYPE_CHECKING:
+    from .bot import Context
 
-class System:
+
+class System(Model):
     """A system object from the database."""
 
+    __slots__ = (
+        "id",
+        "hid",
+        "name",
+        "description",
+        "tag",
+        "avatar_url",
+        "created",
+        "description_privacy",
+        "list_privacy",
+        "accounts",
+        "member_count",
+    )
+
+    _fields = (
+        ("id", None, None),
+        ("hid", None, None),
+        ("name", None, None),
+        ("description", None, None),
+        ("tag", None, None),
+        ("avatar_url", None, None),
+        ("created", None, None),
+        ("description_privacy", None, Privacy.get),
+        ("list_privacy", None, Privacy.get),
+        ("accounts", (), None),
+        ("member_count", None, None),
+    )
+
     id: int
     hid: str
     name: Optional[str]
@@ -23,24 +60,9 @@ class System:
     list_privacy: Privacy
 
     # Additional info that may not be present
-    accounts: Optional[List[hikari.Snowflake]]
+    accounts: Sequence[hikari.Snowflake]
     member_count: Optional[int]
 
-    def __init__(self, **kwargs):
-        self.id = kwargs.get("id")
-        self.hid = kwargs.get("hid")
-        self.name = kwargs.get("name", None)
-        self.description = kwargs.get("description", None)
-        self.tag = kwargs.get("tag", None)
-        self.avatar_url = kwargs.get("avatar_url", None)
-        self.created = kwargs.get("created")
-
-        self.description_privacy = Privacy.get(kwargs.get("description_privacy"))
-        self.list_privacy = Privacy.get(kwargs.get("list_privacy"))
-
-        self.accounts = kwargs.get("accounts", [])
-        self.member_count = kwargs.get("member_count", None)
-
     @property
     def public_description(self) -> Optional[str]:
         """Description if the system's description is public, None otherwise."""
@@ -49,8 +71,11 @@ class System:
             return self.description
         return None
 
-    async def embed(self, ctx: Context) -> hikari.Embed:
-        """Returns a embed containing system information."""
+    async def embed(
+        self, ctx: "Context", *, resolve_accounts: bool = True
+    ) -> hikari.Embed:
+        """Returns a embed containing system information.
+        If `resolve_accounts` is False, linked accounts are only shown as mentions, so no users are fetched."""
 
         embed = hikari.Embed()
         if self.name is not None:
@@ -60,18 +85,23 @@ class System:
             embed.add_field("Tag", self.tag, inline=True)
 
         if len(self.accounts) > 0:
-            accounts: List[hikari.User] = []
+            if resolve_accounts:
+                users = await ctx.bot.users.fetch_many(self.accounts)
+            else:
+                users = {}
+
+            accounts: List[str] = []
             for id in self.accounts:
-                account = ctx.bot.cache.get_user(id)
-                if account is None:
-                    account = await ctx.bot.rest.fetch_user(id)
-                accounts.append(account)
+                u = users.get(id)
+                accounts.append(
+                    f"{u.username}#{u.discriminator} ({u.mention})"
+                    if u is not None
+                    else f"<@{id}>"
+                )
 
             embed.add_field(
-                f"Linked account{'s' if len(accounts) > 0 else ''}",
-                "\n".join(
-                    [f"{u.username}#{u.discriminator} ({u.mention})" for u in accounts]
-                ),
+                f"Linked account{'s' if len(accounts) > 1 else ''}",
+                "\n".join(accounts),
                 inline=False,
             )
 
@@ -109,49 +139,105 @@ class System:
 
     @staticmethod
     async def fetch_from_user(
-        conn: asyncpg.Connection, user_id: hikari.Snowflake
+        db: Database, user_id: hikari.Snowflake
     ) -> Optional["System"]:
         """Fetches a system from a user ID."""
 
-        sql = """select systems.*,
-        array(select uid from accounts where system = (select system from accounts where uid = $1)) as accounts,
-        (select count(*) from members where system = (select system from accounts where uid = $1)) as member_count
-        from systems where id = (select system from accounts where uid = $1)"""
+        row = await db.fetchrow(SYSTEM_BY_ACCOUNT, user_id)
 
-        row = await conn.fetchrow(sql, user_id)
-
-        return System(**row) if row else None
+        return System.from_record(row) if row else None
 
     @staticmethod
-    async def fetch_from_hid(conn: asyncpg.Connection, hid: str):
+    async def fetch_from_hid(db: Database, hid: str):
         """Fetches a system from an ID."""
 
         pass
 
     @staticmethod
-    async def has_system(conn: asyncpg.Connection, user_id: hikari.Snowflake) -> bool:
+    async def has_system(db: Database, user_id: hikari.Snowflake) -> bool:
         """Returns true if the user has a system."""
 
-        val: bool = await conn.fetchval(
-            "select exists(select * from accounts where uid = $1)", user_id
-        )
+        val: bool = await db.fetchval(ACCOUNT_HAS_SYSTEM, user_id)
         return val
 
     @staticmethod
     async def create_system(
-        conn: asyncpg.Connection, user_id: hikari.Snowflake, name: Optional[str] = None
+        db: Database, user_id: hikari.Snowflake, name: Optional[str] = None
     ) -> "System":
         """Creates a system."""
 
-        async with conn.transaction():
+        async with db.transaction() as conn:
             row = await conn.fetchrow(
                 "insert into systems (hid, name) values (find_free_system_hid(), $1) returning *",
                 name,
             )
-            sys = System(**row)
+            sys = System.from_record(row)
 
             await conn.execute(
                 "insert into accounts (system, uid) values ($1, $2)", sys.id, user_id
             )
 
             return sys
+
+
+_MISSING = object()
+
+
+class SystemCache:
+    """A cache of systems by account ID, so commands don't have to fetch the same system repeatedly.
+    Accounts without a system are cached too."""
+
+    _cache: TTLCache[hikari.Snowflake, Optional[System]]
+    _pending: Dict[hikari.Snowflake, asyncio.Future]
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        self._cache = TTLCache(maxsize, ttl)
+        self._pending = dict()
+        track_cache("systems", self._cache)
+
+    async def fetch(self, db: Database, user_id: hikari.Snowflake) -> Optional[System]:
+        """Returns the system for the given account, fetching it if it isn't cached.
+        Concurrent misses for the same account share one query."""
+
+        sys = self._cache.get(user_id, _MISSING)
+        if sys is _MISSING:
+            fut = self._pending.get(user_id)
+            if fut is None:
+                fut = asyncio.ensure_future(System.fetch_from_user(db, user_id))
+                self._pending[user_id] = fut
+                fut.add_done_callback(lambda f: self._done(user_id, f))
+
+            # shielded so one waiter being cancelled doesn't cancel the fetch for everyone else
+            sys = await asyncio.shield(fut)
+        return sys
+
+    def _done(self, user_id: hikari.Snowflake, fut: asyncio.Future):
+        # a fetch that was invalidated while running may have read a stale system, so it isn't cached
+        if self._pending.get(user_id) is not fut:
+            return
+
+        del self._pending[user_id]
+        if not fut.cancelled() and fut.exception() is None:
+            self._cache[user_id] = fut.result()
+
+    def invalidate(self, *user_ids: hikari.Snowflake):
+        """Drops the given accounts from the cache. Must be called after a system is changed."""
+
+        for id in user_ids:
+            self._cache.pop(id)
+            self._pending.pop(id, None)
+
+    def clear(self):
+        self._cache.clear()
+        self._pending.clear()
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    def __len__(self) -> int:
+        return len(self._cache)
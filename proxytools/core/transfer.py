@@ -0,0 +1,573 @@
+import codecs
+import datetime
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional
+
+import asyncpg
+import hikari
+
+from .db import Database
+from .error import UserError
+from .limits import Limits
+
+EXPORT_VERSION = 1
+
+# rows fetched from the cursor, and rows copied per chunk when importing
+CHUNK_ROWS = 1000
+# bytes of JSON buffered before being yielded when exporting
+CHUNK_SIZE = 64 * 1024
+# the most characters a single member, switch or system field may take up when importing
+MAX_VALUE_SIZE = 256 * 1024
+
+
+class TransferError(UserError):
+    """An import file couldn't be read."""
+
+    def __init__(self, msg: str):
+        super().__init__(f"Couldn't import: {msg}")
+
+
+def _timestamp(dt: Optional[datetime.datetime]) -> Optional[str]:
+    return dt.isoformat() if dt is not None else None
+
+
+_COLOUR = re.compile(r"#?([0-9a-fA-F]{6})")
+
+
+def _string(what: str, value, limit: Optional[int] = None) -> Optional[str]:
+    """Checks that an imported value is a string of at most `limit` characters, or null."""
+
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise TransferError(f"{what} must be a string")
+    if limit is not None and len(value) > limit:
+        raise TransferError(f"{what} is longer than {limit} characters")
+    return value
+
+
+def _parse_timestamp(s: Optional[str]) -> Optional[datetime.datetime]:
+    if s is None:
+        return None
+    if not isinstance(s, str):
+        raise TransferError(f"invalid timestamp {s!r}")
+    try:
+        # fromisoformat doesn't accept a Z suffix before Python 3.11
+        dt = datetime.datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        raise TransferError(f"invalid timestamp {s!r}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt
+
+
+def _privacy(value: Optional[str]) -> str:
+    return "PRIVATE" if value is not None and value.lower() == "private" else "PUBLIC"
+
+
+class _JSONWriter:
+    """Writes JSON incrementally, yielding it in chunks of about CHUNK_SIZE bytes."""
+
+    _parts: List[str]
+    _size: int = 0
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, s: str):
+        """Adds `s` to the buffer. It has to be flushed once it's `full`."""
+
+        self._parts.append(s)
+        self._size += len(s)
+
+    @property
+    def full(self) -> bool:
+        return self._size >= CHUNK_SIZE
+
+    def flush(self) -> bytes:
+        data = "".join(self._parts).encode()
+        self._parts.clear()
+        self._size = 0
+        return data
+
+
+async def export_system(db: Database, system: int) -> AsyncIterator[bytes]:
+    """Exports a system as PluralKit-compatible JSON.
+
+    Members and switches are streamed from the database with a cursor,
+    so only about CHUNK_SIZE bytes of the export are held in memory at once."""
+
+    writer = _JSONWriter()
+
+    async with db.transaction() as conn:
+        # a repeatable read snapshot, so members added during the export don't break switches
+        await conn.execute("set transaction isolation level repeatable read")
+
+        row = await conn.fetchrow("select * from systems where id = $1", system)
+        if row is None:
+            raise UserError("System not found.")
+
+        accounts = await conn.fetch(
+            "select uid from accounts where system = $1 order by uid", system
+        )
+
+        header = {
+            "version": EXPORT_VERSION,
+            "id": row["hid"],
+            "name": row["name"],
+            "description": row["description"],
+            "tag": row["tag"],
+            "avatar_url": row["avatar_url"],
+            "created": _timestamp(row["created"]),
+            "description_privacy": row["description_privacy"].lower(),
+            "member_list_privacy": row["list_privacy"].lower(),
+            "accounts": [a["uid"] for a in accounts],
+        }
+        writer.write(json.dumps(header)[:-1])
+        writer.write(', "members": [')
+        if writer.full:
+            yield writer.flush()
+
+        first = True
+        async for m in conn.cursor(
+            """select hid, name, display_name, description, colour, avatar_url,
+            keep_proxy, proxy_tags, created, description_privacy
+            from members where system = $1 order by id""",
+            system,
+            prefetch=CHUNK_ROWS,
+        ):
+            member = {
+                "id": m["hid"],
+                "name": m["name"],
+                "display_name": m["display_name"],
+                "description": m["description"],
+                "color": m["colour"],
+                "avatar_url": m["avatar_url"],
+                "keep_proxy": m["keep_proxy"],
+                "proxy_tags": [
+                    {"prefix": t["prefix"], "suffix": t["suffix"]}
+                    for t in m["proxy_tags"]
+                ],
+                "created": _timestamp(m["created"]),
+                "description_privacy": m["description_privacy"].lower(),
+            }
+            writer.write(("" if first else ", ") + json.dumps(member))
+            first = False
+            if writer.full:
+                yield writer.flush()
+
+        writer.write('], "switches": [')
+        if writer.full:
+            yield writer.flush()
+
+        first = True
+        async for s in conn.cursor(
+            """select timestamp, array(
+                select members.hid from switch_members
+                join members on members.id = switch_members.member
+                where switch_members.switch = switches.id
+                order by switch_members.id
+            ) as members
+            from switches where system = $1 order by timestamp""",
+            system,
+            prefetch=CHUNK_ROWS,
+        ):
+            switch = {"timestamp": _timestamp(s["timestamp"]), "members": s["members"]}
+            writer.write(("" if first else ", ") + json.dumps(switch))
+            first = False
+            if writer.full:
+                yield writer.flush()
+
+    writer.write("]}")
+    yield writer.flush()
+
+
+async def export_to_file(db: Database, system: int, path: str):
+    """Exports a system to a file.
+
+    The database connection is released once the export is written,
+    rather than being held for however long the file takes to upload."""
+
+    with open(path, "wb") as f:
+        async for chunk in export_system(db, system):
+            f.write(chunk)
+
+
+class _JSONReader:
+    """Reads JSON incrementally from chunks of text.
+
+    Only the structure needed to walk an export (the top-level object and its arrays)
+    is parsed by hand, everything else is decoded a value at a time with `raw_decode`,
+    so a whole member or switch is the most that's ever parsed at once.
+    Values longer than MAX_VALUE_SIZE are rejected instead of buffered to their end."""
+
+    _chunks: AsyncIterator[str]
+    _buf: str = ""
+    _pos: int = 0
+    _eof: bool = False
+    _decoder: json.JSONDecoder
+
+    def __init__(self, chunks: AsyncIterator[str]):
+        self._chunks = chunks
+        self._decoder = json.JSONDecoder()
+
+    async def _fill(self) -> bool:
+        """Reads the next chunk into the buffer. Returns False at the end of the input."""
+
+        if self._eof:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            return False
+
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    async def _peek(self) -> str:
+        """Skips whitespace and returns the next character, or an empty string at the end of the input."""
+
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf) or not await self._fill():
+                return self._buf[self._pos : self._pos + 1]
+
+    async def _expect(self, *chars: str) -> str:
+        c = await self._peek()
+        if c not in chars:
+            raise TransferError(
+                f"invalid JSON: expected {' or '.join(repr(x) for x in chars)}, got {c or 'end of file'!r}"
+            )
+        self._pos += 1
+        return c
+
+    async def value(self) -> Any:
+        """Decodes the next value."""
+
+        await self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                # the value may continue in the next chunk, unless it's already too long
+                self._check_size()
+                if await self._fill():
+                    continue
+                raise TransferError(f"invalid JSON: {e}")
+
+            # a number at the end of the buffer might continue in the next chunk
+            if end == len(self._buf) and not isinstance(value, (dict, list, str)):
+                self._check_size()
+                if await self._fill():
+                    continue
+
+            self._pos = end
+            return value
+
+    def _check_size(self):
+        if len(self._buf) - self._pos > MAX_VALUE_SIZE:
+            raise TransferError(
+                f"a value in the file is longer than {MAX_VALUE_SIZE} characters"
+            )
+
+    async def keys(self) -> AsyncIterator[str]:
+        """Iterates over the keys of the next object. The caller must consume each key's value."""
+
+        await self._expect("{")
+        if await self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = await self.value()
+            if not isinstance(key, str):
+                raise TransferError("invalid JSON: expected a key")
+            await self._expect(":")
+            yield key
+            if await self._expect(",", "}") == "}":
+                return
+
+    async def items(self) -> AsyncIterator[Any]:
+        """Iterates over the values in the next array."""
+
+        await self._expect("[")
+        if await self._peek() == "]":
+            self._pos += 1
+            return
+
+        while True:
+            yield await self.value()
+            if await self._expect(",", "]") == "]":
+                return
+
+
+async def _decode(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    # an incremental decoder keeps characters split between chunks for the next one
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        async for chunk in chunks:
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise TransferError("file isn't valid UTF-8")
+
+
+class ImportResult:
+    """What an import added."""
+
+    system: int
+    members: int
+    switches: int
+
+    def __init__(self, system: int, members: int = 0, switches: int = 0):
+        self.system = system
+        self.members = members
+        self.switches = switches
+
+    def __repr__(self):
+        return f"ImportResult(system={self.system}, members={self.members}, switches={self.switches})"
+
+
+async def import_system(
+    db: Database, user_id: hikari.Snowflake, chunks: AsyncIterable[bytes]
+) -> ImportResult:
+    """Imports a PluralKit-compatible export into the user's system, creating one if they don't have one.
+
+    The file is parsed incrementally and members and switches are copied in chunks of CHUNK_ROWS,
+    so memory use only grows with the number of members (to map their old IDs to new ones),
+    not with the size of the file. Members are always added as new members.
+    Either everything is imported or, if anything fails, nothing is.
+
+    Switches are matched to members as they're read, so `members` has to come before `switches`
+    in the file, as it does in PluralKit's and our own exports."""
+
+    reader = _JSONReader(_decode(chunks))
+
+    async with db.transaction() as conn:
+        system = await conn.fetchval(
+            "select system from accounts where uid = $1", user_id
+        )
+        if system is None:
+            system = await conn.fetchval(
+                "insert into systems (hid) values (find_free_system_hid()) returning id"
+            )
+            await conn.execute(
+                "insert into accounts (system, uid) values ($1, $2)", system, user_id
+            )
+
+        result = ImportResult(system)
+        # the members' IDs in the file, mapped to their new database IDs
+        member_ids: Dict[str, int] = dict()
+
+        switches_read = False
+        async for key in reader.keys():
+            if key == "members":
+                if switches_read:
+                    raise TransferError("members must come before switches in the file")
+                batch = []
+                async for m in reader.items():
+                    batch.append(m)
+                    if len(batch) >= CHUNK_ROWS:
+                        result.members += await _copy_members(
+                            conn, system, batch, member_ids
+                        )
+                        batch.clear()
+                result.members += await _copy_members(conn, system, batch, member_ids)
+            elif key == "switches":
+                switches_read = True
+                batch = []
+                async for s in reader.items():
+                    batch.append(s)
+                    if len(batch) >= CHUNK_ROWS:
+                        result.switches += await _copy_switches(
+                            conn, system, batch, member_ids
+                        )
+                        batch.clear()
+                result.switches += await _copy_switches(conn, system, batch, member_ids)
+            elif key in _SYSTEM_COLUMNS:
+                await _update_system(conn, system, key, await reader.value())
+            else:
+                await reader.value()
+
+    return result
+
+
+# keys in an export that are copied to the system, and their columns
+_SYSTEM_COLUMNS = {
+    "name": "name",
+    "description": "description",
+    "tag": "tag",
+    "avatar_url": "avatar_url",
+    "description_privacy": "description_privacy",
+    "member_list_privacy": "list_privacy",
+}
+
+_SYSTEM_LIMITS = {
+    "name": Limits.SYSTEM_NAME_LIMIT,
+    "description": Limits.DESCRIPTION_LIMIT,
+}
+
+
+async def _update_system(conn: asyncpg.Connection, system: int, key: str, value):
+    value = _string(f"system {key}", value, _SYSTEM_LIMITS.get(key))
+
+    column = _SYSTEM_COLUMNS[key]
+    if column.endswith("privacy"):
+        value = _privacy(value)
+    await conn.execute(f"update systems set {column} = $1 where id = $2", value, system)
+
+
+async def _copy_members(
+    conn: asyncpg.Connection,
+    system: int,
+    batch: List[dict],
+    member_ids: Dict[str, int],
+) -> int:
+    if not batch:
+        return 0
+
+    # IDs are allocated up front, so rows can be copied in without returning anything
+    hids = []
+    while len(hids) < len(batch):
+        rows = await conn.fetch("select claim_member_hids($1)", len(batch) - len(hids))
+        hids.extend(r[0] for r in rows)
+    ids = [
+        r[0]
+        for r in await conn.fetch(
+            "select nextval('members_id_seq') from generate_series(1, $1)", len(batch)
+        )
+    ]
+
+    records = []
+    for m, id, hid in zip(batch, ids, hids):
+        if (
+            not isinstance(m, dict)
+            or not isinstance(m.get("name"), str)
+            or not m["name"]
+        ):
+            raise TransferError("every member must have a name")
+        name = _string("member name", m["name"], Limits.MEMBER_NAME_LIMIT)
+        what = f"member {name}'s"
+
+        colour = m.get("color") or m.get("colour")
+        if colour is not None:
+            match = _COLOUR.fullmatch(colour) if isinstance(colour, str) else None
+            if match is None:
+                raise TransferError(f"{what} colour must be a hex code")
+            colour = match.group(1).lower()
+
+        proxy_tags = m.get("proxy_tags") or []
+        if not isinstance(proxy_tags, list):
+            raise TransferError(f"{what} proxy tags must be a list")
+        tags = []
+        for t in proxy_tags:
+            if not isinstance(t, dict):
+                raise TransferError(f"{what} proxy tags must be objects")
+            prefix = _string(f"{what} proxy tag prefix", t.get("prefix")) or None
+            suffix = _string(f"{what} proxy tag suffix", t.get("suffix")) or None
+            if prefix or suffix:
+                tags.append((prefix, suffix))
+
+        keep_proxy = m.get("keep_proxy")
+        if keep_proxy is None:
+            keep_proxy = False
+        elif not isinstance(keep_proxy, bool):
+            raise TransferError(f"{what} keep_proxy must be true or false")
+
+        records.append(
+            (
+                id,
+                hid,
+                system,
+                colour,
+                _string(f"{what} avatar URL", m.get("avatar_url")),
+                name,
+                _string(
+                    f"{what} display name",
+                    m.get("display_name"),
+                    Limits.MEMBER_NAME_LIMIT,
+                ),
+                _string(
+                    f"{what} description",
+                    m.get("description"),
+                    Limits.DESCRIPTION_LIMIT,
+                ),
+                tags,
+                keep_proxy,
+                _parse_timestamp(m.get("created"))
+                or datetime.datetime.now(datetime.timezone.utc),
+                _privacy(
+                    _string(f"{what} description privacy", m.get("description_privacy"))
+                ),
+            )
+        )
+        if isinstance(m.get("id"), str):
+            member_ids[m["id"]] = id
+
+    await conn.copy_records_to_table(
+        "members",
+        records=records,
+        columns=(
+            "id",
+            "hid",
+            "system",
+            "colour",
+            "avatar_url",
+            "name",
+            "display_name",
+            "description",
+            "proxy_tags",
+            "keep_proxy",
+            "created",
+            "description_privacy",
+        ),
+    )
+    return len(records)
+
+
+async def _copy_switches(
+    conn: asyncpg.Connection,
+    system: int,
+    batch: List[dict],
+    member_ids: Dict[str, int],
+) -> int:
+    if not batch:
+        return 0
+
+    ids = await conn.fetch(
+        "select nextval('switches_id_seq') as id from generate_series(1, $1)",
+        len(batch),
+    )
+
+    switches = []
+    switch_members = []
+    for s, row in zip(batch, ids):
+        timestamp = (
+            _parse_timestamp(s.get("timestamp")) if isinstance(s, dict) else None
+        )
+        if timestamp is None:
+            raise TransferError("every switch must have a timestamp")
+
+        switches.append((row["id"], system, timestamp))
+        members = s.get("members") or []
+        if not isinstance(members, list):
+            raise TransferError("switch members must be a list of member IDs")
+        for hid in members:
+            if not isinstance(hid, str):
+                raise TransferError("switch members must be a list of member IDs")
+            # switches to members that weren't in the file are skipped, like PluralKit does
+            member = member_ids.get(hid)
+            if member is not None:
+                switch_members.append((row["id"], member))
+
+    await conn.copy_records_to_table(
+        "switches", records=switches, columns=("id", "system", "timestamp")
+    )
+    await conn.copy_records_to_table(
+        "switch_members", records=switch_members, columns=("switch", "member")
+    )
+    return len(switches)
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Dict, Iterable, Optional
+
+import hikari
+
+from .cache import TTLCache
+from .metrics import track_cache
+
+_MISSING = object()
+
+
+class UserCache:
+    """A short-lived cache of users fetched over REST, for users the gateway cache doesn't have.
+
+    Fetches run concurrently, at most `concurrency` at a time,
+    and concurrent misses for the same user share a single fetch.
+    Deleted users are cached as None."""
+
+    _app: hikari.CacheAware
+    _cache: TTLCache[hikari.Snowflake, Optional[hikari.User]]
+    _pending: Dict[hikari.Snowflake, asyncio.Future]
+    _semaphore: asyncio.Semaphore
+
+    def __init__(
+        self,
+        app: hikari.CacheAware,
+        maxsize: int = 1000,
+        ttl: float = 60,
+        concurrency: int = 5,
+    ):
+        self._app = app
+        self._cache = TTLCache(maxsize, ttl)
+        track_cache("users", self._cache)
+        self._pending = dict()
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(self, id: hikari.Snowflake) -> Optional[hikari.User]:
+        """Returns the user with the given ID, fetching it if it isn't cached.
+        Returns None if the user doesn't exist."""
+
+        user = self._app.cache.get_user(id)
+        if user is not None:
+            return user
+
+        user = self._cache.get(id, _MISSING)
+        if user is not _MISSING:
+            return user
+
+        fut = self._pending.get(id)
+        if fut is None:
+            fut = asyncio.ensure_future(self._fetch(id))
+            self._pending[id] = fut
+            fut.add_done_callback(lambda f: self._done(id, f))
+
+        # shielded so one waiter being cancelled doesn't cancel the fetch for everyone else
+        return await asyncio.shield(fut)
+
+    async def fetch_many(
+        self, ids: Iterable[hikari.Snowflake]
+    ) -> Dict[hikari.Snowflake, Optional[hikari.User]]:
+        """Fetches all the given users concurrently. Returns a dict of ID to user."""
+
+        ids = list(ids)
+        users = await asyncio.gather(*[self.fetch(id) for id in ids])
+        return dict(zip(ids, users))
+
+    def _done(self, id: hikari.Snowflake, fut: asyncio.Future):
+        if self._pending.get(id) is fut:
+            del self._pending[id]
+
+    async def _fetch(self, id: hikari.Snowflake) -> Optional[hikari.User]:
+        async with self._semaphore:
+            try:
+                user = await self._app.rest.fetch_user(id)
+            except hikari.NotFoundError:
+                user = None
+
+        self._cache[id] = user
+        return user
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
@@ -1,32 +1,137 @@
+import asyncio
 from typing import Optional
 
 import hikari
 
+from .cache import LRUCache
+from .db import Database
+from .invalidation import Invalidation, Invalidator
+from .metrics import track_cache
+from .statements import WEBHOOK_BY_CHANNEL
+
+
+class ProxyWebhook(hikari.ExecutableWebhook):
+    """A webhook used for proxying. Only holds what's needed to execute it."""
+
+    __slots__ = ("_app", "_id", "_token", "channel_id")
+
+    _app: hikari.RESTAware
+    _id: hikari.Snowflake
+    _token: str
+    channel_id: hikari.Snowflake
+
+    def __init__(
+        self,
+        app: hikari.RESTAware,
+        channel_id: hikari.Snowflake,
+        id: hikari.Snowflake,
+        token: str,
+    ):
+        self._app = app
+        self.channel_id = hikari.Snowflake(channel_id)
+        self._id = hikari.Snowflake(id)
+        self._token = token
+
+    @property
+    def app(self) -> hikari.RESTAware:
+        return self._app
+
+    @property
+    def webhook_id(self) -> hikari.Snowflake:
+        return self._id
+
+    @property
+    def token(self) -> str:
+        return self._token
+
+    def __repr__(self):
+        return f"ProxyWebhook(channel={self.channel_id}, id={self._id})"
+
 
 class WebhookCache:
-    """A cache of webhooks used for proxying."""
+    """A cache of webhooks used for proxying.
+
+    Webhooks are persisted in the database, so they survive restarts,
+    and concurrent misses for the same channel share a single fetch."""
 
-    _cache: dict[hikari.Snowflake, hikari.ExecutableWebhook]
+    _cache: LRUCache[hikari.Snowflake, ProxyWebhook]
+    _pending: dict[hikari.Snowflake, asyncio.Future]
     _app: hikari.RESTAware
+    _db: Database
+    _invalidator: Invalidator
     _user: hikari.OwnUser = None
 
-    def __init__(self, app: hikari.RESTAware):
-        self._cache = dict()
+    def __init__(
+        self,
+        app: hikari.RESTAware,
+        db: Database,
+        invalidator: Invalidator,
+        maxsize: int = 10000,
+    ):
+        self._cache = LRUCache(maxsize)
+        track_cache("webhooks", self._cache)
+        self._pending = dict()
         self._app = app
+        self._db = db
+        self._invalidator = invalidator
+        invalidator.register(Invalidation.WEBHOOK, self.forget, self._cache.clear)
 
-    async def get_for_channel(
-        self, channel: hikari.Snowflake
-    ) -> Optional[hikari.ExecutableWebhook]:
+    async def load(self) -> int:
+        """Loads stored webhooks into the cache, up to its size. Returns the number of webhooks loaded."""
+
+        rows = await self._db.fetch(
+            "select channel, webhook, token from webhooks limit $1",
+            self._cache.maxsize,
+        )
+        for row in rows:
+            self._cache[row["channel"]] = ProxyWebhook(
+                self._app, row["channel"], row["webhook"], row["token"]
+            )
+
+        return len(rows)
+
+    async def get_for_channel(self, channel: hikari.Snowflake) -> ProxyWebhook:
         """Gets the proxy webhook for the given channel."""
 
-        try:
-            return self._cache[channel]
-        except KeyError:
-            return await self._fetch_or_create(channel)
+        wh = self._cache.get(channel)
+        if wh is not None:
+            return wh
+
+        fut = self._pending.get(channel)
+        if fut is None:
+            fut = asyncio.ensure_future(self._load_or_create(channel))
+            self._pending[channel] = fut
+            fut.add_done_callback(lambda f: self._done(channel, f))
 
-    async def _fetch_or_create(
-        self, channel: hikari.Snowflake
-    ) -> hikari.ExecutableWebhook:
+        # shielded so one waiter being cancelled doesn't cancel the fetch for everyone else
+        return await asyncio.shield(fut)
+
+    def _done(self, channel: hikari.Snowflake, fut: asyncio.Future):
+        if self._pending.get(channel) is fut:
+            del self._pending[channel]
+
+    async def _load_or_create(self, channel: hikari.Snowflake) -> ProxyWebhook:
+        """Loads the webhook for the given channel from the database, or fetches or creates one."""
+
+        row = await self._db.fetchrow(WEBHOOK_BY_CHANNEL, channel)
+        if row is not None:
+            wh = ProxyWebhook(self._app, channel, row["webhook"], row["token"])
+            self._cache[channel] = wh
+            return wh
+
+        wh = await self._fetch_or_create(channel)
+        await self._db.execute(
+            """insert into webhooks (channel, webhook, token) values ($1, $2, $3)
+            on conflict (channel) do update set webhook = $2, token = $3""",
+            channel,
+            wh.webhook_id,
+            wh.token,
+        )
+        await self._invalidator.invalidate(Invalidation.WEBHOOK, channel)
+        self._cache[channel] = wh
+        return wh
+
+    async def _fetch_or_create(self, channel: hikari.Snowflake) -> ProxyWebhook:
         """Fetches or creates a webhook for the given channel."""
 
         if self._user is None:
@@ -34,21 +139,64 @@ class WebhookCache:
 
         webhooks = await self._app.rest.fetch_channel_webhooks(channel)
         for wh in webhooks:
-            if isinstance(wh, hikari.IncomingWebhook):
-                if wh.author.id is self._user.id:
-                    self._cache[channel] = wh
-                    return wh
+            if isinstance(wh, hikari.IncomingWebhook) and wh.token is not None:
+                if wh.author is not None and wh.author.id == self._user.id:
+                    return ProxyWebhook(self._app, channel, wh.id, wh.token)
 
         # else, no webhook found, so create one
         wh = await self._app.rest.create_webhook(
             channel, f"{self._user.username} Webhook", reason="Create proxy webhook"
         )
-        self._cache[channel] = wh
-        return wh
+        return ProxyWebhook(self._app, channel, wh.id, wh.token)
+
+    async def on_webhook_update(self, event: hikari.WebhookUpdateEvent):
+        """Checks that the webhook for a channel still exists when its webhooks are updated."""
+
+        wh = self._cache.get(event.channel_id)
+        if wh is None:
+            row = await self._db.fetchrow(
+                "select webhook from webhooks where channel = $1", event.channel_id
+            )
+            if row is None:
+                return
+            id = row["webhook"]
+        else:
+            id = wh.webhook_id
 
-    def delete(self, channel: hikari.Snowflake):
-        """Clears the webhook cache for the given channel."""
         try:
-            del self._cache[channel]
-        except KeyError:
-            pass
+            webhooks = await self._app.rest.fetch_channel_webhooks(event.channel_id)
+        except hikari.HTTPError:
+            # can't check it, so fall back to the database on next use
+            self._cache.pop(event.channel_id)
+            return
+
+        if not any(w.id == id for w in webhooks):
+            await self.delete(event.channel_id, id)
+
+    async def on_channel_delete(self, event: hikari.GuildChannelDeleteEvent):
+        await self.delete(event.channel_id)
+
+    async def delete(
+        self, channel: hikari.Snowflake, webhook: Optional[hikari.Snowflake] = None
+    ):
+        """Clears the stored webhook for the given channel.
+        If `webhook` is given, it's only cleared if it's still the stored webhook,
+        so a webhook another process just replaced it with isn't thrown away."""
+
+        if webhook is None:
+            await self._db.execute("delete from webhooks where channel = $1", channel)
+        else:
+            await self._db.execute(
+                "delete from webhooks where channel = $1 and webhook = $2",
+                channel,
+                webhook,
+            )
+        await self._invalidator.invalidate(Invalidation.WEBHOOK, channel)
+
+    def forget(self, channel: hikari.Snowflake):
+        """Drops the webhook for the given channel from the cache, without deleting it."""
+
+        self._cache.pop(channel)
+
+    def __len__(self) -> int:
+        return len(self._cache)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# proxytools: a Discord proxy bot written in Python with Hikari
+# Copyright (C) 2021 Starshine System
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Exports and imports systems from the command line, for systems too large to go through Discord.
+
+python proxytools/transfer.py export <system ID> <file>
+python proxytools/transfer.py import <user ID> <file>
+"""
+
+import argparse
+import asyncio
+import configparser
+import logging
+import sys
+
+import core
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def _read(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def export(db: core.Database, hid: str, path: str):
+    system = await db.fetchval("select id from systems where hid = $1", hid)
+    if system is None:
+        raise SystemExit(f"No system with ID {hid}")
+
+    await core.export_to_file(db, system, path)
+
+
+async def import_(
+    db: core.Database, log: logging.Logger, url: str, user_id: int, path: str
+):
+    result = await core.import_system(db, user_id, _read(path))
+    print(
+        f"Imported {result.members} member(s) and {result.switches} switch(es) into system {result.system}"
+    )
+
+    # running bots drop anything they had cached for the system
+    invalidator = core.Invalidator(db, url, log)
+    accounts = await db.fetch(
+        "select uid from accounts where system = $1", result.system
+    )
+    await invalidator.invalidate(
+        core.Invalidation.ACCOUNT, *[a["uid"] for a in accounts]
+    )
+    await invalidator.invalidate(core.Invalidation.SYSTEM, result.system)
+    await invalidator.invalidate(core.Invalidation.FRONT, result.system)
+
+
+async def run(args: argparse.Namespace, url: str):
+    log = core.getLogger("transfer", logging.INFO)
+    db = await core.Database.create(url, min_size=1, max_size=1)
+    try:
+        if args.command == "export":
+            await export(db, args.id, args.file)
+            print(f"Exported system {args.id} to {args.file}")
+        else:
+            await import_(db, log, url, int(args.id), args.file)
+    except core.UserError as e:
+        raise SystemExit(str(e))
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export or import a system as PluralKit-compatible JSON."
+    )
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument(
+        "id", help="the system ID to export, or the user ID to import for"
+    )
+    parser.add_argument("file")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read("./proxytools.ini")
+    if not config.has_section("database"):
+        sys.exit("No database configured in proxytools.ini")
+
+    asyncio.run(run(args, config["database"]["url"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import atexit
+import json
+import logging
+
+from proxytools.core import log
+
+
+def test_records_below_level_are_dropped(tmp_path):
+    path = tmp_path / "log.json"
+    handler, listener = log.setup_logging(
+        level="WARNING", json_format=True, file=str(path)
+    )
+    try:
+        logger = log.getLogger("proxytools.proxy", logging.DEBUG)
+        logger.debug("debug")
+        logger.info("info")
+        logger.warning("warning")
+    finally:
+        listener.stop()
+        atexit.unregister(listener.stop)
+        logging.getLogger().removeHandler(handler)
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["message"] for r in records] == ["warning"]
@@ -0,0 +1,239 @@
+import asyncio
+import contextlib
+import datetime
+import json
+
+import pytest
+
+from proxytools.core import transfer
+
+CREATED = datetime.datetime(2021, 10, 1, tzinfo=datetime.timezone.utc)
+
+SYSTEM = {
+    "id": 1,
+    "hid": "abcde",
+    "name": "Test system",
+    "description": None,
+    "tag": None,
+    "avatar_url": None,
+    "created": CREATED,
+    "description_privacy": "PUBLIC",
+    "list_privacy": "PUBLIC",
+}
+
+MEMBERS = [
+    {
+        "hid": f"mem{i:02}",
+        "name": f"Member {i}",
+        "display_name": None,
+        "description": "x" * 50,
+        "colour": None,
+        "avatar_url": None,
+        "keep_proxy": False,
+        "proxy_tags": [{"prefix": f"{i}:", "suffix": None}],
+        "created": CREATED,
+        "description_privacy": "PUBLIC",
+    }
+    for i in range(3)
+]
+
+SWITCHES = [
+    {"timestamp": CREATED, "members": ["mem00", "mem01"]},
+    {"timestamp": CREATED, "members": []},
+]
+
+
+async def _rows(rows):
+    for row in rows:
+        yield row
+
+
+class ExportConnection:
+    async def execute(self, query, *args):
+        pass
+
+    async def fetchrow(self, query, *args):
+        return SYSTEM
+
+    async def fetch(self, query, *args):
+        return [{"uid": 1234}]
+
+    def cursor(self, query, *args, prefetch=None):
+        return _rows(SWITCHES if "from switches" in query else MEMBERS)
+
+
+class ExportDatabase:
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        yield ExportConnection()
+
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def export() -> list:
+    return asyncio.run(_collect(transfer.export_system(ExportDatabase(), 1)))
+
+
+def _boundaries():
+    """Chunk sizes that make each fixed separator cross the buffer's limit."""
+
+    full = b"".join(export()).decode()
+    for sep in (', "members": [', '], "switches": [', "]}"):
+        offset = full.index(sep)
+        for size in range(offset + 1, offset + len(sep) + 1):
+            yield pytest.param(size, id=f"{sep.strip()}-{size - offset}")
+
+
+def test_export_is_valid_json():
+    data = json.loads(b"".join(export()))
+
+    assert data["id"] == "abcde"
+    assert [m["id"] for m in data["members"]] == ["mem00", "mem01", "mem02"]
+    assert [s["members"] for s in data["switches"]] == [["mem00", "mem01"], []]
+
+
+@pytest.mark.parametrize("size", list(_boundaries()))
+def test_export_separator_at_chunk_boundary(monkeypatch, size):
+    expected = b"".join(export())
+    monkeypatch.setattr(transfer, "CHUNK_SIZE", size)
+
+    chunks = export()
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == expected
+
+
+def test_export_to_file(tmp_path):
+    path = tmp_path / "export.json"
+
+    asyncio.run(transfer.export_to_file(ExportDatabase(), 1, str(path)))
+
+    assert path.read_bytes() == b"".join(export())
+
+
+class Row(dict):
+    def __getitem__(self, key):
+        return (
+            list(self.values())[key]
+            if isinstance(key, int)
+            else super().__getitem__(key)
+        )
+
+
+class ImportConnection:
+    def __init__(self):
+        self.ids = 0
+        self.copied = {}
+
+    async def fetchval(self, query, *args):
+        return 1
+
+    async def execute(self, query, *args):
+        pass
+
+    async def fetch(self, query, n):
+        rows = []
+        for _ in range(n):
+            self.ids += 1
+            rows.append(Row(id=self.ids))
+        return rows
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.setdefault(table, []).extend(records)
+
+
+class ImportDatabase:
+    def __init__(self):
+        self.conn = ImportConnection()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        yield self.conn
+
+
+def import_(data) -> ImportConnection:
+    db = ImportDatabase()
+
+    async def chunks():
+        yield json.dumps(data).encode()
+
+    asyncio.run(transfer.import_system(db, 1234, chunks()))
+    return db.conn
+
+
+def test_import_export_round_trip():
+    conn = import_(json.loads(b"".join(export())))
+
+    assert [r[5] for r in conn.copied["members"]] == [
+        "Member 0",
+        "Member 1",
+        "Member 2",
+    ]
+    assert len(conn.copied["switches"]) == 2
+    assert len(conn.copied["switch_members"]) == 2
+
+
+@pytest.mark.parametrize(
+    "member",
+    [
+        {"name": 1},
+        {"name": ""},
+        {"name": "x" * 101},
+        {"name": "a", "description": 1},
+        {"name": "a", "description": ["a"]},
+        {"name": "a", "description": "x" * 1001},
+        {"name": "a", "display_name": 1},
+        {"name": "a", "display_name": "x" * 101},
+        {"name": "a", "avatar_url": {}},
+        {"name": "a", "color": "not a colour"},
+        {"name": "a", "color": 123456},
+        {"name": "a", "proxy_tags": 1},
+        {"name": "a", "proxy_tags": ["a:"]},
+        {"name": "a", "proxy_tags": [{"prefix": 1}]},
+        {"name": "a", "proxy_tags": [{"suffix": ["a"]}]},
+        {"name": "a", "keep_proxy": "false"},
+        {"name": "a", "keep_proxy": 0},
+        {"name": "a", "created": 1},
+        {"name": "a", "description_privacy": 1},
+    ],
+)
+def test_import_invalid_member(member):
+    with pytest.raises(transfer.TransferError):
+        import_({"members": [member]})
+
+
+@pytest.mark.parametrize(
+    "switch",
+    [
+        {"members": []},
+        {"timestamp": None},
+        {"timestamp": "yesterday"},
+        {"timestamp": "2021-10-01T00:00:00Z", "members": 1},
+        {"timestamp": "2021-10-01T00:00:00Z", "members": [1]},
+    ],
+)
+def test_import_invalid_switch(switch):
+    with pytest.raises(transfer.TransferError):
+        import_({"members": [], "switches": [switch]})
+
+
+def test_import_members_after_switches():
+    with pytest.raises(transfer.TransferError):
+        import_({"switches": [], "members": []})
+
+
+def test_import_value_too_long():
+    chunks = []
+
+    async def reader():
+        yield b'{"members": [{"name": "'
+        for _ in range(1000):
+            chunks.append(None)
+            yield b"a" * 4096
+
+    with pytest.raises(transfer.TransferError):
+        asyncio.run(transfer.import_system(ImportDatabase(), 1234, reader()))
+    # rejected as soon as the value is too long, without reading the rest of the file
+    assert len(chunks) * 4096 <= transfer.MAX_VALUE_SIZE + 4096